@@ -0,0 +1,238 @@
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from models import db, ExerciseSession, ExerciseStats, SESSION_MODELS
+import serialization
+
+# Number of session ids kept on the aggregate for the "recent sessions" list
+RECENT_SESSIONS = 10
+
+
+def _recent_ids(model, user_id, exclude_id=None):
+    """Ids of the user's latest sessions, oldest first"""
+    query = db.session.query(model.id).filter(model.user_id == user_id)
+    if exclude_id is not None:
+        query = query.filter(model.id != exclude_id)
+    rows = query.order_by(model.id.desc()).limit(RECENT_SESSIONS).all()
+    return [row[0] for row in reversed(rows)]
+
+
+def _totals(model, user_id):
+    """Total, count and best computed by the database from raw sessions"""
+    total, count, best = (
+        db.session.query(
+            func.coalesce(func.sum(model.reps), 0),
+            func.count(model.id),
+            func.coalesce(func.max(model.reps), 0)
+        )
+        .filter(model.user_id == user_id)
+        .one()
+    )
+    return int(total), int(count), int(best)
+
+
+def _fill(aggregate):
+    """Recompute an aggregate row from the raw session table"""
+    model = SESSION_MODELS[aggregate.exercise]
+    total, count, best = _totals(model, aggregate.user_id)
+    aggregate.total_reps = total
+    aggregate.sessions_completed = count
+    aggregate.best_session = best
+    aggregate.recent_session_ids = _recent_ids(model, aggregate.user_id)
+    return aggregate
+
+
+def _locked_aggregate(user_id, exercise):
+    """Fetch the aggregate row for update, creating it from raw sessions if missing
+
+    Returns (aggregate, created); a created row already reflects everything
+    flushed in the current transaction.
+    """
+    user_id = int(user_id)
+    aggregate = (
+        ExerciseStats.query
+        .filter_by(user_id=user_id, exercise=exercise)
+        .with_for_update()
+        .first()
+    )
+    if aggregate:
+        return aggregate, False
+
+    try:
+        with db.session.begin_nested():
+            aggregate = _fill(ExerciseStats(user_id=user_id, exercise=exercise))
+            db.session.add(aggregate)
+    except IntegrityError:
+        # Another request created it first
+        aggregate = (
+            ExerciseStats.query
+            .filter_by(user_id=user_id, exercise=exercise)
+            .with_for_update()
+            .one()
+        )
+        return aggregate, False
+    return aggregate, True
+
+
+def record_session(session, exercise):
+    """Add a newly created session to its aggregate; call before committing"""
+    db.session.flush()  # assign session.id
+    return record_sessions(session.user_id, exercise, [(session.id, session.reps)])
+
+
+def record_sessions(user_id, exercise, sessions):
+    """Add already-inserted (id, reps) pairs to a user's aggregate in one update"""
+    aggregate, created = _locked_aggregate(user_id, exercise)
+    if created or not sessions:
+        # Row was just built from raw sessions and already counts these
+        return aggregate
+
+    reps = [count for _, count in sessions]
+    aggregate.total_reps += sum(reps)
+    aggregate.sessions_completed += len(sessions)
+    aggregate.best_session = max([aggregate.best_session] + reps)
+    ids = sorted(session_id for session_id, _ in sessions)
+    aggregate.recent_session_ids = (aggregate.recent_session_ids + ids)[-RECENT_SESSIONS:]
+    return aggregate
+
+
+def discard_session(session, exercise):
+    """Remove a session from its aggregate; call before deleting the session"""
+    model = SESSION_MODELS[exercise]
+    aggregate, _ = _locked_aggregate(session.user_id, exercise)
+    aggregate.total_reps = max(aggregate.total_reps - session.reps, 0)
+    aggregate.sessions_completed = max(aggregate.sessions_completed - 1, 0)
+
+    if session.reps >= aggregate.best_session:
+        best = (
+            db.session.query(func.max(model.reps))
+            .filter(model.user_id == session.user_id, model.id != session.id)
+            .scalar()
+        )
+        aggregate.best_session = best or 0
+
+    if session.id in aggregate.recent_session_ids:
+        aggregate.recent_session_ids = _recent_ids(model, session.user_id, exclude_id=session.id)
+    return aggregate
+
+
+def clear_aggregate(user_id, exercise):
+    """Zero the aggregate after all of a user's sessions were deleted"""
+    aggregate, _ = _locked_aggregate(user_id, exercise)
+    aggregate.total_reps = 0
+    aggregate.sessions_completed = 0
+    aggregate.best_session = 0
+    aggregate.recent_session_ids = []
+    return aggregate
+
+
+def get_summary(user_id, exercise):
+    """Return (aggregate, recent session dicts) for the stats endpoints
+
+    Reads a single aggregate row plus at most RECENT_SESSIONS sessions by
+    primary key, selecting only the columns the response needs. Users without an aggregate yet (created before it existed and
+    not rebuilt) fall back to database-side totals.
+    """
+    user_id = int(user_id)
+    model = SESSION_MODELS[exercise]
+    aggregate = ExerciseStats.query.filter_by(user_id=user_id, exercise=exercise).first()
+    if aggregate is None:
+        aggregate = _fill(ExerciseStats(user_id=user_id, exercise=exercise))
+
+    ids = aggregate.recent_session_ids
+    if not ids:
+        return aggregate, []
+    rows = (
+        db.session.query(*serialization.session_columns(model))
+        .filter(model.id.in_(ids))
+        .order_by(model.id)
+    )
+    return aggregate, [serialization.session_row(row) for row in rows]
+
+
+def all_summaries(user_id, rows=None):
+    """Return {exercise: aggregate} for every exercise from one query
+
+    rows are the user's ExerciseStats rows when the caller already loaded
+    them. Exercises without an aggregate row yet are filled in by a single
+    GROUP BY over exercise_sessions rather than one query per exercise; their
+    recent_session_ids are left empty.
+    """
+    user_id = int(user_id)
+    if rows is None:
+        rows = ExerciseStats.query.filter_by(user_id=user_id)
+    found = {row.exercise: row for row in rows}
+    missing = [exercise for exercise in SESSION_MODELS if exercise not in found]
+    if missing:
+        grouped = (
+            db.session.query(
+                ExerciseSession.exercise_type,
+                func.sum(ExerciseSession.reps),
+                func.count(ExerciseSession.id),
+                func.max(ExerciseSession.reps)
+            )
+            .filter(ExerciseSession.user_id == user_id, ExerciseSession.exercise_type.in_(missing))
+            .group_by(ExerciseSession.exercise_type)
+            .all()
+        )
+        totals = {exercise: (total, count, best) for exercise, total, count, best in grouped}
+        for exercise in missing:
+            total, count, best = totals.get(exercise, (0, 0, 0))
+            found[exercise] = ExerciseStats(
+                user_id=user_id,
+                exercise=exercise,
+                total_reps=int(total or 0),
+                sessions_completed=int(count),
+                best_session=int(best or 0),
+                recent_session_ids=[]
+            )
+    return {exercise: found[exercise] for exercise in SESSION_MODELS}
+
+
+def session_count(user_id, exercise):
+    """Number of sessions a user has, read from the aggregate when present"""
+    user_id = int(user_id)
+    aggregate = ExerciseStats.query.filter_by(user_id=user_id, exercise=exercise).first()
+    if aggregate is not None:
+        return aggregate.sessions_completed
+    model = SESSION_MODELS[exercise]
+    return db.session.query(func.count(model.id)).filter(model.user_id == user_id).scalar()
+
+
+def rebuild_aggregates(exercises=None):
+    """Recompute every user's aggregates from raw sessions; returns rows written"""
+    written = 0
+    for exercise in exercises or SESSION_MODELS:
+        model = SESSION_MODELS[exercise]
+        totals = (
+            db.session.query(
+                model.user_id,
+                func.sum(model.reps),
+                func.count(model.id),
+                func.max(model.reps)
+            )
+            .group_by(model.user_id)
+            .all()
+        )
+        existing = {row.user_id: row for row in ExerciseStats.query.filter_by(exercise=exercise)}
+
+        for user_id, total, count, best in totals:
+            aggregate = existing.pop(user_id, None)
+            if aggregate is None:
+                aggregate = ExerciseStats(user_id=user_id, exercise=exercise)
+                db.session.add(aggregate)
+            aggregate.total_reps = int(total or 0)
+            aggregate.sessions_completed = int(count)
+            aggregate.best_session = int(best or 0)
+            aggregate.recent_session_ids = _recent_ids(model, user_id)
+            written += 1
+
+        # Users whose sessions are all gone
+        for aggregate in existing.values():
+            aggregate.total_reps = 0
+            aggregate.sessions_completed = 0
+            aggregate.best_session = 0
+            aggregate.recent_session_ids = []
+            written += 1
+
+        db.session.commit()
+    return written
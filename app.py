@@ -1,43 +1,171 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Blueprint, Response, current_app, request, jsonify, send_from_directory, stream_with_context
 from flask_cors import CORS
-from flask_jwt_extended import JWTManager, create_access_token, create_refresh_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import JWTManager, create_access_token, create_refresh_token, jwt_required, get_jwt_identity, get_current_user
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime, timedelta, date
-import json
+import logging
+import click
 import re
 from config import Config
-from models import db, User, SquatSession, PushupSession
+from models import db, User, ExerciseSession, SESSION_MODELS, COUNT_FIELDS
+import aggregates
+import rollups
+import dashboard
+import migrations
+import leaderboard
+import pagination
+import ingest
+import writebehind
+import partitions
+import export
+import ratelimit
+import versions
+import replicas
+import live
+import exercise_ai as exercise_ai_service
+import passwords
+import user_cache
+import metrics
+import logs
+import serialization
 import os
 import redis
-# Gemini (Google Generative AI) integration
-try:
-    import google.generativeai as genai
-except ImportError:
-    genai = None
-from sqlalchemy import func, desc
+import signal
+import threading
+from sqlalchemy import func, desc, text
+from werkzeug.local import LocalProxy
+from werkzeug.middleware.proxy_fix import ProxyFix
 
 
-app = Flask(__name__, static_folder="frontend/build", static_url_path="")
-app.config.from_object(Config)
+logger = logging.getLogger(__name__)
 
-# Initialize extensions
-CORS(app, origins=["http://localhost:3000", "http://127.0.0.1:3000"], supports_credentials=True)
-jwt = JWTManager(app)
-db.init_app(app)
-REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379")
-redis_client = redis.from_url(REDIS_URL, decode_responses=True)
+api = Blueprint('api', __name__, cli_group=None)
+jwt = JWTManager()
 
-with app.app_context():
-    db.create_all()
+# Per-app clients, resolved through the current app so routes work under any worker
+redis_client = LocalProxy(lambda: current_app.extensions['redis'])
+leaderboard_hub = LocalProxy(lambda: current_app.extensions['leaderboard_hub'])
+password_hasher = LocalProxy(lambda: current_app.extensions['password_hasher'])
 
 
-@app.route("/", defaults={"path": ""})
-@app.route("/<path:path>")
+def _reset_after_fork(app):
+    """Drop connections inherited from a pre-forking parent process"""
+    with app.app_context():
+        db.engine.dispose(close=False)
+    if 'db_replicas' in app.extensions:
+        app.extensions['db_replicas'].dispose()
+    app.extensions['redis'].connection_pool.reset()
+
+
+def create_app(config_object=Config):
+    """Build the Flask app; each worker process gets its own DB and Redis pools"""
+    app = Flask(__name__, static_folder="frontend/build", static_url_path="")
+    app.config.from_object(config_object)
+    app.json = serialization.OrjsonProvider(app)
+    logs.configure_logging(app.config['LOG_LEVEL'], app.config['LOG_FORMAT'])
+    
+    # Initialize extensions
+    CORS(app, origins=["http://localhost:3000", "http://127.0.0.1:3000"], supports_credentials=True)
+    jwt.init_app(app)
+    db.init_app(app)
+    pool = redis.ConnectionPool.from_url(
+        app.config['REDIS_URL'],
+        decode_responses=True,
+        max_connections=app.config['REDIS_MAX_CONNECTIONS'],
+        socket_timeout=app.config['REDIS_SOCKET_TIMEOUT'],
+        socket_connect_timeout=app.config['REDIS_SOCKET_TIMEOUT'],
+        health_check_interval=30
+    )
+    app.extensions['redis'] = metrics.InstrumentedRedis(connection_pool=pool)
+    app.extensions['leaderboard_hub'] = live.LeaderboardHub(
+        app,
+        app.extensions['redis'],
+        interval=app.config['LEADERBOARD_PUSH_INTERVAL'],
+        max_viewers=app.config['LEADERBOARD_MAX_STREAMS'],
+        retry_after=app.config['LEADERBOARD_STREAM_RETRY_AFTER']
+    )
+    if app.config['EXERCISE_AI_CLIENT'] == 'fake':
+        model_client = exercise_ai_service.FakeModelClient(delay=app.config['EXERCISE_AI_FAKE_DELAY'])
+    else:
+        model_client = exercise_ai_service.GeminiClient(app.config.get('GEMINI_API_KEY'))
+    app.extensions['exercise_ai'] = exercise_ai_service.ExerciseAI(
+        app.extensions['redis'],
+        model_client,
+        workers=app.config['EXERCISE_AI_WORKERS'],
+        wait_timeout=app.config['EXERCISE_AI_WAIT_TIMEOUT'],
+        local_cache_size=app.config['EXERCISE_AI_LOCAL_CACHE_SIZE'],
+        local_cache_ttl=app.config['EXERCISE_AI_LOCAL_CACHE_TTL']
+    )
+    app.extensions['password_hasher'] = passwords.PasswordHasher(
+        workers=app.config['PASSWORD_HASH_WORKERS'],
+        max_queue=app.config['PASSWORD_HASH_MAX_QUEUE'],
+        rounds=app.config['BCRYPT_ROUNDS'],
+        timeout=app.config['PASSWORD_HASH_TIMEOUT'],
+        retry_after=app.config['PASSWORD_HASH_RETRY_AFTER']
+    )
+    app.extensions['user_cache'] = user_cache.UserCache(
+        app.extensions['redis'],
+        local_cache_size=app.config['USER_CACHE_SIZE'],
+        local_cache_ttl=app.config['USER_CACHE_TTL'],
+        redis_ttl=app.config['USER_CACHE_REDIS_TTL']
+    )
+    user_cache.install_listeners()
+    ratelimit.init_app(app)
+    if app.config['TRUSTED_PROXY_COUNT']:
+        # Rate limits key on request.remote_addr, so take it from the proxies' X-Forwarded-For
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['TRUSTED_PROXY_COUNT'])
+    replica_set = replicas.init_app(app)
+    replicas.install_listeners(db)
+    app.register_blueprint(api)
+    metrics.init_app(app, db, replica_set.engines if replica_set else ())
+    
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=lambda: _reset_after_fork(app))
+    return app
+
+
+@jwt.user_lookup_loader
+def load_user(_jwt_header, jwt_data):
+    """Cached profile dict for the token's user, available as get_current_user()"""
+    return current_app.extensions['user_cache'].get(jwt_data['sub'])
+
+@jwt.user_lookup_error_loader
+def user_not_found(_jwt_header, jwt_data):
+    """A valid token whose user no longer exists: 401 on every protected route, before the view runs"""
+    return jsonify({"error": "User not found"}), 401
+
+
+@api.route("/", defaults={"path": ""})
+@api.route("/<path:path>")
 def serve(path):
-    if path != "" and os.path.exists(os.path.join(app.static_folder, path)):
-        return send_from_directory(app.static_folder, path)
+    if path != "" and os.path.exists(os.path.join(current_app.static_folder, path)):
+        return send_from_directory(current_app.static_folder, path)
     else:
-        return send_from_directory(app.static_folder, "index.html")
+        return send_from_directory(current_app.static_folder, "index.html")
+
+@api.route('/healthz')
+def liveness():
+    """Liveness probe: the worker is up and serving requests"""
+    return jsonify({"status": "ok"}), 200
+
+@api.route('/readyz')
+def readiness():
+    """Readiness probe: Postgres and Redis are both reachable"""
+    checks = {}
+    try:
+        db.session.execute(text('SELECT 1'))
+        checks['postgres'] = 'ok'
+    except Exception as e:
+        db.session.rollback()
+        checks['postgres'] = str(e)
+    try:
+        redis_client.ping()
+        checks['redis'] = 'ok'
+    except redis.RedisError as e:
+        checks['redis'] = str(e)
+    
+    ready = all(status == 'ok' for status in checks.values())
+    return jsonify({"status": "ok" if ready else "unavailable", "checks": checks}), 200 if ready else 503
 # Validation functions
 def is_valid_email(email):
     """Validate email format"""
@@ -52,8 +180,173 @@ def is_valid_username(username):
     """Validate username format"""
     return len(username) >= 3 and username.isalnum()
 
+def _busy_response(e):
+    """503 with Retry-After when password hashing or the live streams are saturated"""
+    response = jsonify({"error": str(e)})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
+def _sessions_response(exercise, current_user_id):
+    """Keyset-paginated session history, or an NDJSON stream with ?format=ndjson
+
+    exercise=None pages through every exercise's sessions together.
+    """
+    _await_own_writes(current_user_id)
+    model = SESSION_MODELS[exercise] if exercise else ExerciseSession
+    query = db.session.query(*serialization.session_columns(model)).filter(model.user_id == current_user_id)
+    cursor = request.args.get('cursor')
+    if cursor:
+        pagination.decode_cursor(cursor)  # reject bad cursors before streaming starts
+    
+    if request.args.get('format') == 'ndjson':
+        return Response(
+            stream_with_context(pagination.iter_ndjson(query, model, cursor)),
+            mimetype='application/x-ndjson'
+        )
+    
+    limit = request.args.get('limit', pagination.DEFAULT_PAGE_SIZE, type=int)
+    limit = min(max(limit, 1), pagination.MAX_PAGE_SIZE)
+    sessions, next_cursor = pagination.keyset_page(query, model, cursor, limit)
+    return jsonify({
+        "sessions": [serialization.session_row(row) for row in sessions],
+        "next_cursor": next_cursor,
+        "total_sessions": _total_sessions(exercise, current_user_id)
+    }), 200
+
+def _total_sessions(exercise, current_user_id):
+    if exercise:
+        return aggregates.session_count(current_user_id, exercise)
+    summaries = aggregates.all_summaries(current_user_id)
+    return sum(aggregate.sessions_completed for aggregate in summaries.values())
+
+def _stats_payload(exercise, current_user_id, total_field='total_reps'):
+    """Totals from the maintained aggregate plus the last few sessions"""
+    _await_own_writes(current_user_id)
+    aggregate, sessions = aggregates.get_summary(current_user_id, exercise)
+    stats = {
+        total_field: aggregate.total_reps,
+        "sessions_completed": aggregate.sessions_completed,
+        "best_session": aggregate.best_session,
+        "average_per_session": aggregate.average_per_session()
+    }
+    return {
+        "stats": stats,
+        "recent_sessions": sessions  # Last 10 sessions
+    }
+
+def _await_own_writes(current_user_id):
+    """Read-your-writes in write-behind mode: give the user's queued sessions a moment to land"""
+    if current_app.config['WRITE_BEHIND']:
+        writebehind.wait_for_user(redis_client, current_user_id, current_app.config['WRITE_BEHIND_READ_WAIT_MS'] / 1000)
 
-@app.route('/api/register', methods=['POST'])
+def _save_session(exercise, current_user_id, reps, duration, message):
+    """201 with the saved session, or 202 with its queue id in write-behind mode
+
+    If the queue is unreachable the session is written synchronously instead.
+    """
+    if current_app.config['WRITE_BEHIND']:
+        try:
+            key = writebehind.enqueue(redis_client, current_user_id, exercise, reps, duration)
+            return jsonify({"message": "Session queued", "id": key, "status": "pending"}), 202
+        except redis.RedisError as e:
+            logger.warning("Session queue unavailable, saving directly", extra={'error': str(e)})
+    session = _create_session(exercise, current_user_id, reps, duration)
+    return jsonify({"message": message, "session": session.to_dict()}), 201
+
+def _create_session(exercise, current_user_id, reps, duration=0):
+    """Save a session with its aggregate in one commit, then update the leaderboards"""
+    partitions.ensure_current()
+    session = SESSION_MODELS[exercise](user_id=current_user_id, reps=reps, duration=duration)
+    db.session.add(session)
+    aggregates.record_session(session, exercise)
+    rollups.record_session(session, exercise)
+    db.session.commit()
+    _update_leaderboard(leaderboard.record_session, exercise, session)
+    _bump_versions(current_user_id, exercise)
+    return session
+
+def _delete_session(exercise, current_user_id, session_id):
+    """Delete one of the user's sessions; returns False if it doesn't exist"""
+    _await_own_writes(current_user_id)
+    model = SESSION_MODELS[exercise]
+    session = model.query.filter_by(id=session_id, user_id=current_user_id).first()
+    if not session:
+        return False
+    aggregates.discard_session(session, exercise)
+    rollups.discard_session(session, exercise)
+    db.session.delete(session)
+    db.session.commit()
+    _update_leaderboard(leaderboard.discard_session, exercise, session)
+    _bump_versions(current_user_id, exercise)
+    return True
+
+def _reset_sessions(exercise, current_user_id):
+    """Delete all of the user's sessions for one exercise"""
+    _await_own_writes(current_user_id)
+    model = SESSION_MODELS[exercise]
+    # Deleted sessions per (date, reps), to take them back out of the percentile histograms
+    sessions = (
+        db.session.query(model.date, model.reps, func.count())
+        .filter(model.user_id == current_user_id)
+        .group_by(model.date, model.reps)
+        .all()
+    )
+    model.query.filter_by(user_id=current_user_id).delete()
+    aggregates.clear_aggregate(current_user_id, exercise)
+    rollups.clear(current_user_id, exercise)
+    db.session.commit()
+    _update_leaderboard(leaderboard.remove_user, exercise, current_user_id, [tuple(row) for row in sessions])
+    _bump_versions(current_user_id, exercise)
+
+@api.route('/api/leaderboard/stream')
+@ratelimit.limit('leaderboard_stream')
+def leaderboard_stream():
+    """Server-Sent Events feed of the top squat and pushup boards"""
+    period = request.args.get('period', 'all')
+    if period not in live.PERIODS:
+        return jsonify({"error": "period must be 'all' or 'daily'"}), 400
+    try:
+        events = leaderboard_hub.events(period)
+        first = next(events)  # subscribe now so Redis errors and a full worker surface as a 503
+    except live.StreamsFull as e:
+        return _busy_response(e)
+    except redis.RedisError as e:
+        return jsonify({"error": str(e)}), 503
+
+    def stream():
+        yield first
+        yield from events
+
+    return Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+def _update_leaderboard(update, *args):
+    """Apply a leaderboard change after commit; drift is repaired by rebuild-leaderboards"""
+    try:
+        update(redis_client, *args)
+    except redis.RedisError as e:
+        logger.warning("Leaderboard update failed", extra={'error': str(e)})
+
+def _bump_versions(current_user_id, *exercises):
+    """Expire the user's and the boards' ETags after a committed write"""
+    try:
+        versions.bump(redis_client, [current_user_id], exercises)
+    except redis.RedisError as e:
+        logger.warning("Version bump failed", extra={'error': str(e)})
+
+def _expire_all_etags():
+    """After rewriting derived data in bulk, no earlier ETag may match"""
+    try:
+        versions.bump_all(redis_client)
+    except redis.RedisError as e:
+        click.echo(f"Could not expire cached ETags: {e}", err=True)
+
+
+@api.route('/api/register', methods=['POST'])
+@ratelimit.limit('auth')
 def register():
     """Register a new user"""
     try:
@@ -88,10 +381,11 @@ def register():
         
         # Create new user
         user = User(username=username, email=email)
-        user.set_password(password)
+        user.password_hash = password_hasher.hash(password)
         
         db.session.add(user)
         db.session.commit()
+        _update_leaderboard(leaderboard.remember_username, user)
         
         # Create tokens
         access_token = create_access_token(identity=str(user.id))
@@ -104,11 +398,15 @@ def register():
             "refresh_token": refresh_token
         }), 201
         
+    except passwords.HasherBusy as e:
+        db.session.rollback()
+        return _busy_response(e)
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/login', methods=['POST'])
+@api.route('/api/login', methods=['POST'])
+@ratelimit.limit('auth')
 def login():
     """Login user"""
     try:
@@ -128,9 +426,17 @@ def login():
             (User.username == username_or_email) | (User.email == username_or_email.lower())
         ).first()
         
-        if not user or not user.check_password(password):
+        if not user or not password_hasher.verify(password, user.password_hash):
             return jsonify({"error": "Invalid username/email or password"}), 401
         
+        # Upgrade hashes made with an old work factor while we have the password
+        if password_hasher.needs_rehash(user.password_hash):
+            try:
+                user.password_hash = password_hasher.hash(password)
+                db.session.commit()
+            except passwords.HasherBusy:
+                pass
+        
         # Create tokens
         access_token = create_access_token(identity=str(user.id))
         refresh_token = create_refresh_token(identity=str(user.id))
@@ -142,10 +448,12 @@ def login():
             "refresh_token": refresh_token
         }), 200
         
+    except passwords.HasherBusy as e:
+        return _busy_response(e)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/refresh', methods=['POST'])
+@api.route('/api/refresh', methods=['POST'])
 @jwt_required(refresh=True)
 def refresh():
     """Refresh access token"""
@@ -160,7 +468,7 @@ def refresh():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/debug-token', methods=['GET'])
+@api.route('/api/debug-token', methods=['GET'])
 @jwt_required()
 def debug_token():
     """Debug endpoint to check JWT token"""
@@ -169,11 +477,10 @@ def debug_token():
         current_user_id = get_jwt_identity()
         jwt_data = get_jwt()
         
-        print(f"Debug Token - Identity: {current_user_id}, Type: {type(current_user_id)}")
-        print(f"JWT Data: {jwt_data}")
+        logger.debug("Debug token", extra={'identity': current_user_id, 'jwt_data': jwt_data})
         
         # Check if user exists
-        user = User.query.get(current_user_id)
+        user = get_current_user()
         user_exists = user is not None
         
         return jsonify({
@@ -181,48 +488,61 @@ def debug_token():
             "identity_type": str(type(current_user_id)),
             "jwt_data": jwt_data,
             "user_exists": user_exists,
-            "user_id": user.id if user else None
+            "user_id": user['id'] if user else None
         }), 200
         
     except Exception as e:
-        print(f"Debug token error: {str(e)}")
+        logger.exception("Debug token error")
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/profile', methods=['GET'])
+@api.route('/api/profile', methods=['GET'])
 @jwt_required()
+@versions.conditional(versions.user_data)
 def get_profile():
     """Get current user profile"""
     try:
-        current_user_id = get_jwt_identity()
-        print(f"JWT Identity: {current_user_id}, Type: {type(current_user_id)}")
-        
-        # Ensure current_user_id is an integer
-        if current_user_id is not None:
-            current_user_id = int(current_user_id)
-        
-        user = User.query.get(current_user_id)
-        
-        if not user:
-            return jsonify({"error": "User not found"}), 404
-        
+        # Loaded from the user cache when the token was verified; a missing user is a
+        # 401 from user_not_found before this runs
         return jsonify({
-            "user": user.to_dict()
+            "user": get_current_user()
         }), 200
         
     except Exception as e:
-        print(f"Profile error: {str(e)}")
+        logger.exception("Profile error")
+        return jsonify({"error": str(e)}), 500
+
+@api.route('/api/dashboard', methods=['GET'])
+@jwt_required()
+@versions.conditional(versions.user_data)
+@replicas.read_only
+def get_dashboard():
+    """Profile, per-exercise stats and recent activity in one response
+
+    ?fields=profile,stats,recent picks sections (default all); ?recent=N sizes the feed.
+    """
+    try:
+        current_user_id = int(get_jwt_identity())
+        fields = dashboard.parse_fields(request.args.get('fields'))
+        recent_limit = request.args.get('recent', dashboard.DEFAULT_RECENT, type=int)
+        
+        _await_own_writes(current_user_id)
+        result = dashboard.load_dashboard(current_user_id, get_current_user(), fields, recent_limit)
+        return jsonify(result), 200
+        
+    except dashboard.UnknownField as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/profile', methods=['PATCH'])
+@api.route('/api/profile', methods=['PATCH'])
 @jwt_required()
 def update_profile():
     """Update current user profile"""
     try:
-        current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
-        
-        if not user:
-            return jsonify({"error": "User not found"}), 404
+        # The token's user was resolved (or rejected with 401) before this runs; the row
+        # itself is loaded so the change is tracked and invalidates the user cache
+        current_user_id = get_current_user()['id']
+        user = db.session.get(User, current_user_id)
         
         data = request.get_json()
         if not data:
@@ -254,6 +574,7 @@ def update_profile():
             user.email = email
         
         db.session.commit()
+        _update_leaderboard(leaderboard.remember_username, user)
         
         return jsonify({
             "message": "Profile updated successfully",
@@ -264,7 +585,7 @@ def update_profile():
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/squat-session', methods=['POST'])
+@api.route('/api/squat-session', methods=['POST'])
 @jwt_required()
 def save_squat_session():
     """Save a completed squat session"""
@@ -278,92 +599,150 @@ def save_squat_session():
         squat_count = int(data['squat_count'])
         duration = data.get('duration', 0)  # in seconds
         
-        session = SquatSession(
-            user_id=current_user_id,
-            squat_count=squat_count,
-            duration=duration
-        )
+        return _save_session('squat', current_user_id, squat_count, duration, "Session saved successfully")
         
-        db.session.add(session)
-        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+@api.route('/api/sessions/batch', methods=['POST'])
+@jwt_required()
+def save_sessions_batch():
+    """Save a batch of squat/pushup sessions recorded offline"""
+    try:
+        current_user_id = get_jwt_identity()
+        data = request.get_json()
+        
+        if not data or 'sessions' not in data:
+            return jsonify({"error": "Missing sessions in request"}), 400
+        
+        results, sessions_by_day = ingest.ingest_batch(current_user_id, data['sessions'])
+        for exercise, days in sessions_by_day.items():
+            _update_leaderboard(leaderboard.record_totals, exercise, current_user_id, days)
+        if sessions_by_day:
+            _bump_versions(current_user_id, *sessions_by_day)
         
         return jsonify({
-            "message": "Session saved successfully",
-            "session": session.to_dict()
-        }), 201
+            "message": "Batch processed",
+            "created": sum(1 for r in results if r['status'] == 'created'),
+            "duplicates": sum(1 for r in results if r['status'] == 'duplicate'),
+            "errors": sum(1 for r in results if r['status'] == 'error'),
+            "results": results
+        }), 200
         
+    except ingest.BatchError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/stats', methods=['GET'])
+@api.route('/api/rep-count', methods=['POST'])
+@jwt_required()
+def count_reps():
+    """Count reps server-side from a batch of pose keypoint frames"""
+    # Imported here so NumPy only loads in workers that actually count reps
+    import repcount
+    try:
+        data = request.get_json()
+        
+        if not data or 'frames' not in data:
+            return jsonify({"error": "Missing frames in request"}), 400
+        
+        result = repcount.count_reps(
+            data['frames'],
+            exercise=data.get('exercise', 'squat'),
+            layout=data.get('layout', 'movenet'),
+            timestamps=data.get('timestamps'),
+            fps=data.get('fps', repcount.DEFAULT_FPS)
+        )
+        return jsonify(result), 200
+        
+    except repcount.RepCountError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@api.route('/api/stats', methods=['GET'])
 @jwt_required()
+@versions.conditional(versions.user_data)
+@replicas.read_only
 def get_user_stats():
     """Get user statistics"""
     try:
         current_user_id = get_jwt_identity()
-        print(f"Stats - JWT Identity: {current_user_id}, Type: {type(current_user_id)}")
         
         # Ensure current_user_id is an integer
         if current_user_id is not None:
             current_user_id = int(current_user_id)
         
-        # Get user's squat sessions
-        sessions = SquatSession.query.filter_by(user_id=current_user_id).all()
+        # Read the maintained aggregate instead of scanning every session
+        return jsonify(_stats_payload('squat', current_user_id, 'total_squats')), 200
         
-        total_squats = sum(session.squat_count for session in sessions)
-        sessions_completed = len(sessions)
-        best_session = max([session.squat_count for session in sessions]) if sessions else 0
-        average_per_session = total_squats / sessions_completed if sessions_completed > 0 else 0
+    except Exception as e:
+        logger.exception("Stats error")
+        return jsonify({"error": str(e)}), 500
+
+@api.route('/api/stats/history', methods=['GET'])
+@jwt_required()
+@versions.conditional(versions.user_data)
+@replicas.read_only
+def get_stats_history():
+    """Per-day, week or month totals for one exercise, read from rollup buckets"""
+    try:
+        current_user_id = int(get_jwt_identity())
+        exercise = request.args.get('exercise', 'squat')
+        if exercise not in SESSION_MODELS:
+            return _unknown_exercise(exercise)
         
-        stats = {
-            "total_squats": total_squats,
-            "sessions_completed": sessions_completed,
-            "best_session": best_session,
-            "average_per_session": round(average_per_session, 1)
-        }
+        start = request.args.get('from')
+        end = request.args.get('to')
+        try:
+            start = date.fromisoformat(start) if start else None
+            end = date.fromisoformat(end) if end else None
+        except ValueError:
+            return jsonify({"error": "from and to must be dates (YYYY-MM-DD)"}), 400
         
-        recent_sessions = [session.to_dict() for session in sessions[-10:]]  # Last 10 sessions
+        granularity = request.args.get('granularity', 'day')
+        _await_own_writes(current_user_id)
+        first, last, buckets = rollups.history(current_user_id, exercise, granularity, start, end)
         
         return jsonify({
-                "stats": stats,
-                "recent_sessions": recent_sessions
-            }), 200
+            "exercise": exercise,
+            "granularity": granularity,
+            "from": first.isoformat(),
+            "to": last.isoformat(),
+            "buckets": buckets
+        }), 200
         
+    except rollups.InvalidRange as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        print(f"Stats error: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/sessions', methods=['GET'])
+@api.route('/api/sessions', methods=['GET'])
 @jwt_required()
+@versions.conditional(versions.user_data)
+@replicas.read_only
 def get_sessions():
-    """Get all squat sessions for current user"""
+    """Get squat sessions for current user, newest first, one page at a time"""
     try:
         current_user_id = get_jwt_identity()
-        sessions = SquatSession.query.filter_by(user_id=current_user_id).order_by(SquatSession.timestamp.desc()).all()
-            
-        return jsonify({
-                "sessions": [session.to_dict() for session in sessions],
-                "total_sessions": len(sessions)
-            }), 200
+        return _sessions_response('squat', current_user_id)
         
+    except pagination.InvalidCursor as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/sessions/<int:session_id>', methods=['DELETE'])
+@api.route('/api/sessions/<int:session_id>', methods=['DELETE'])
 @jwt_required()
 def delete_session(session_id):
     """Delete a specific session"""
     try:
         current_user_id = get_jwt_identity()
-        session = SquatSession.query.filter_by(id=session_id, user_id=current_user_id).first()
-        
-        if not session:
+        if not _delete_session('squat', current_user_id, session_id):
             return jsonify({"error": "Session not found"}), 404
     
-        db.session.delete(session)
-        db.session.commit()
-    
         return jsonify({
                 "message": "Session deleted successfully"
             }), 200
@@ -372,7 +751,7 @@ def delete_session(session_id):
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/reset-stats', methods=['POST'])
+@api.route('/api/reset-stats', methods=['POST'])
 @jwt_required()
 def reset_stats():
     """Reset all user statistics and sessions"""
@@ -380,8 +759,7 @@ def reset_stats():
         current_user_id = get_jwt_identity()
         
         # Delete all sessions for the user
-        SquatSession.query.filter_by(user_id=current_user_id).delete()
-        db.session.commit()
+        _reset_sessions('squat', current_user_id)
     
         return jsonify({
                 "message": "All stats and sessions reset successfully"
@@ -391,53 +769,44 @@ def reset_stats():
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/exercise-ai')
+@api.route('/api/exercise-ai')
 @jwt_required()
+@ratelimit.limit('exercise_ai')
 def exercise_ai():
+    """AI summary for an exercise; ?async=1 returns a job id to poll instead of waiting"""
     query = request.args.get('query', '').strip()
     if not query:
         return jsonify({'error': 'Missing query parameter'}), 400
-    cache_key = f"exercise_ai:{query.lower()}"
-    cached = redis_client.get(cache_key)
-    if cached:
-        return jsonify(json.loads(cached))
-    try:
-        import google.generativeai as genai
-    except ImportError:
-        return jsonify({'error': 'Gemini library not installed'}), 500
-    api_key = app.config.get('GEMINI_API_KEY')
-    if not api_key:
-        return jsonify({'error': 'Gemini API key not configured'}), 500
-    try:
-        genai.configure(api_key=api_key)
-        generation_config = {
-            "temperature": 1,
-            "top_p": 0.95,
-            "top_k": 40,
-            "max_output_tokens": 8192,
-        }
-        model = genai.GenerativeModel(model_name="gemini-2.5-pro",
-    generation_config=generation_config,)
-        prompt = f"""
-You are a fitness expert AI. Provide a detailed, friendly, and practical summary for the exercise: {query}.
-Include the following sections:
-1. Introduction (what is this exercise)
-2. three Benefits 
-3. Recommended weight and reps (give general advice for beginners/intermediate/advanced in table form)
-4. Step-by-step instructions (numbered)
-Format your answer with clear section headings.
-Note: if the input is not an exercise, just say "I'm sorry, I can't help with that."
-"""
-        response = model.generate_content(prompt)
-        summary = response.text.strip()
-        result = {'name': query, 'summary': summary}
-        redis_client.setex(cache_key, 60*60*24*3, json.dumps(result))  # Cache for 3 days
-        return jsonify(result)
+    summaries = current_app.extensions['exercise_ai']
+    try:
+        if request.args.get('async') in ('1', 'true'):
+            job = summaries.submit(query)
+            return jsonify(job), 200 if job['status'] == 'done' else 202
+        return jsonify(summaries.get_summary(query))
     except Exception as e:
-        print("EXERCISE-AI ERROR:", e)
+        logger.exception("Exercise AI error")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/pushup-session', methods=['POST'])
+@api.route('/api/exercise-ai/jobs/<job_id>')
+@jwt_required()
+def exercise_ai_job(job_id):
+    """Poll a background summary job; ?wait=N long-polls up to N seconds (max 30)"""
+    wait = min(max(request.args.get('wait', 0, type=float), 0), 30)
+    try:
+        job = current_app.extensions['exercise_ai'].job(job_id, wait=wait)
+    except redis.RedisError as e:
+        return jsonify({'error': str(e)}), 503
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job), 200
+
+@api.route('/api/exercise-ai/cache-stats')
+@jwt_required()
+def exercise_ai_cache_stats():
+    """Summary cache hit/miss counters for the worker that serves this request"""
+    return jsonify(current_app.extensions['exercise_ai'].stats()), 200
+
+@api.route('/api/pushup-session', methods=['POST'])
 @jwt_required()
 def save_pushup_session():
     """Save a completed pushup session"""
@@ -448,78 +817,51 @@ def save_pushup_session():
             return jsonify({"error": "Missing pushup_count in request"}), 400
         pushup_count = int(data['pushup_count'])
         duration = data.get('duration', 0)  # in seconds
-        session = PushupSession(
-            user_id=current_user_id,
-            pushup_count=pushup_count,
-            duration=duration
-        )
-        db.session.add(session)
-        db.session.commit()
-        return jsonify({
-            "message": "Pushup session saved successfully",
-            "session": session.to_dict()
-        }), 201
+        return _save_session('pushup', current_user_id, pushup_count, duration, "Pushup session saved successfully")
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/pushup-stats', methods=['GET'])
+@api.route('/api/pushup-stats', methods=['GET'])
 @jwt_required()
+@versions.conditional(versions.user_data)
+@replicas.read_only
 def get_pushup_stats():
     """Get user pushup statistics"""
     try:
         current_user_id = get_jwt_identity()
-        print(f"Pushup Stats - JWT Identity: {current_user_id}, Type: {type(current_user_id)}")
         
         # Ensure current_user_id is an integer
         if current_user_id is not None:
             current_user_id = int(current_user_id)
         
-        sessions = PushupSession.query.filter_by(user_id=current_user_id).all()
-        total_pushups = sum(session.pushup_count for session in sessions)
-        sessions_completed = len(sessions)
-        best_session = max([session.pushup_count for session in sessions]) if sessions else 0
-        average_per_session = total_pushups / sessions_completed if sessions_completed > 0 else 0
-        stats = {
-            "total_pushups": total_pushups,
-            "sessions_completed": sessions_completed,
-            "best_session": best_session,
-            "average_per_session": round(average_per_session, 1)
-        }
-        recent_sessions = [session.to_dict() for session in sessions[-10:]]  # Last 10 sessions
-        return jsonify({
-            "stats": stats,
-            "recent_sessions": recent_sessions
-        }), 200
+        return jsonify(_stats_payload('pushup', current_user_id, 'total_pushups')), 200
     except Exception as e:
-        print(f"Pushup stats error: {str(e)}")
+        logger.exception("Pushup stats error")
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/pushup-sessions', methods=['GET'])
+@api.route('/api/pushup-sessions', methods=['GET'])
 @jwt_required()
+@versions.conditional(versions.user_data)
+@replicas.read_only
 def get_pushup_sessions():
-    """Get all pushup sessions for current user"""
+    """Get pushup sessions for current user, newest first, one page at a time"""
     try:
         current_user_id = get_jwt_identity()
-        sessions = PushupSession.query.filter_by(user_id=current_user_id).order_by(PushupSession.timestamp.desc()).all()
-        return jsonify({
-            "sessions": [session.to_dict() for session in sessions],
-            "total_sessions": len(sessions)
-        }), 200
+        return _sessions_response('pushup', current_user_id)
+    except pagination.InvalidCursor as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/pushup-sessions/<int:session_id>', methods=['DELETE'])
+@api.route('/api/pushup-sessions/<int:session_id>', methods=['DELETE'])
 @jwt_required()
 def delete_pushup_session(session_id):
     """Delete a specific pushup session"""
     try:
         current_user_id = get_jwt_identity()
-        session = PushupSession.query.filter_by(id=session_id, user_id=current_user_id).first()
-        if not session:
+        if not _delete_session('pushup', current_user_id, session_id):
             return jsonify({"error": "Session not found"}), 404
-        db.session.delete(session)
-        db.session.commit()
         return jsonify({
             "message": "Pushup session deleted successfully"
         }), 200
@@ -527,14 +869,13 @@ def delete_pushup_session(session_id):
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/reset-pushup-stats', methods=['POST'])
+@api.route('/api/reset-pushup-stats', methods=['POST'])
 @jwt_required()
 def reset_pushup_stats():
     """Reset all user pushup statistics and sessions"""
     try:
         current_user_id = get_jwt_identity()
-        PushupSession.query.filter_by(user_id=current_user_id).delete()
-        db.session.commit()
+        _reset_sessions('pushup', current_user_id)
         return jsonify({
             "message": "All pushup stats and sessions reset successfully"
         }), 200
@@ -542,74 +883,496 @@ def reset_pushup_stats():
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/leaderboard/squats')
-def leaderboard_squats():
-    results = (
+@api.route('/api/export', methods=['GET'])
+@jwt_required()
+@ratelimit.limit('export')
+@replicas.read_only
+def export_sessions():
+    """Stream the caller's full session history as CSV, NDJSON or Parquet
+
+    ?format=csv|ndjson|parquet (default csv), ?exercise= for one exercise, and
+    ?since= with the X-Export-Watermark of an earlier export (or an ISO time)
+    for an incremental export, which overlaps the last one: dedupe by id.
+    CSV and NDJSON are gzipped when the client accepts it.
+    """
+    fmt = request.args.get('format', 'csv')
+    if fmt not in export.FORMATS:
+        return jsonify({"error": f"format must be one of: {', '.join(export.FORMATS)}"}), 400
+    exercise = request.args.get('exercise')
+    if exercise and exercise not in SESSION_MODELS:
+        return _unknown_exercise(exercise)
+    
+    try:
+        current_user_id = int(get_jwt_identity())
+        _await_own_writes(current_user_id)
+        model = SESSION_MODELS[exercise] if exercise else ExerciseSession
+        since = export.since_filter(model, request.args.get('since'))
+        upto = export.watermark()
+        chunks = export.stream(fmt, export.rows(model, since, current_user_id))
+    except export.ExportError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    
+    headers = {
+        'Content-Disposition': f'attachment; filename="fitv-{exercise or "sessions"}.{fmt}"',
+        'X-Export-Watermark': upto,
+        'Cache-Control': 'no-store',
+        'Vary': 'Accept-Encoding',
+    }
+    # Parquet pages are already compressed
+    if fmt != 'parquet' and 'gzip' in request.accept_encodings:
+        chunks = export.gzip_stream(chunks)
+        headers['Content-Encoding'] = 'gzip'
+    return Response(stream_with_context(chunks), mimetype=export.FORMATS[fmt], headers=headers)
+
+def _unknown_exercise(exercise):
+    return jsonify({"error": f"Unknown exercise '{exercise}', expected one of: {', '.join(SESSION_MODELS)}"}), 404
+
+@api.route('/api/exercises/stats', methods=['GET'])
+@jwt_required()
+@versions.conditional(versions.user_data)
+@replicas.read_only
+def get_all_exercise_stats():
+    """Totals for every exercise in one query"""
+    try:
+        current_user_id = int(get_jwt_identity())
+        _await_own_writes(current_user_id)
+        summaries = aggregates.all_summaries(current_user_id)
+        return jsonify({
+            "stats": {
+                exercise: {
+                    "total_reps": aggregate.total_reps,
+                    "sessions_completed": aggregate.sessions_completed,
+                    "best_session": aggregate.best_session,
+                    "average_per_session": aggregate.average_per_session()
+                }
+                for exercise, aggregate in summaries.items()
+            }
+        }), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@api.route('/api/exercises/sessions', methods=['GET'])
+@jwt_required()
+@versions.conditional(versions.user_data)
+@replicas.read_only
+def get_all_exercise_sessions():
+    """Sessions of every exercise for current user, newest first, one page at a time"""
+    try:
+        current_user_id = get_jwt_identity()
+        return _sessions_response(None, current_user_id)
+    except pagination.InvalidCursor as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@api.route('/api/exercises/<exercise>/sessions', methods=['POST'])
+@jwt_required()
+def save_exercise_session(exercise):
+    """Save a completed session of any exercise; body is {reps, duration}"""
+    if exercise not in SESSION_MODELS:
+        return _unknown_exercise(exercise)
+    try:
+        current_user_id = get_jwt_identity()
+        data = request.get_json()
+        
+        reps = data.get('reps', data.get(COUNT_FIELDS[exercise])) if data else None
+        if reps is None:
+            return jsonify({"error": "Missing reps in request"}), 400
+        reps = int(reps)
+        duration = int(data.get('duration', 0) or 0)  # in seconds
+        if reps < 0 or duration < 0:
+            return jsonify({"error": "reps and duration must not be negative"}), 400
+        
+        return _save_session(exercise, current_user_id, reps, duration, "Session saved successfully")
+        
+    except (TypeError, ValueError):
+        db.session.rollback()
+        return jsonify({"error": "reps and duration must be integers"}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+@api.route('/api/exercises/<exercise>/sessions', methods=['GET'])
+@jwt_required()
+@versions.conditional(versions.user_data)
+@replicas.read_only
+def get_exercise_sessions(exercise):
+    """Sessions of one exercise for current user, newest first, one page at a time"""
+    if exercise not in SESSION_MODELS:
+        return _unknown_exercise(exercise)
+    try:
+        current_user_id = get_jwt_identity()
+        return _sessions_response(exercise, current_user_id)
+    except pagination.InvalidCursor as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@api.route('/api/exercises/<exercise>/sessions/<int:session_id>', methods=['DELETE'])
+@jwt_required()
+def delete_exercise_session(exercise, session_id):
+    """Delete a specific session of one exercise"""
+    if exercise not in SESSION_MODELS:
+        return _unknown_exercise(exercise)
+    try:
+        current_user_id = get_jwt_identity()
+        if not _delete_session(exercise, current_user_id, session_id):
+            return jsonify({"error": "Session not found"}), 404
+        return jsonify({
+            "message": "Session deleted successfully"
+        }), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+@api.route('/api/exercises/<exercise>/stats', methods=['GET'])
+@jwt_required()
+@versions.conditional(versions.user_data)
+@replicas.read_only
+def get_exercise_stats(exercise):
+    """Statistics for one exercise"""
+    if exercise not in SESSION_MODELS:
+        return _unknown_exercise(exercise)
+    try:
+        current_user_id = int(get_jwt_identity())
+        return jsonify(_stats_payload(exercise, current_user_id)), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@api.route('/api/exercises/<exercise>/percentile', methods=['GET'])
+@jwt_required()
+@versions.conditional(versions.standing_data)
+def get_exercise_percentile(exercise):
+    """The caller's percentile among all users (and, with ?reps=N, a session's among all sessions)"""
+    if exercise not in SESSION_MODELS:
+        return _unknown_exercise(exercise)
+    period = request.args.get('period', 'all')
+    if period not in live.PERIODS:
+        return jsonify({"error": "period must be 'all' or 'daily'"}), 400
+    reps = request.args.get('reps')
+    if reps is not None:
+        if not reps.isdigit() or int(reps) < 1:
+            return jsonify({"error": "reps must be a positive integer"}), 400
+        reps = int(reps)
+    
+    try:
+        with replicas.primary():
+            ready = leaderboard.ensure_ready(redis_client, exercise)
+        if not ready:
+            return jsonify({"error": "Leaderboard is being rebuilt, try again shortly"}), 503
+        day = date.today() if period == 'daily' else None
+        standing = leaderboard.percentile(redis_client, exercise, get_jwt_identity(), day=day, reps=reps)
+    except redis.RedisError as e:
+        logger.warning("Percentile lookup failed", extra={'exercise': exercise, 'error': str(e)})
+        return jsonify({"error": "Rankings are temporarily unavailable"}), 503
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    
+    rank = standing['rank']
+    response = {
+        "exercise": exercise,
+        "period": period,
+        "total": standing['total'],
+        "users": rank['count'],
+        "percentile": rank['percentile'],
+        "top_percent": rank['top_percent'],
+        "band": rank['band']
+    }
+    if reps is not None:
+        session = standing['session']
+        response['session'] = {
+            "reps": reps,
+            "sessions": session['count'],
+            "percentile": session['percentile'],
+            "top_percent": session['top_percent'],
+            "band": session['band']
+        }
+    return jsonify(response), 200
+
+@api.route('/api/exercises/<exercise>/reset', methods=['POST'])
+@jwt_required()
+def reset_exercise_stats(exercise):
+    """Reset statistics and sessions for one exercise"""
+    if exercise not in SESSION_MODELS:
+        return _unknown_exercise(exercise)
+    try:
+        current_user_id = get_jwt_identity()
+        _reset_sessions(exercise, current_user_id)
+        return jsonify({
+            "message": f"All {exercise} stats and sessions reset successfully"
+        }), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+def _sql_leaderboard(exercise, day=None, limit=5):
+    """Fallback leaderboard computed with GROUP BY when Redis is unavailable"""
+    model = SESSION_MODELS[exercise]
+    query = (
         db.session.query(
             User.username,
-            func.sum(SquatSession.squat_count).label('total_squats')
+            func.sum(model.reps).label('total')
         )
-        .join(SquatSession, SquatSession.user_id == User.id)
-        .group_by(User.id)
-        .order_by(desc('total_squats'))
-        .limit(5)
-        .all()
+        .join(model, model.user_id == User.id)
     )
-    leaderboard = [{'username': r[0], 'total_squats': r[1]} for r in results]
-    return jsonify({'leaderboard': leaderboard})
+    if day is not None:
+        query = query.filter(model.date == day)
+    results = query.group_by(User.id).order_by(desc('total')).limit(limit).all()
+    return [{'rank': index + 1, 'username': r[0], 'total': r[1]} for index, r in enumerate(results)]
 
-@app.route('/api/leaderboard/squats/daily')
+def _leaderboard_response(exercise, total_field, daily=False):
+    """Top-N (and the caller's own rank, when authenticated) for one board"""
+    day = date.today() if daily else None
+    limit = min(max(request.args.get('limit', 5, type=int), 1), 100)
+    current_user_id = get_jwt_identity()
+    
+    me = None
+    try:
+        with replicas.primary():
+            ready = leaderboard.ensure_ready(redis_client, exercise)
+        if not ready:
+            raise redis.RedisError("leaderboard rebuild in progress")
+        entries, me = leaderboard.top(redis_client, exercise, day=day, limit=limit, user_id=current_user_id)
+    except redis.RedisError as e:
+        logger.warning("Leaderboard fallback to SQL", extra={'exercise': exercise, 'error': str(e)})
+        entries = _sql_leaderboard(exercise, day=day, limit=limit)
+    
+    response = {'leaderboard': [{'username': e['username'], total_field: e['total']} for e in entries]}
+    if me is not None:
+        response['me'] = {'rank': me['rank'], total_field: me['total']}
+    return jsonify(response)
+
+@api.route('/api/leaderboard/squats')
+@jwt_required(optional=True)
+@ratelimit.limit('leaderboard')
+@versions.conditional(versions.leaderboard_data('squat'))
+@replicas.read_only
+def leaderboard_squats():
+    return _leaderboard_response('squat', 'total_squats')
+
+@api.route('/api/leaderboard/squats/daily')
+@jwt_required(optional=True)
+@ratelimit.limit('leaderboard')
+@versions.conditional(versions.leaderboard_data('squat'))
+@replicas.read_only
 def leaderboard_squats_daily():
-    today = date.today()
-    results = (
-        db.session.query(
-            User.username,
-            func.sum(SquatSession.squat_count).label('total_squats')
-        )
-        .join(SquatSession, SquatSession.user_id == User.id)
-        .filter(SquatSession.date == today)
-        .group_by(User.id)
-        .order_by(desc('total_squats'))
-        .limit(5)
-        .all()
-    )
-    leaderboard = [{'username': r[0], 'total_squats': r[1]} for r in results]
-    return jsonify({'leaderboard': leaderboard})
+    return _leaderboard_response('squat', 'total_squats', daily=True)
 
-@app.route('/api/leaderboard/pushups')
+@api.route('/api/leaderboard/pushups')
+@jwt_required(optional=True)
+@ratelimit.limit('leaderboard')
+@versions.conditional(versions.leaderboard_data('pushup'))
+@replicas.read_only
 def leaderboard_pushups():
-    results = (
-        db.session.query(
-            User.username,
-            func.sum(PushupSession.pushup_count).label('total_pushups')
-        )
-        .join(PushupSession, PushupSession.user_id == User.id)
-        .group_by(User.id)
-        .order_by(desc('total_pushups'))
-        .limit(5)
-        .all()
-    )
-    leaderboard = [{'username': r[0], 'total_pushups': r[1]} for r in results]
-    return jsonify({'leaderboard': leaderboard})
+    return _leaderboard_response('pushup', 'total_pushups')
 
-@app.route('/api/leaderboard/pushups/daily')
+@api.route('/api/leaderboard/pushups/daily')
+@jwt_required(optional=True)
+@ratelimit.limit('leaderboard')
+@versions.conditional(versions.leaderboard_data('pushup'))
+@replicas.read_only
 def leaderboard_pushups_daily():
-    today = date.today()
-    results = (
-        db.session.query(
-            User.username,
-            func.sum(PushupSession.pushup_count).label('total_pushups')
-        )
-        .join(PushupSession, PushupSession.user_id == User.id)
-        .filter(PushupSession.date == today)
-        .group_by(User.id)
-        .order_by(desc('total_pushups'))
-        .limit(5)
-        .all()
+    return _leaderboard_response('pushup', 'total_pushups', daily=True)
+
+@api.cli.command('init-db')
+def init_db_command():
+    """Create any missing tables and columns; run once per deploy before starting workers"""
+    created = partitions.create_tables(current_app.config['SESSION_PARTITIONS_AHEAD'])
+    if created:
+        click.echo(f"Created partitions {', '.join(created)}")
+    added = migrations.add_missing_columns()
+    if added:
+        click.echo(f"Added exercise_sessions columns {', '.join(added)}")
+    click.echo("Database tables are up to date")
+
+@api.cli.group('session-partitions')
+def session_partitions_group():
+    """Monthly partitions of exercise_sessions (PostgreSQL)"""
+
+@session_partitions_group.command('convert')
+def convert_partitions_command():
+    """Rebuild a plain exercise_sessions as a partitioned table, fixing session dates"""
+    try:
+        result = partitions.convert(current_app.config['SESSION_PARTITIONS_AHEAD'])
+    except partitions.PartitionError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"Copied {result['rows']} sessions into {len(result['partitions'])} partitions")
+    click.echo(f"Rebuilt {rollups.rebuild()} history buckets")
+    for exercise in SESSION_MODELS:
+        leaderboard.rebuild(redis_client, exercise)
+    _expire_all_etags()
+
+@session_partitions_group.command('maintain')
+def maintain_partitions_command():
+    """Create upcoming partitions, or on other databases fix dates that disagree with timestamps"""
+    if not partitions.supported():
+        with db.engine.begin() as conn:
+            fixed = partitions.repair_dates(conn)
+        click.echo(f"Fixed the date of {fixed} sessions")
+        if fixed:
+            click.echo(f"Rebuilt {rollups.rebuild()} history buckets")
+            for exercise in SESSION_MODELS:
+                leaderboard.rebuild(redis_client, exercise)
+            _expire_all_etags()
+        return
+    created = partitions.ensure_ahead(current_app.config['SESSION_PARTITIONS_AHEAD'])
+    click.echo(f"Created {len(created)} partitions{': ' + ', '.join(created) if created else ''}")
+
+@session_partitions_group.command('retain')
+@click.option('--months', type=int, help='Months to keep, including the current one (default: SESSION_RETENTION_MONTHS)')
+@click.option('--archive-dir', type=click.Path(file_okay=False, writable=True), help='Write detached partitions here as .csv.gz')
+@click.option('--drop', is_flag=True, help='Drop detached partitions once archived')
+def retain_partitions_command(months, archive_dir, drop):
+    """Detach partitions older than the retention window, then optionally archive and drop them"""
+    months = months if months is not None else current_app.config['SESSION_RETENTION_MONTHS']
+    if months <= 0:
+        raise click.ClickException("Set --months or SESSION_RETENTION_MONTHS to a positive number")
+    if drop and not archive_dir:
+        raise click.ClickException("--drop needs --archive-dir")
+    if not partitions.supported():
+        raise click.ClickException("Partitions need PostgreSQL")
+    cutoff = rollups.bucket_start(date.today(), 'month')
+    for _ in range(months - 1):
+        cutoff = rollups.bucket_start(cutoff - timedelta(days=1), 'month')
+    for name in partitions.detach_before(cutoff):
+        click.echo(f"Detached {name}")
+    if not archive_dir:
+        return
+    os.makedirs(archive_dir, exist_ok=True)
+    with db.engine.connect() as conn:
+        detached = partitions.detached_tables(conn)
+    for name in detached:
+        try:
+            path = partitions.archive(name, archive_dir, drop=drop)
+        except partitions.PartitionError as e:
+            raise click.ClickException(str(e))
+        click.echo(f"Archived {name} to {path}{' and dropped it' if drop else ''}")
+
+@session_partitions_group.command('list')
+def list_partitions_command():
+    """Show attached and detached session partitions"""
+    if not partitions.supported():
+        raise click.ClickException("Partitions need PostgreSQL")
+    with db.engine.connect() as conn:
+        if not partitions.is_partitioned(conn):
+            raise click.ClickException(f"{partitions.TABLE} is not partitioned; run `session-partitions convert`")
+        for name, start in partitions.partitions(conn):
+            click.echo(f"{name}  {start:%Y-%m}")
+        for name in partitions.detached_tables(conn):
+            click.echo(f"{name}  detached")
+
+@api.cli.command('rebuild-stats')
+def rebuild_stats_command():
+    """Recompute per-user exercise aggregates from raw sessions"""
+    written = aggregates.rebuild_aggregates()
+    click.echo(f"Rebuilt {written} exercise aggregates")
+    _expire_all_etags()
+
+@api.cli.command('rebuild-rollups')
+def rebuild_rollups_command():
+    """Backfill the day/week/month history buckets from raw sessions"""
+    written = rollups.rebuild()
+    click.echo(f"Rebuilt {written} history buckets")
+    _expire_all_etags()
+
+@api.cli.command('migrate-sessions')
+@click.option('--drop-legacy', is_flag=True, help='Drop squat_sessions and pushup_sessions afterwards')
+def migrate_sessions_command(drop_legacy):
+    """Copy sessions from the per-exercise tables into exercise_sessions"""
+    try:
+        copied = migrations.migrate_legacy_sessions()
+    except migrations.MigrationError as e:
+        raise click.ClickException(str(e))
+    if not copied:
+        click.echo("No legacy session tables found")
+        return
+    for exercise, rows in copied.items():
+        click.echo(f"Copied {rows} {exercise} sessions")
+    written = aggregates.rebuild_aggregates()
+    click.echo(f"Rebuilt {written} exercise aggregates")
+    click.echo(f"Rebuilt {rollups.rebuild()} history buckets")
+    _expire_all_etags()
+    if drop_legacy:
+        migrations.drop_legacy_tables()
+        click.echo("Dropped legacy session tables")
+
+@api.cli.command('session-writer')
+@click.option('--consumer', help='Name within the consumer group (default: host-pid)')
+def session_writer_command(consumer):
+    """Write sessions queued in write-behind mode to Postgres until stopped"""
+    config = current_app.config
+    writer = writebehind.SessionWriter(
+        redis_client,
+        consumer=consumer,
+        batch_size=config['WRITE_BEHIND_BATCH_SIZE'],
+        retries=config['WRITE_BEHIND_RETRIES'],
+        max_deliveries=config['WRITE_BEHIND_MAX_DELIVERIES'],
+        claim_idle_ms=config['WRITE_BEHIND_CLAIM_IDLE_MS']
     )
-    leaderboard = [{'username': r[0], 'total_pushups': r[1]} for r in results]
-    return jsonify({'leaderboard': leaderboard})
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopping.set())
+    click.echo(f"Writing queued sessions as {writer.consumer}")
+    writer.run(should_stop=stopping.is_set)
+
+@api.cli.command('requeue-dead-sessions')
+@click.option('--count', default=100, show_default=True, help='Entries to move back')
+def requeue_dead_sessions_command(count):
+    """Move dead-lettered sessions back onto the write-behind stream"""
+    moved = writebehind.requeue_dead(redis_client, count)
+    click.echo(f"Requeued {moved} sessions")
+
+@api.cli.command('export-sessions')
+@click.option('--format', 'fmt', type=click.Choice(list(export.FORMATS)), default='csv', show_default=True)
+@click.option('--output', '-o', type=click.Path(dir_okay=False, writable=True), help='File to write (default: stdout)')
+@click.option('--exercise', type=click.Choice(list(SESSION_MODELS)), help='Only this exercise')
+@click.option('--user', 'user_id', type=int, help='Only this user id')
+@click.option('--since', help='Watermark printed by an earlier export, or an ISO 8601 time; dedupe the overlap by id')
+@click.option('--gzip', 'compress', is_flag=True, help='Gzip the output')
+def export_sessions_command(fmt, output, exercise, user_id, since, compress):
+    """Stream every user's session history, e.g. for analytics or backups"""
+    model = SESSION_MODELS[exercise] if exercise else ExerciseSession
+    try:
+        since = export.since_filter(model, since)
+        upto = export.watermark()
+        chunks = export.stream(fmt, export.rows(model, since, user_id))
+    except export.ExportError as e:
+        raise click.ClickException(str(e))
+    if compress:
+        chunks = export.gzip_stream(chunks)
+    
+    handle = open(output, 'wb') if output else click.get_binary_stream('stdout')
+    try:
+        for chunk in chunks:
+            handle.write(chunk)
+    finally:
+        if output:
+            handle.close()
+    click.echo(f"Exported sessions; pass --since {upto} next time and dedupe the overlap by id", err=True)
+
+@api.cli.command('rebuild-leaderboards')
+def rebuild_leaderboards_command():
+    """Rebuild the Redis leaderboards from Postgres"""
+    for exercise in SESSION_MODELS:
+        users = leaderboard.rebuild(redis_client, exercise)
+        click.echo(f"Rebuilt {exercise} leaderboard with {users} users")
+    versions.bump(redis_client, exercises=SESSION_MODELS)
+
+@api.cli.command('warm-exercise-ai')
+@click.argument('exercises', nargs=-1)
+@click.option('--file', 'path', type=click.Path(exists=True), help='File with one exercise per line')
+def warm_exercise_ai_command(exercises, path):
+    """Pre-generate AI summaries for common (or the given) exercises"""
+    queries = list(exercises)
+    if path:
+        with open(path) as handle:
+            queries += [line.strip() for line in handle if line.strip()]
+    summaries = current_app.extensions['exercise_ai']
+    generated, skipped = summaries.warm(queries or exercise_ai_service.COMMON_EXERCISES)
+    click.echo(f"Generated {generated} summaries, {skipped} already cached")
+
+app = create_app()
 
-print("Gemini API Key:", app.config.get('GEMINI_API_KEY'))
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=8000)
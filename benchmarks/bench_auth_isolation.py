@@ -0,0 +1,137 @@
+"""Show that a login storm no longer degrades latency of unrelated routes.
+
+Usage: python benchmarks/bench_auth_isolation.py [--seconds 10] [--login-threads 16] [--stats-threads 4]
+
+Serves the app with a threaded WSGI server and, for each hashing mode, measures
+GET /api/stats latency while login threads hammer POST /api/login:
+
+  baseline  no logins running
+  inline    bcrypt in the request thread (PASSWORD_HASH_WORKERS=0, the old behaviour)
+  pooled    bounded hashing pool with fast-fail (the configured defaults)
+
+Uses DATABASE_URL (defaults to a throwaway SQLite file) and REDIS_URL.
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_auth.db'))
+# Measures the routes themselves; bench_ratelimit.py covers the limits
+os.environ.setdefault('RATELIMIT_ENABLED', '0')
+
+from werkzeug.serving import make_server  # noqa: E402
+from flask_jwt_extended import create_access_token  # noqa: E402
+from config import Config  # noqa: E402
+import app as fitv  # noqa: E402
+import partitions  # noqa: E402
+from models import db, User  # noqa: E402
+
+USERNAME = 'benchuser'
+PASSWORD = 'benchpass'
+
+
+def percentile(values, pct):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def serve(config):
+    app = fitv.create_app(config)
+    with app.app_context():
+        partitions.create_tables(app.config['SESSION_PARTITIONS_AHEAD'])
+        user = User.query.filter_by(username=USERNAME).first()
+        if user is None:
+            user = User(username=USERNAME, email='bench@example.com')
+            user.set_password(PASSWORD, rounds=app.config['BCRYPT_ROUNDS'])
+            db.session.add(user)
+            db.session.commit()
+        token = create_access_token(identity=str(user.id))
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, token
+
+
+def worker(port, stop, request, record):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            method, path, body, headers = request()
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            record(response.status, time.perf_counter() - start)
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+
+
+def run(label, config, seconds, login_threads, stats_threads):
+    server, token = serve(config)
+    port = server.server_port
+    stop = threading.Event()
+    stats_latency, login_status = [], {}
+    lock = threading.Lock()
+
+    def stats_request():
+        return 'GET', '/api/stats', None, {'Authorization': f'Bearer {token}'}
+
+    def login_request():
+        body = json.dumps({'username_or_email': USERNAME, 'password': PASSWORD})
+        return 'POST', '/api/login', body, {'Content-Type': 'application/json'}
+
+    def record_stats(status, elapsed):
+        with lock:
+            stats_latency.append(elapsed)
+
+    def record_login(status, elapsed):
+        with lock:
+            login_status[status] = login_status.get(status, 0) + 1
+
+    threads = [threading.Thread(target=worker, args=(port, stop, stats_request, record_stats))
+               for _ in range(stats_threads)]
+    threads += [threading.Thread(target=worker, args=(port, stop, login_request, record_login))
+                for _ in range(login_threads)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    server.shutdown()
+
+    ms = [value * 1000 for value in stats_latency]
+    logins = ', '.join(f"{status}: {count}" for status, count in sorted(login_status.items())) or '-'
+    print(f"{label:<9} {len(ms) / seconds:>9.1f} {percentile(ms, 50):>8.1f} {percentile(ms, 95):>8.1f} "
+          f"{percentile(ms, 99):>8.1f}   {logins}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--login-threads', type=int, default=16)
+    parser.add_argument('--stats-threads', type=int, default=4)
+    args = parser.parse_args()
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    class Inline(Config):
+        PASSWORD_HASH_WORKERS = 0
+
+    print(f"{'mode':<9} {'stats/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}   login responses")
+    run('baseline', Config, args.seconds, 0, args.stats_threads)
+    run('inline', Inline, args.seconds, args.login_threads, args.stats_threads)
+    run('pooled', Config, args.seconds, args.login_threads, args.stats_threads)
+
+
+if __name__ == '__main__':
+    main()
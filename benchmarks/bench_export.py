@@ -0,0 +1,88 @@
+"""Measure export throughput and peak memory per format as the history grows.
+
+Usage: python benchmarks/bench_export.py [--sizes 10000 100000] [--formats csv ndjson parquet] [--gzip]
+
+One user gets max(--sizes) squat sessions. Each size is then exported in each
+format through export.rows() and export.stream(), the way GET /api/export
+does, with the bytes discarded as they arrive. Reported per run:
+
+  rows/s       rows exported per second
+  MiB          size of the export
+  peak KiB     peak Python allocations during the export (tracemalloc)
+
+Peak memory should stay roughly the same as the size grows; a peak that
+scales with the row count means something is buffering the whole history.
+Uses DATABASE_URL (defaults to a throwaway SQLite file).
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_export.db'))
+
+import app as fitv  # noqa: E402
+import export  # noqa: E402
+from models import db, User, SquatSession  # noqa: E402
+
+
+def seed(count):
+    """One user with `count` squat sessions; returns the user id"""
+    user = User(username=f"bench_export_{time.time_ns()}", email=f"{time.time_ns()}@bench.local",
+                password_hash='x')
+    db.session.add(user)
+    db.session.flush()
+    start = datetime(2020, 1, 1)
+    for offset in range(0, count, 10000):
+        db.session.execute(SquatSession.__table__.insert(), [
+            {
+                'user_id': user.id, 'exercise_type': 'squat', 'reps': 5 + i % 40, 'duration': 30 + i % 90,
+                'timestamp': start + timedelta(minutes=37 * i),
+                'date': (start + timedelta(minutes=37 * i)).date(),
+                'time': (start + timedelta(minutes=37 * i)).time(),
+            }
+            for i in range(offset, min(offset + 10000, count))
+        ])
+    db.session.commit()
+    return user.id
+
+
+def run(fmt, user_id, size, compress):
+    chunks = export.stream(fmt, export.rows(SquatSession, user_id=user_id).limit(size))
+    if compress and fmt != 'parquet':
+        chunks = export.gzip_stream(chunks)
+    tracemalloc.start()
+    start = time.perf_counter()
+    written = sum(len(chunk) for chunk in chunks)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    db.session.expunge_all()
+    return elapsed, written, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', nargs='+', type=int, default=[10000, 100000], help='Sessions per export')
+    parser.add_argument('--formats', nargs='+', choices=list(export.FORMATS), default=list(export.FORMATS))
+    parser.add_argument('--gzip', action='store_true', help='Gzip CSV and NDJSON as the endpoint does')
+    args = parser.parse_args()
+
+    app = fitv.create_app()
+    with app.app_context():
+        db.create_all()
+        user_id = seed(max(args.sizes))
+        print(f"{'rows':>8} {'format':<8} {'rows/s':>10} {'MiB':>8} {'peak KiB':>9}")
+        for size in args.sizes:
+            for fmt in args.formats:
+                elapsed, written, peak = run(fmt, user_id, size, args.gzip)
+                print(f"{size:>8} {fmt:<8} {size / elapsed:>10.0f} {written / 2 ** 20:>8.2f} {peak / 1024:>9.0f}")
+
+
+if __name__ == '__main__':
+    main()
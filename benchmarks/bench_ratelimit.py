@@ -0,0 +1,230 @@
+"""Load test: does a well-behaved client's latency stay flat while another client abuses the expensive routes?
+
+Usage: python benchmarks/bench_ratelimit.py [--abusers 16] [--duration 10] [--burst-window 5]
+                                           [--threads 4] [--ai-delay 1.0] [--json results.json]
+
+Starts gunicorn (one gthread worker with --threads threads, like a small
+production pod) twice: with RATELIMIT_ENABLED=0 and with the default policies.
+The exercise summaries come from the fake model client, which sleeps
+--ai-delay seconds per cache miss as a stand-in for Gemini. Each run has two phases:
+
+  baseline   only the good client: every 0.5 s it calls GET /api/leaderboard/squats, or
+             every 20th time a cached GET /api/exercise-ai, staying inside its own limits
+  abuse      the same, while --abusers threads send uncached /api/exercise-ai queries
+             and bad /api/login attempts as fast as they can, from one user and one IP
+
+The abuse phase is reported twice: its first --burst-window seconds, while
+the abusers spend the burst their buckets start with, and the rest, where
+only the sustained rate gets through. Reported per row: the good client's
+p50/p99/max latency and non-2xx responses, and the abusers' request count and
+share of 429s. Without limits the good client's latency grows past
+--ai-delay as the abusers hold every thread. With them its p50 should stay
+within a few times the baseline; what tail is left comes from the one worker
+answering hundreds of 429s a second, not from the model calls.
+
+Uses DATABASE_URL (defaults to a throwaway SQLite file) and REDIS_URL. When
+Redis is unreachable the limiter falls back to in-process buckets, which with
+one worker behave the same.
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_ratelimit.db'))
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+from flask_jwt_extended import create_access_token  # noqa: E402
+import app as fitv  # noqa: E402
+import partitions  # noqa: E402
+from models import db, User  # noqa: E402
+
+GOOD_INTERVAL = 0.5
+# The good client's every Nth request is a cached summary: one per 10 s, inside exercise_ai's 6/60
+SUMMARY_EVERY = 20
+CACHED_QUERY = 'squat'
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def prepare():
+    """Two users (good client, abuser) and their access tokens"""
+    with fitv.app.app_context():
+        partitions.create_tables(fitv.app.config['SESSION_PARTITIONS_AHEAD'])
+        tokens = []
+        for role in ('good', 'abuser'):
+            user = User(username=f"rl{role}{uuid.uuid4().hex[:8]}", email=f"{uuid.uuid4().hex}@bench.local",
+                        password_hash='x')
+            db.session.add(user)
+            db.session.commit()
+            tokens.append(create_access_token(identity=str(user.id)))
+        return tokens
+
+
+def start_server(port, limits, threads, ai_delay):
+    env = dict(os.environ)
+    env.update({
+        'BIND': f'127.0.0.1:{port}',
+        'WEB_CONCURRENCY': '1',
+        'WEB_THREADS': str(threads),
+        'RATELIMIT_ENABLED': '1' if limits else '0',
+        'EXERCISE_AI_CLIENT': 'fake',
+        'EXERCISE_AI_FAKE_DELAY': str(ai_delay),
+    })
+    server = subprocess.Popen(['gunicorn', '-c', 'gunicorn.conf.py', 'app:app'], cwd=ROOT, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            if request(port, 'GET', '/healthz')[0] == 200:
+                return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("gunicorn did not come up")
+
+
+def request(port, method, path, token=None, body=None, timeout=60):
+    """(status, seconds) for one request on a fresh connection"""
+    headers = {'Content-Type': 'application/json'}
+    if token:
+        headers['Authorization'] = f'Bearer {token}'
+    started = time.perf_counter()
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+    try:
+        conn.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+        status = conn.getresponse().status
+    finally:
+        conn.close()
+    return status, time.perf_counter() - started
+
+
+def good_client(port, token, stop, samples):
+    """Appends (seconds into the phase, status, latency seconds)"""
+    paths = ['/api/leaderboard/squats', f'/api/exercise-ai?query={CACHED_QUERY}']
+    phase_started = time.monotonic()
+    turn = 0
+    while not stop.is_set():
+        started = time.monotonic()
+        try:
+            status, seconds = request(port, 'GET', paths[turn % SUMMARY_EVERY == 0], token)
+        except OSError:
+            status, seconds = 0, time.monotonic() - started
+        samples.append((started - phase_started, status, seconds))
+        turn += 1
+        stop.wait(max(GOOD_INTERVAL - (time.monotonic() - started), 0))
+
+
+def abuser(port, token, stop, calls, index):
+    """Appends (seconds into the phase, status) for every call"""
+    phase_started = time.monotonic()
+    turn = 0
+    while not stop.is_set():
+        if turn % 2:
+            call = ('POST', '/api/login', None, {'username_or_email': 'nobody', 'password': 'wrong'})
+        else:
+            call = ('GET', f'/api/exercise-ai?query=abuse-{index}-{turn}-{uuid.uuid4().hex[:6]}', token, None)
+        started = time.monotonic() - phase_started
+        try:
+            status, _ = request(port, call[0], call[1], call[2], call[3])
+        except OSError:
+            status = 0
+        calls.append((started, status))
+        turn += 1
+
+
+def summarize(samples, statuses):
+    # A good client stuck behind the abusers may not start a request in a window at all
+    latencies = sorted(seconds * 1000 for _, _, seconds in samples) or [float('nan')]
+    return {
+        'good_requests': len(samples),
+        'good_errors': sum(1 for _, status, _ in samples if not 200 <= status < 300),
+        'p50_ms': round(statistics.median(latencies), 1),
+        'p99_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))], 1),
+        'max_ms': round(latencies[-1], 1),
+        'abuser_requests': len(statuses),
+        'abuser_429_share': round(statuses.count(429) / len(statuses), 3) if statuses else 0.0,
+    }
+
+
+def run_phase(port, tokens, duration, abusers, burst_window):
+    """{window: summary}; abuse phases are split at burst_window seconds"""
+    stop = threading.Event()
+    samples, calls = [], []
+    threads = [threading.Thread(target=good_client, args=(port, tokens[0], stop, samples))]
+    threads += [threading.Thread(target=abuser, args=(port, tokens[1], stop, calls, index))
+                for index in range(abusers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    if not abusers:
+        return {'baseline': summarize(samples, [])}
+    windows = {}
+    for name, inside in (('burst', lambda offset: offset < burst_window),
+                         ('sustained', lambda offset: offset >= burst_window)):
+        statuses = [status for offset, status in calls if inside(offset)]
+        windows[name] = summarize([sample for sample in samples if inside(sample[0])], statuses)
+    return windows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--abusers', type=int, default=16, help='Abusive client threads')
+    parser.add_argument('--duration', type=float, default=10,
+                        help='Seconds of baseline, and of the abuse phase after its burst window')
+    parser.add_argument('--burst-window', type=float, default=5,
+                        help='Seconds at the start of the abuse phase reported separately')
+    parser.add_argument('--threads', type=int, default=4, help='gunicorn threads')
+    parser.add_argument('--ai-delay', type=float, default=1.0, help='Seconds per uncached summary')
+    parser.add_argument('--json', dest='json_path', help='Write results to this file')
+    args = parser.parse_args()
+
+    tokens = prepare()
+    results = {}
+    print(f"{'limits':<7} {'window':<9} {'good p50':>9} {'p99':>8} {'max':>8} {'errors':>7} "
+          f"{'abuse reqs':>11} {'429 share':>10}")
+    for limits in (False, True):
+        port = free_port()
+        server = start_server(port, limits, args.threads, args.ai_delay)
+        try:
+            # Warm the good client's summary and the leaderboard so the phases measure steady state
+            request(port, 'GET', f'/api/exercise-ai?query={CACHED_QUERY}', tokens[0])
+            request(port, 'GET', '/api/leaderboard/squats', tokens[0])
+            for abusers, duration in ((0, args.duration), (args.abusers, args.burst_window + args.duration)):
+                for window, result in run_phase(port, tokens, duration, abusers, args.burst_window).items():
+                    results[f"{'on' if limits else 'off'}/{window}"] = result
+                    print(f"{'on' if limits else 'off':<7} {window:<9} {result['p50_ms']:>9} {result['p99_ms']:>8} "
+                          f"{result['max_ms']:>8} {result['good_errors']:>7} {result['abuser_requests']:>11} "
+                          f"{result['abuser_429_share']:>10}")
+        finally:
+            server.terminate()
+            server.wait()
+
+    if args.json_path:
+        with open(args.json_path, 'w') as handle:
+            json.dump({'abusers': args.abusers, 'duration': args.duration, 'burst_window': args.burst_window,
+                       'threads': args.threads,
+                       'ai_delay': args.ai_delay, 'results': results}, handle, indent=2)
+        print(f"\nWrote {args.json_path}")
+
+
+if __name__ == '__main__':
+    main()
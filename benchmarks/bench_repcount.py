@@ -0,0 +1,99 @@
+"""Benchmark the NumPy rep counter against a per-frame pure-Python loop.
+
+Usage: python benchmarks/bench_repcount.py [--frames 1000 10000 50000] [--repeat 5]
+
+The pure-Python version is a direct port of detectSquat() from
+frontend/src/components/squat.js and doubles as a correctness check: both
+implementations must report the same count.
+"""
+import argparse
+import math
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import repcount  # noqa: E402
+
+
+def synthetic_squats(n_frames, fps=30.0, rep_seconds=2.0, seed=0):
+    """MoveNet-layout frames of someone squatting continuously, with jitter"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(n_frames) / fps
+    knee = 140.0 + 40.0 * np.cos(2 * np.pi * t / rep_seconds) + rng.normal(0, 2.0, n_frames)
+    theta = np.radians(np.clip(knee, 0, 180))
+
+    frames = np.zeros((n_frames, 17, 3))
+    frames[:, :, 2] = 0.9
+    for hip, knee_i, ankle, x0 in ((11, 13, 15, 0.4), (12, 14, 16, 0.6)):
+        frames[:, knee_i, 0] = x0
+        frames[:, knee_i, 1] = 0.6
+        frames[:, hip, 0] = x0
+        frames[:, hip, 1] = 0.4
+        frames[:, ankle, 0] = x0 + 0.2 * np.sin(theta)
+        frames[:, ankle, 1] = 0.6 - 0.2 * np.cos(theta)
+    timestamps = t * 1000.0
+    return frames, timestamps
+
+
+def _angle(p1, p2, p3):
+    radians = math.atan2(p3[1] - p2[1], p3[0] - p2[0]) - math.atan2(p1[1] - p2[1], p1[0] - p2[0])
+    angle = abs(radians * 180.0 / math.pi)
+    return 360 - angle if angle > 180.0 else angle
+
+
+def count_squats_loop(frames, timestamps):
+    """Frame-by-frame port of the browser squat counter"""
+    spec = repcount.EXERCISES['squat']
+    index = repcount.LAYOUTS['movenet']
+    left = [index[name] for name in spec['joints'][0]]
+    right = [index[name] for name in spec['joints'][1]]
+    count = 0
+    progress = 'none'
+    last = -math.inf
+    for frame, now in zip(frames, timestamps):
+        if any(frame[i][2] <= repcount.MIN_SCORE for i in left + right):
+            continue
+        angle = (_angle(*(frame[i] for i in left)) + _angle(*(frame[i] for i in right))) / 2
+        low, high = spec['valid_range']
+        if angle < low or angle > high:
+            continue
+        if angle < spec['down_below']:
+            progress = 'squatting'
+        elif angle > spec['up_above']:
+            if progress == 'squatting' and now - last > spec['min_gap_ms']:
+                count += 1
+                last = now
+            progress = 'standing'
+    return count
+
+
+def best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--frames', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'frames':>8} {'reps':>6} {'numpy ms':>10} {'python ms':>10} {'speedup':>8}")
+    for n_frames in args.frames:
+        frames, timestamps = synthetic_squats(n_frames)
+        as_lists = frames.tolist()
+        fast, result = best_of(lambda: repcount.count_reps(frames, 'squat', 'movenet', timestamps), args.repeat)
+        slow, expected = best_of(lambda: count_squats_loop(as_lists, timestamps.tolist()), args.repeat)
+        assert result['count'] == expected, (result['count'], expected)
+        print(f"{n_frames:>8} {expected:>6} {fast * 1000:>10.2f} {slow * 1000:>10.2f} {slow / fast:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
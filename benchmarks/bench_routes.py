@@ -0,0 +1,238 @@
+"""Load-test the read routes and report latency, throughput and SQL queries per route.
+
+Usage: python benchmarks/bench_routes.py [--requests 200] [--concurrency 1] [--routes stats sessions ...]
+                                         [--seed-users 200] [--json results.json] [--compare old.json]
+
+Each route is driven for --requests requests as a random existing user. With
+--concurrency 1 requests go through the Flask test client in-process; higher
+values serve the app with a threaded WSGI server and hit it from that many
+HTTP client threads. SQL statements are counted per request with an engine
+event. Results print as a table and, with --json, are written in a form that
+--compare can diff against a later run.
+
+Uses DATABASE_URL (defaults to a throwaway SQLite file seeded via datagen.py
+with --seed-users users when empty; missing tables are created) and REDIS_URL.
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_routes.db'))
+# Measures the routes themselves; bench_ratelimit.py covers the limits
+os.environ.setdefault('RATELIMIT_ENABLED', '0')
+
+from flask import g, has_app_context  # noqa: E402
+from flask_jwt_extended import create_access_token  # noqa: E402
+from sqlalchemy import event, func  # noqa: E402
+from werkzeug.serving import make_server  # noqa: E402
+import app as fitv  # noqa: E402
+from models import db, User  # noqa: E402
+import datagen  # noqa: E402
+import partitions  # noqa: E402
+
+# name: (path, needs a user token)
+ROUTES = {
+    'stats': ('/api/stats', True),
+    'pushup-stats': ('/api/pushup-stats', True),
+    'sessions': ('/api/sessions?limit=50', True),
+    'pushup-sessions': ('/api/pushup-sessions?limit=50', True),
+    'exercise-stats': ('/api/exercises/stats', True),
+    'dashboard': ('/api/dashboard', True),
+    'leaderboard-squats': ('/api/leaderboard/squats', False),
+    'leaderboard-squats-daily': ('/api/leaderboard/squats/daily', False),
+    'leaderboard-pushups': ('/api/leaderboard/pushups', False),
+    'leaderboard-pushups-daily': ('/api/leaderboard/pushups/daily', False),
+}
+TOKEN_POOL = 100
+QUERY_HEADER = 'X-Bench-Queries'
+
+
+def percentile(values, pct):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def instrument(app):
+    """Count SQL statements per request and report them in a response header"""
+    with app.app_context():
+        engine = db.engine
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def count_query(conn, cursor, statement, parameters, context, executemany):
+        if has_app_context() and 'bench_queries' in g:
+            g.bench_queries += 1
+
+    @app.before_request
+    def start_count():
+        g.bench_queries = 0
+
+    @app.after_request
+    def report_count(response):
+        response.headers[QUERY_HEADER] = str(g.get('bench_queries', 0))
+        return response
+
+
+def prepare(app, seed_users):
+    """Seed an empty database and mint tokens for a sample of users"""
+    with app.app_context():
+        partitions.create_tables(app.config['SESSION_PARTITIONS_AHEAD'])
+        if not db.session.query(User.id).first():
+            datagen.generate(users=seed_users, log=lambda message: None)
+        user_ids = [row[0] for row in db.session.query(User.id).order_by(func.random()).limit(TOKEN_POOL)]
+        return [create_access_token(identity=str(user_id)) for user_id in user_ids]
+
+
+def run_inprocess(app, path, headers_for, count):
+    client = app.test_client()
+    samples = []
+    for _ in range(count):
+        start = time.perf_counter()
+        response = client.get(path, headers=headers_for())
+        response.get_data()
+        samples.append((time.perf_counter() - start, response.status_code, int(response.headers.get(QUERY_HEADER, 0))))
+    return samples
+
+
+def run_http(port, path, headers_for, count, concurrency):
+    samples = []
+    lock = threading.Lock()
+    remaining = [count]
+
+    def worker():
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    break
+                remaining[0] -= 1
+            start = time.perf_counter()
+            try:
+                conn.request('GET', path, headers=headers_for())
+                response = conn.getresponse()
+                response.read()
+                sample = (time.perf_counter() - start, response.status, int(response.getheader(QUERY_HEADER, 0)))
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                sample = (time.perf_counter() - start, 0, 0)
+            with lock:
+                samples.append(sample)
+        conn.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples
+
+
+def summarize(samples, elapsed):
+    ms = [latency * 1000 for latency, _, _ in samples]
+    ok = [queries for _, status, queries in samples if 200 <= status < 400]
+    return {
+        'requests': len(samples),
+        'errors': len(samples) - len(ok),
+        'throughput_rps': round(len(samples) / elapsed, 1) if elapsed else None,
+        'mean_ms': round(sum(ms) / len(ms), 2) if ms else None,
+        'p50_ms': round(percentile(ms, 50), 2),
+        'p95_ms': round(percentile(ms, 95), 2),
+        'p99_ms': round(percentile(ms, 99), 2),
+        'queries_per_request': round(sum(ok) / len(ok), 2) if ok else None,
+    }
+
+
+def compare(results, path):
+    with open(path) as handle:
+        previous = json.load(handle)['routes']
+    print(f"\n{'route':<26} {'p50 ms':>16} {'p95 ms':>16} {'queries':>14}")
+    for name, current in results.items():
+        old = previous.get(name)
+        if not old:
+            continue
+        cells = []
+        for key in ('p50_ms', 'p95_ms', 'queries_per_request'):
+            before, after = old.get(key), current.get(key)
+            change = f"{(after - before) / before * 100:+.0f}%" if before and after is not None else 'n/a'
+            cells.append(f"{after} ({change})")
+        print(f"{name:<26} {cells[0]:>16} {cells[1]:>16} {cells[2]:>14}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200, help='Requests per route')
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--routes', nargs='+', choices=ROUTES, default=list(ROUTES))
+    parser.add_argument('--seed-users', type=int, default=200, help='Users to generate when the database is empty')
+    parser.add_argument('--warmup', type=int, default=10, help='Unmeasured requests per route')
+    parser.add_argument('--json', dest='json_path', help='Write results to this file')
+    parser.add_argument('--compare', help='Previous --json output to diff against')
+    args = parser.parse_args()
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    app = fitv.create_app()
+    instrument(app)
+    tokens = prepare(app, args.seed_users)
+    rng = random.Random(0)
+
+    server = None
+    if args.concurrency > 1:
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    results = {}
+    print(f"{'route':<26} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8} {'errors':>7}")
+    for name in args.routes:
+        path, authed = ROUTES[name]
+
+        def headers_for():
+            return {'Authorization': f"Bearer {rng.choice(tokens)}"} if authed else {}
+
+        def drive(count):
+            if server is None:
+                return run_inprocess(app, path, headers_for, count)
+            return run_http(server.server_port, path, headers_for, count, args.concurrency)
+
+        drive(args.warmup)
+        start = time.perf_counter()
+        samples = drive(args.requests)
+        result = summarize(samples, time.perf_counter() - start)
+        results[name] = result
+        print(f"{name:<26} {result['throughput_rps']:>8} {result['p50_ms']:>8} {result['p95_ms']:>8} "
+              f"{result['p99_ms']:>8} {result['queries_per_request']!s:>8} {result['errors']:>7}")
+
+    if server is not None:
+        server.shutdown()
+
+    if args.json_path:
+        with app.app_context():
+            meta = {
+                'timestamp': datetime.utcnow().isoformat(),
+                'database': db.engine.dialect.name,
+                'users': db.session.query(func.count(User.id)).scalar(),
+                'requests': args.requests,
+                'concurrency': args.concurrency,
+                'python': platform.python_version(),
+            }
+        with open(args.json_path, 'w') as handle:
+            json.dump({'meta': meta, 'routes': results}, handle, indent=2)
+        print(f"\nWrote {args.json_path}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""Microbenchmark session-list serialization: ORM + to_dict() + json vs. projected rows + orjson.
+
+Usage: python benchmarks/bench_serialization.py [--sizes 50 200 5000] [--repeat 50]
+
+For each payload size, one user's newest sessions are read and encoded the
+way GET /api/sessions did before and after column projection:
+
+  orm+json       model.query ... .all(), session.to_dict(), json.dumps
+  rows+orjson    session_columns() tuples, session_row(), orjson
+
+"query" times the database read and dict building, "encode" times the JSON
+encoding alone, and "total" is both together. Each cell is the median of
+--repeat runs. Uses DATABASE_URL (defaults to a throwaway SQLite file).
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_serialization.db'))
+
+import app as fitv  # noqa: E402
+import serialization  # noqa: E402
+from models import db, User, SquatSession  # noqa: E402
+
+
+def seed(count):
+    """One user with `count` squat sessions; returns the user id"""
+    user = User(username=f"bench_serialization_{time.time_ns()}", email=f"{time.time_ns()}@bench.local",
+                password_hash='x')
+    db.session.add(user)
+    db.session.flush()
+    start = datetime(2024, 1, 1)
+    db.session.execute(SquatSession.__table__.insert(), [
+        {
+            'user_id': user.id, 'exercise_type': 'squat', 'reps': 5 + i % 40, 'duration': 30 + i % 90,
+            'timestamp': start + timedelta(minutes=37 * i),
+            'date': (start + timedelta(minutes=37 * i)).date(),
+            'time': (start + timedelta(minutes=37 * i)).time(),
+        }
+        for i in range(count)
+    ])
+    db.session.commit()
+    return user.id
+
+
+def orm_dicts(user_id, limit):
+    sessions = (
+        SquatSession.query.filter_by(user_id=user_id)
+        .order_by(SquatSession.timestamp.desc(), SquatSession.id.desc())
+        .limit(limit).all()
+    )
+    return [session.to_dict() for session in sessions]
+
+
+def projected_dicts(user_id, limit):
+    rows = (
+        db.session.query(*serialization.session_columns(SquatSession))
+        .filter(SquatSession.user_id == user_id)
+        .order_by(SquatSession.timestamp.desc(), SquatSession.id.desc())
+        .limit(limit)
+    )
+    return [serialization.session_row(row) for row in rows]
+
+
+def median_ms(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+        db.session.expunge_all()
+    return statistics.median(samples)
+
+
+def measure(user_id, size, repeat):
+    before = orm_dicts(user_id, size)
+    after = projected_dicts(user_id, size)
+    assert json.loads(serialization.dumps(after)) == json.loads(json.dumps(before)), "payloads differ"
+
+    return {
+        'orm+json': (
+            median_ms(lambda: orm_dicts(user_id, size), repeat),
+            median_ms(lambda: json.dumps({'sessions': before}), repeat),
+            median_ms(lambda: json.dumps({'sessions': orm_dicts(user_id, size)}), repeat),
+        ),
+        'rows+orjson': (
+            median_ms(lambda: projected_dicts(user_id, size), repeat),
+            median_ms(lambda: serialization.dumps({'sessions': after}), repeat),
+            median_ms(lambda: serialization.dumps({'sessions': projected_dicts(user_id, size)}), repeat),
+        ),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', nargs='+', type=int, default=[50, 200, 5000],
+                        help='Sessions per payload (the page size limit is 200; larger sizes model NDJSON export)')
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    app = fitv.create_app()
+    with app.app_context():
+        db.create_all()
+        user_id = seed(max(args.sizes))
+        print(f"{'rows':>6} {'variant':<12} {'query ms':>9} {'encode ms':>10} {'total ms':>9} {'speedup':>8}")
+        for size in args.sizes:
+            results = measure(user_id, size, args.repeat)
+            baseline = results['orm+json'][2]
+            for variant, (query_ms, encode_ms, total_ms) in results.items():
+                print(f"{size:>6} {variant:<12} {query_ms:>9.3f} {encode_ms:>10.3f} {total_ms:>9.3f} "
+                      f"{baseline / total_ms:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""Measure worker start-up: interpreter + `import app` time and time to the first response.
+
+Usage: python benchmarks/bench_startup.py [--runs 10] [--path /healthz] [--modules 15]
+                                          [--json results.json]
+
+Each run starts a fresh interpreter that imports app.py (which builds the app
+through create_app(), as a gunicorn worker does) and then serves one request
+to --path through the test client. Reported per phase as median and max over
+--runs:
+
+  process      interpreter start until the first response, seen from outside
+  import       `import app`, including create_app()
+  first        the first request after import, including lazy client set-up
+
+--modules lists the slowest modules imported by app.py from one `-X importtime` run, and
+the heavy optional SDKs that ended up loaded at start-up are named so a
+regression (e.g. a module-level google.generativeai import) shows up here.
+
+Uses DATABASE_URL (defaults to a throwaway SQLite file) and REDIS_URL.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Modules that should only load when the feature needing them is first used
+DEFERRED_MODULES = ('google.generativeai', 'numpy')
+
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+import app as fitv
+imported = time.perf_counter()
+status = fitv.app.test_client().get(sys.argv[1]).status_code
+answered = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'first_ms': (answered - imported) * 1000,
+    'status': status,
+    'loaded': [name for name in %r if name in sys.modules],
+}))
+""" % (DEFERRED_MODULES,)
+
+
+def child_env():
+    env = dict(os.environ)
+    env.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_startup.db'))
+    env['PYTHONPATH'] = ROOT + os.pathsep + env.get('PYTHONPATH', '')
+    env.setdefault('LOG_LEVEL', 'WARNING')
+    return env
+
+
+def run_once(path, env):
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', CHILD, path], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    process_ms = (time.perf_counter() - started) * 1000
+    sample = json.loads(result.stdout.strip().splitlines()[-1])
+    sample['process_ms'] = process_ms
+    return sample
+
+
+def slowest_imports(env, count):
+    """(cumulative ms, module) for the slowest modules app.py imports directly"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    # importtime prints children before their parent, indented two spaces per level
+    children, imports = [], []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            children.append((int(cumulative) / 1000, name.strip()))
+        elif depth == 0:
+            if name.strip() == 'app':
+                imports = children
+            children = []
+    return sorted(imports, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--path', default='/healthz', help='Route for the first request')
+    parser.add_argument('--modules', type=int, default=15, help='Slowest imports to list (0 to skip)')
+    parser.add_argument('--json', dest='json_path', help='Write results to this file')
+    args = parser.parse_args()
+
+    env = child_env()
+    samples = [run_once(args.path, env) for _ in range(args.runs)]
+
+    results = {}
+    print(f"{'phase':<10} {'median ms':>10} {'max ms':>10}")
+    for phase in ('process', 'import', 'first'):
+        values = [sample[f'{phase}_ms'] for sample in samples]
+        results[phase] = {'median_ms': round(statistics.median(values), 1), 'max_ms': round(max(values), 1)}
+        print(f"{phase:<10} {results[phase]['median_ms']:>10} {results[phase]['max_ms']:>10}")
+    statuses = sorted({sample['status'] for sample in samples})
+    loaded = samples[-1]['loaded']
+    print(f"\nfirst request {args.path}: HTTP {', '.join(map(str, statuses))}")
+    print(f"deferred modules loaded at start-up: {', '.join(loaded) or 'none'}")
+
+    imports = []
+    if args.modules:
+        imports = slowest_imports(env, args.modules)
+        print(f"\n{'cumulative ms':>13}  module")
+        for cumulative_ms, name in imports:
+            print(f"{cumulative_ms:>13.1f}  {name}")
+
+    if args.json_path:
+        with open(args.json_path, 'w') as handle:
+            json.dump({
+                'runs': args.runs, 'path': args.path, 'phases': results, 'statuses': statuses,
+                'deferred_loaded': loaded, 'slowest_imports': imports,
+            }, handle, indent=2)
+        print(f"\nWrote {args.json_path}")
+
+
+if __name__ == '__main__':
+    main()
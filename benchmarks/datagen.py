@@ -0,0 +1,157 @@
+"""Generate synthetic users and squat/pushup session histories in bulk.
+
+Usage: python benchmarks/datagen.py [--users 1000] [--sessions 50] [--days 365] [--seed 0]
+                                    [--skip-rebuild]
+
+Writes straight into the users and exercise_sessions tables of DATABASE_URL:
+COPY on Postgres, multi-row INSERTs elsewhere (e.g. a local SQLite file).
+Each user gets a skill level and activity rate, so totals and session counts
+are skewed like real usage rather than uniform. Users are appended with
+"bench<N>" usernames, so repeated runs grow the dataset. Afterwards the stats
+aggregates, history buckets and Redis leaderboards are rebuilt unless --skip-rebuild is given.
+"""
+import argparse
+import csv
+import io
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import redis  # noqa: E402
+from flask import current_app  # noqa: E402
+from sqlalchemy import func, insert  # noqa: E402
+from models import db, User, ExerciseSession, SESSION_MODELS  # noqa: E402
+from passwords import hash_password  # noqa: E402
+import aggregates  # noqa: E402
+import leaderboard  # noqa: E402
+import partitions  # noqa: E402
+import rollups  # noqa: E402
+import versions  # noqa: E402
+
+PASSWORD = 'benchpass'
+BATCH_SIZE = 10000
+SESSION_COLUMNS = ('user_id', 'exercise_type', 'reps', 'duration', 'timestamp', 'date', 'time')
+
+
+def _user_rows(start, count, password_hash, now):
+    for n in range(start, start + count):
+        yield {
+            'username': f"bench{n}",
+            'email': f"bench{n}@example.com",
+            'password_hash': password_hash,
+            'created_at': now,
+            'updated_at': now,
+        }
+
+
+def _session_rows(user_ids, mean_sessions, days, rng, now):
+    """Sessions per user, with per-user skill and activity and more recent days weighted up"""
+    exercises = list(SESSION_MODELS)
+    for user_id in user_ids:
+        skill = rng.lognormvariate(0, 0.5)
+        count = int(rng.expovariate(1 / mean_sessions)) if mean_sessions else 0
+        for _ in range(count):
+            exercise = rng.choice(exercises)
+            base = 15 if exercise == 'squat' else 10
+            reps = max(1, int(rng.gauss(base * skill, base * skill * 0.3)))
+            # Squaring skews sessions toward the recent end of the window
+            timestamp = now - timedelta(days=days * rng.random() ** 2, seconds=rng.randrange(86400))
+            yield (user_id, exercise, reps, reps * rng.randint(2, 4), timestamp, timestamp.date(), timestamp.time())
+
+
+def _batches(rows, size=BATCH_SIZE):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _copy(batch):
+    """COPY a batch of session tuples into exercise_sessions (Postgres only)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in batch:
+        writer.writerow([value.isoformat() if hasattr(value, 'isoformat') else value for value in row])
+    buffer.seek(0)
+    cursor = db.session.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY exercise_sessions ({', '.join(SESSION_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buffer
+        )
+    finally:
+        cursor.close()
+
+
+def _insert(batch):
+    db.session.execute(insert(ExerciseSession.__table__), [dict(zip(SESSION_COLUMNS, row)) for row in batch])
+
+
+def generate(users=1000, sessions=50, days=365, seed=0, rebuild=True, log=print):
+    """Append `users` synthetic users averaging `sessions` sessions each; returns (users, sessions) written"""
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    use_copy = db.engine.dialect.name == 'postgresql'
+
+    start = (db.session.query(func.max(User.id)).scalar() or 0) + 1
+    # Every synthetic user shares one (cheap) hash; bcrypt per row would dominate the run
+    password_hash = hash_password(PASSWORD, rounds=4)
+    user_ids = []
+    for batch in _batches(_user_rows(start, users, password_hash, now)):
+        user_ids += db.session.execute(insert(User).returning(User.id, sort_by_parameter_order=True), batch).scalars()
+    db.session.commit()
+    log(f"Inserted {users} users")
+
+    written = 0
+    started = time.perf_counter()
+    for batch in _batches(_session_rows(user_ids, sessions, days, rng, now)):
+        (_copy if use_copy else _insert)(batch)
+        db.session.commit()
+        written += len(batch)
+        log(f"  {written} sessions ({written / (time.perf_counter() - started):.0f}/s)")
+    log(f"Inserted {written} sessions using {'COPY' if use_copy else 'multi-row INSERT'}")
+
+    if rebuild:
+        log(f"Rebuilt {aggregates.rebuild_aggregates()} exercise aggregates")
+        log(f"Rebuilt {rollups.rebuild()} history buckets")
+        try:
+            redis_client = current_app.extensions['redis']
+            for exercise in SESSION_MODELS:
+                log(f"Rebuilt {exercise} leaderboard with {leaderboard.rebuild(redis_client, exercise)} users")
+            versions.bump_all(redis_client)
+        except redis.RedisError as e:
+            log(f"Skipped leaderboard rebuild: {e}")
+    return users, written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--sessions', type=int, default=50, help='Mean sessions per user')
+    parser.add_argument('--days', type=int, default=365, help='History window in days')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--skip-rebuild', action='store_true', help="Don't rebuild aggregates and leaderboards")
+    args = parser.parse_args()
+
+    import app as fitv
+    with fitv.app.app_context():
+        partitions.create_tables(current_app.config['SESSION_PARTITIONS_AHEAD'])
+        if partitions.supported():
+            # Monthly partitions for the whole history, so it doesn't all land in the default one
+            with db.engine.begin() as conn:
+                if partitions.is_partitioned(conn):
+                    today = datetime.utcnow().date()
+                    partitions.ensure_months(conn, today - timedelta(days=args.days), today)
+        generate(args.users, args.sessions, args.days, args.seed, rebuild=not args.skip_rebuild)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+import redis
+
+logger = logging.getLogger(__name__)
+
+# How long each pub/sub read waits; kept under REDIS_SOCKET_TIMEOUT so a quiet channel isn't an error
+SUBSCRIBE_POLL_SECONDS = 1.0
+
+
+class LocalCache:
+    """Bounded in-process LRU with a per-entry TTL
+
+    Sits in front of Redis for hot, rarely-changing values so a hit costs no
+    network round trip or JSON decoding. Each worker process has its own copy,
+    so entries must be safe to serve slightly stale (up to `ttl` seconds).
+    """
+
+    def __init__(self, maxsize=512, ttl=600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class Counters:
+    """Thread-safe named counters for cache hit/miss accounting"""
+
+    def __init__(self, *names):
+        self._lock = threading.Lock()
+        self._values = dict.fromkeys(names, 0)
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self._values[name] = self._values.get(name, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+
+def subscribe(redis_client, channel, handle, retry_seconds=5):
+    """Call handle(data) for every message published on a Redis channel; never returns
+
+    Polls with get_message() instead of blocking in listen(): a blocking read
+    is bound by the pool's socket_timeout and would fail whenever the channel
+    is quiet for that long. A timeout resubscribes at once; other Redis errors
+    wait retry_seconds first. A message the handler can't parse is logged and
+    skipped.
+    """
+    while True:
+        pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+        try:
+            pubsub.subscribe(channel)
+            while True:
+                message = pubsub.get_message(timeout=SUBSCRIBE_POLL_SECONDS)
+                if message is None:
+                    continue
+                try:
+                    handle(message['data'])
+                except (ValueError, KeyError, TypeError) as e:
+                    logger.warning("Bad pub/sub message", extra={'channel': channel, 'error': str(e)})
+        except redis.TimeoutError:
+            continue
+        except redis.RedisError as e:
+            logger.warning("Pub/sub listener error", extra={'channel': channel, 'error': str(e)})
+            time.sleep(retry_seconds)
+        finally:
+            pubsub.close()
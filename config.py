@@ -7,22 +7,123 @@ import urllib.parse
 class Config:
     # Database configuration - using SQLite for simplicity
     db_user = os.environ.get('POSTGRES_USER')
-    db_password = urllib.parse.quote_plus(os.environ.get('POSTGRES_PASSWORD'))
+    db_password = urllib.parse.quote_plus(os.environ.get('POSTGRES_PASSWORD', ''))
     db_host = os.environ.get('DATABASE_HOST')
     db_port = os.environ.get('DATABASE_PORT')
     db_name = os.environ.get('POSTGRES_DB')
     
-    SQLALCHEMY_DATABASE_URI = (
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or (
         f"postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
     )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Connection pool per worker process; size it so workers x (size + overflow)
+    # stays under Postgres max_connections
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': True,
+    }
+    
+    # Optional read replicas (comma-separated URLs) for the read-only GET routes
+    DATABASE_REPLICA_URLS = os.environ.get('DATABASE_REPLICA_URLS', '')
+    # A replica that errors is skipped for this long
+    REPLICA_RETRY_SECONDS = float(os.environ.get('REPLICA_RETRY_SECONDS', 30))
+    # After a user's write, their reads go to the primary for this long (covers replication lag)
+    REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', 5))
+    # PostgreSQL: monthly exercise_sessions partitions to keep created beyond the current month
+    SESSION_PARTITIONS_AHEAD = int(os.environ.get('SESSION_PARTITIONS_AHEAD', 3))
+    # Months of raw sessions `session-partitions retain` keeps attached (0: keep everything)
+    SESSION_RETENTION_MONTHS = int(os.environ.get('SESSION_RETENTION_MONTHS', 0))
+    
+    # Redis configuration (one connection pool per worker process)
+    REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379')
+    REDIS_MAX_CONNECTIONS = int(os.environ.get('REDIS_MAX_CONNECTIONS', 50))
+    REDIS_SOCKET_TIMEOUT = float(os.environ.get('REDIS_SOCKET_TIMEOUT', 5))
     
     # JWT configuration
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'deepubhai')
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=24)
     JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
     
+    # Password hashing: bcrypt work factor and the bounded hashing pool per worker.
+    # Hashes made with a different factor are upgraded on the next login.
+    BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', 12))
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+    PASSWORD_HASH_MAX_QUEUE = int(os.environ.get('PASSWORD_HASH_MAX_QUEUE', 16))
+    PASSWORD_HASH_TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 10))
+    PASSWORD_HASH_RETRY_AFTER = int(os.environ.get('PASSWORD_HASH_RETRY_AFTER', 2))
+    
     # Flask configuration
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'deepubhai' 
     # Gemini API Key
     GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY') 
+    # 'gemini' or 'fake' (local stand-in for development and load tests)
+    EXERCISE_AI_CLIENT = os.environ.get('EXERCISE_AI_CLIENT', 'gemini')
+    EXERCISE_AI_FAKE_DELAY = float(os.environ.get('EXERCISE_AI_FAKE_DELAY', 0))
+    # Background generation threads per worker for ?async=1 requests
+    EXERCISE_AI_WORKERS = int(os.environ.get('EXERCISE_AI_WORKERS', 4))
+    # How long a request waits on another request's in-flight generation
+    EXERCISE_AI_WAIT_TIMEOUT = float(os.environ.get('EXERCISE_AI_WAIT_TIMEOUT', 90))
+    # In-process LRU in front of the Redis summary cache (per worker)
+    EXERCISE_AI_LOCAL_CACHE_SIZE = int(os.environ.get('EXERCISE_AI_LOCAL_CACHE_SIZE', 512))
+    EXERCISE_AI_LOCAL_CACHE_TTL = int(os.environ.get('EXERCISE_AI_LOCAL_CACHE_TTL', 600))
+    
+    # Logging: level and 'json' (one object per line) or 'text'
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')
+    # Requests and SQL statements slower than these are logged as warnings
+    SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_MS', 500))
+    SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 100))
+    # When set, GET /metrics requires "Authorization: Bearer <token>"
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    
+    # Cached user profiles for authenticated requests: per-worker LRU, then Redis
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 1024))
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 300))
+    USER_CACHE_REDIS_TTL = int(os.environ.get('USER_CACHE_REDIS_TTL', 3600))
+    
+    # Conditional GETs: ETags come from per-user/per-leaderboard versions in Redis; this
+    # caps (in seconds) how long a version bump lost to a Redis error can leave a 304 stale
+    ETAG_MAX_AGE = int(os.environ.get('ETAG_MAX_AGE', 300))
+    
+    # Rate limits for expensive routes, as token buckets: '<burst>/<seconds>' allows <burst>
+    # calls at once, earned back evenly over <seconds>. 'user' scope keys on the JWT identity
+    # (client IP when anonymous), 'ip' on the client IP; over the limit answers 429
+    RATELIMIT_ENABLED = os.environ.get('RATELIMIT_ENABLED', '1').lower() in ('1', 'true', 'yes')
+    RATELIMIT_POLICIES = {
+        # login/register: bcrypt on every call
+        'auth': {'rate': os.environ.get('RATELIMIT_AUTH', '10/60'), 'scope': 'ip'},
+        # /api/exercise-ai: a multi-second Gemini call on every cache miss
+        'exercise_ai': {'rate': os.environ.get('RATELIMIT_EXERCISE_AI', '6/60'), 'scope': 'user'},
+        # leaderboards: public, and a cold board is rebuilt from Postgres
+        'leaderboard': {'rate': os.environ.get('RATELIMIT_LEADERBOARD', '120/60'), 'scope': 'user'},
+        # /api/leaderboard/stream: each connection holds a request thread while open
+        'leaderboard_stream': {'rate': os.environ.get('RATELIMIT_LEADERBOARD_STREAM', '10/60'), 'scope': 'ip'},
+        # /api/export: streams a user's whole history
+        'export': {'rate': os.environ.get('RATELIMIT_EXPORT', '5/300'), 'scope': 'user'},
+    }
+    # Reverse proxies in front of the app whose X-Forwarded-For is trusted for the client IP
+    TRUSTED_PROXY_COUNT = int(os.environ.get('TRUSTED_PROXY_COUNT', 0))
+    
+    # Seconds between live leaderboard pushes; bursts of updates are coalesced
+    LEADERBOARD_PUSH_INTERVAL = float(os.environ.get('LEADERBOARD_PUSH_INTERVAL', 2))
+    # Open leaderboard streams per worker. Each holds a request thread for as long as it
+    # is open, so this stays below WEB_THREADS; extra viewers get 503 and poll instead.
+    LEADERBOARD_MAX_STREAMS = int(os.environ.get(
+        'LEADERBOARD_MAX_STREAMS', max(int(os.environ.get('WEB_THREADS', 4)) // 2, 1)
+    ))
+    LEADERBOARD_STREAM_RETRY_AFTER = int(os.environ.get('LEADERBOARD_STREAM_RETRY_AFTER', 30))
+    
+    # Write-behind ingestion: session POSTs are queued on a Redis Stream and answered
+    # with 202; `flask --app app session-writer` writes them to Postgres in batches
+    WRITE_BEHIND = os.environ.get('WRITE_BEHIND', '0').lower() in ('1', 'true', 'yes')
+    # How long a read waits for the same user's queued sessions to be written
+    WRITE_BEHIND_READ_WAIT_MS = float(os.environ.get('WRITE_BEHIND_READ_WAIT_MS', 1000))
+    WRITE_BEHIND_BATCH_SIZE = int(os.environ.get('WRITE_BEHIND_BATCH_SIZE', 200))
+    WRITE_BEHIND_RETRIES = int(os.environ.get('WRITE_BEHIND_RETRIES', 3))
+    # Deliveries before an entry is moved to the dead-letter stream
+    WRITE_BEHIND_MAX_DELIVERIES = int(os.environ.get('WRITE_BEHIND_MAX_DELIVERIES', 5))
+    # Unacknowledged entries idle this long are reclaimed by another writer
+    WRITE_BEHIND_CLAIM_IDLE_MS = int(os.environ.get('WRITE_BEHIND_CLAIM_IDLE_MS', 30000))
@@ -0,0 +1,76 @@
+from models import db, ExerciseSession, ExerciseStats
+import aggregates
+import serialization
+
+FIELDS = ('profile', 'stats', 'recent')
+DEFAULT_RECENT = 10
+
+
+class UnknownField(ValueError):
+    """Raised for a ?fields= entry the dashboard doesn't provide"""
+
+
+def parse_fields(value):
+    """Requested dashboard sections from a comma-separated ?fields= value (all by default)"""
+    if not value:
+        return set(FIELDS)
+    fields = {field.strip() for field in value.split(',') if field.strip()}
+    unknown = fields - set(FIELDS)
+    if unknown:
+        raise UnknownField(f"Unknown fields: {', '.join(sorted(unknown))}; expected any of: {', '.join(FIELDS)}")
+    return fields
+
+
+def _stats_dict(aggregate):
+    return {
+        "total_reps": aggregate.total_reps,
+        "sessions_completed": aggregate.sessions_completed,
+        "best_session": aggregate.best_session,
+        "average_per_session": aggregate.average_per_session()
+    }
+
+
+def _recent_activity(user_id, summaries, complete, limit):
+    """Newest sessions across all exercises
+
+    Every exercise's latest RECENT_SESSIONS ids are already on its aggregate,
+    so the merged feed is one primary-key lookup. Users missing an aggregate
+    row fall back to reading the session table.
+    """
+    query = db.session.query(*serialization.session_columns(ExerciseSession))
+    if complete:
+        ids = [session_id for aggregate in summaries.values() for session_id in aggregate.recent_session_ids]
+        if not ids:
+            return []
+        query = query.filter(ExerciseSession.id.in_(ids))
+    else:
+        query = query.filter(ExerciseSession.user_id == user_id)
+    rows = query.order_by(ExerciseSession.id.desc()).limit(limit)
+    return [serialization.session_row(row) for row in rows]
+
+
+def load_dashboard(user_id, profile, fields=FIELDS, recent_limit=DEFAULT_RECENT):
+    """Profile, per-exercise stats and recent activity for one user
+
+    `profile` is the user's cached user.to_dict(), resolved when the token was
+    verified. The aggregate rows are one query and the recent feed at most
+    one more.
+    """
+    user_id = int(user_id)
+    recent_limit = min(max(recent_limit, 1), aggregates.RECENT_SESSIONS)
+    result = {}
+    rows = []
+
+    if 'profile' in fields:
+        result['user'] = profile
+    if fields & {'stats', 'recent'}:
+        rows = ExerciseStats.query.filter_by(user_id=user_id).all()
+
+    if fields & {'stats', 'recent'}:
+        summaries = aggregates.all_summaries(user_id, rows)
+        if 'stats' in fields:
+            result['stats'] = {exercise: _stats_dict(aggregate) for exercise, aggregate in summaries.items()}
+        if 'recent' in fields:
+            complete = len(rows) == len(summaries)
+            result['recent_activity'] = _recent_activity(user_id, summaries, complete, recent_limit)
+    return result
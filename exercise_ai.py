@@ -0,0 +1,301 @@
+import json
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import redis
+from cache import LocalCache, Counters
+import metrics
+
+CACHE_TTL = 60 * 60 * 24 * 3  # 3 days
+JOB_TTL = 60 * 60
+# Failed generations are remembered briefly so waiters don't all retry upstream
+ERROR_TTL = 15
+POLL_INTERVAL = 0.2
+
+GENERATION_CONFIG = {
+    "temperature": 1,
+    "top_p": 0.95,
+    "top_k": 40,
+    "max_output_tokens": 8192,
+}
+
+
+class ExerciseAIError(Exception):
+    """Raised when a summary cannot be produced"""
+
+
+# Words that don't change which exercise is being asked about
+FILLER_WORDS = {
+    'a', 'an', 'the', 'how', 'to', 'do', 'for', 'proper', 'form', 'exercise', 'workout', 'technique',
+}
+# Spellings and variants that should share one summary (applied after singularizing)
+ALIASES = {
+    'back squat': 'squat',
+    'air squat': 'squat',
+    'bodyweight squat': 'squat',
+    'pushup': 'push up',
+    'push ups': 'push up',
+    'pressup': 'push up',
+    'press up': 'push up',
+    'situp': 'sit up',
+    'sit ups': 'sit up',
+    'pullup': 'pull up',
+    'pull ups': 'pull up',
+    'chinup': 'chin up',
+    'chin ups': 'chin up',
+    'rdl': 'romanian deadlift',
+    'ohp': 'overhead press',
+    'bench': 'bench press',
+}
+# Pre-generated by `flask --app app warm-exercise-ai`
+COMMON_EXERCISES = [
+    'squat', 'push up', 'lunge', 'plank', 'deadlift', 'bench press', 'pull up', 'sit up',
+    'burpee', 'jumping jack', 'mountain climber', 'overhead press', 'bicep curl', 'tricep dip',
+    'glute bridge', 'romanian deadlift', 'crunch', 'calf raise', 'chin up', 'kettlebell swing',
+]
+
+
+def normalize_query(query):
+    """Trimmed, lowercased, single-spaced form of a query"""
+    return re.sub(r'\s+', ' ', query.strip().lower())
+
+
+def _singular(word):
+    if len(word) <= 3:
+        return word
+    if word.endswith('ies'):
+        return word[:-3] + 'y'
+    if word.endswith('es') and word[:-2].endswith(('sh', 'ch', 'x', 'ss')):
+        return word[:-2]
+    if word.endswith('s') and not word.endswith(('ss', 'us', 'is')):
+        return word[:-1]
+    return word
+
+
+def canonical_query(query):
+    """Cache key for a query, so "Squats", " squat ", "back squat" and
+    "squat exercise" all share one generated summary"""
+    text = normalize_query(query)
+    text = re.sub(r"'s\b", '', text)
+    text = re.sub(r'[^a-z0-9 ]+', ' ', text)
+    words = [_singular(word) for word in text.split() if word not in FILLER_WORDS]
+    phrase = ' '.join(words) or normalize_query(query)
+    return ALIASES.get(phrase, phrase)
+
+
+def build_prompt(query):
+    return f"""
+You are a fitness expert AI. Provide a detailed, friendly, and practical summary for the exercise: {query}.
+Include the following sections:
+1. Introduction (what is this exercise)
+2. three Benefits 
+3. Recommended weight and reps (give general advice for beginners/intermediate/advanced in table form)
+4. Step-by-step instructions (numbered)
+Format your answer with clear section headings.
+Note: if the input is not an exercise, just say "I'm sorry, I can't help with that."
+"""
+
+
+class GeminiClient:
+    """Generates summaries with gemini-2.5-pro"""
+
+    def __init__(self, api_key, model_name="gemini-2.5-pro"):
+        self.api_key = api_key
+        self.model_name = model_name
+        self._model = None
+
+    def generate(self, prompt):
+        if self._model is None:
+            try:
+                import google.generativeai as genai
+            except ImportError:
+                raise ExerciseAIError('Gemini library not installed')
+            if not self.api_key:
+                raise ExerciseAIError('Gemini API key not configured')
+            genai.configure(api_key=self.api_key)
+            self._model = genai.GenerativeModel(model_name=self.model_name,
+                                                generation_config=GENERATION_CONFIG)
+        response = self._model.generate_content(prompt)
+        return response.text.strip()
+
+
+class FakeModelClient:
+    """Local stand-in for Gemini (EXERCISE_AI_CLIENT=fake); counts upstream calls"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate(self, prompt):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        exercise = prompt.split("for the exercise: ", 1)[-1].split(".\n", 1)[0]
+        return f"## Introduction\n{exercise} is an exercise.\n\n(fake summary)"
+
+
+class ExerciseAI:
+    """Cached, single-flight exercise summaries with an optional background job mode
+
+    Lookups go through an in-process LRU, then Redis, keyed by the canonical
+    query. Concurrent misses for the same key share one upstream call: the
+    first request takes a Redis lock and generates, the others poll Redis
+    until the result (or an error marker) appears.
+    """
+
+    def __init__(self, redis_client, model_client, workers=4, lock_ttl=120, wait_timeout=90,
+                 local_cache_size=512, local_cache_ttl=600):
+        self.redis_client = redis_client
+        self.model_client = model_client
+        self.workers = workers
+        self.lock_ttl = lock_ttl
+        self.wait_timeout = wait_timeout
+        self.local_cache = LocalCache(maxsize=local_cache_size, ttl=local_cache_ttl)
+        self.counters = Counters('local_hits', 'redis_hits', 'misses', 'coalesced', 'errors')
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    @staticmethod
+    def _keys(key):
+        return f"exercise_ai:{key}", f"exercise_ai:lock:{key}", f"exercise_ai:error:{key}"
+
+    @staticmethod
+    def _named(result, query):
+        # Shared summaries are returned under the name the caller asked for
+        return dict(result, name=query)
+
+    def _lookup(self, key):
+        """Cached summary for a canonical key from either tier, or None"""
+        result = self.local_cache.get(key)
+        if result is not None:
+            self.counters.incr('local_hits')
+            return result
+        cached = self.redis_client.get(self._keys(key)[0])
+        if cached:
+            result = json.loads(cached)
+            self.local_cache.set(key, result)
+            self.counters.incr('redis_hits')
+            return result
+        return None
+
+    def cached(self, query):
+        result = self._lookup(canonical_query(query))
+        return self._named(result, query) if result else None
+
+    def get_summary(self, query):
+        """Return {'name', 'summary'}, generating at most once across workers"""
+        key = canonical_query(query)
+        result = self._lookup(key)
+        if result:
+            return self._named(result, query)
+
+        cache_key, lock_key, error_key = self._keys(key)
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            lock = self.redis_client.lock(lock_key, timeout=self.lock_ttl)
+            if lock.acquire(blocking=False):
+                try:
+                    return self._named(self._generate(key, cache_key, error_key), query)
+                finally:
+                    try:
+                        lock.release()
+                    except redis.exceptions.LockError:
+                        pass  # expired while generating
+
+            if time.monotonic() >= deadline:
+                raise ExerciseAIError('Timed out waiting for summary')
+            time.sleep(POLL_INTERVAL)
+
+            cached = self.redis_client.get(cache_key)
+            if cached:
+                result = json.loads(cached)
+                self.local_cache.set(key, result)
+                self.counters.incr('coalesced')
+                return self._named(result, query)
+            error = self.redis_client.get(error_key)
+            if error:
+                raise ExerciseAIError(error)
+
+    def _generate(self, key, cache_key, error_key):
+        cached = self.redis_client.get(cache_key)
+        if cached:
+            result = json.loads(cached)
+        else:
+            self.counters.incr('misses')
+            started = time.perf_counter()
+            try:
+                summary = self.model_client.generate(build_prompt(key))
+            except Exception as e:
+                metrics.GEMINI_SECONDS.labels('error').observe(time.perf_counter() - started)
+                self.counters.incr('errors')
+                self.redis_client.setex(error_key, ERROR_TTL, str(e))
+                raise ExerciseAIError(str(e)) from e
+            metrics.GEMINI_SECONDS.labels('ok').observe(time.perf_counter() - started)
+            result = {'name': key, 'summary': summary}
+            self.redis_client.setex(cache_key, CACHE_TTL, json.dumps(result))
+        self.local_cache.set(key, result)
+        return result
+
+    def warm(self, queries):
+        """Generate summaries for any of `queries` not already cached;
+        returns (generated, already cached)"""
+        generated = skipped = 0
+        for key in dict.fromkeys(canonical_query(query) for query in queries):
+            if self.redis_client.exists(self._keys(key)[0]):
+                skipped += 1
+                continue
+            self.get_summary(key)
+            generated += 1
+        return generated, skipped
+
+    def stats(self):
+        """Hit/miss counters for this worker process"""
+        stats = self.counters.snapshot()
+        lookups = stats['local_hits'] + stats['redis_hits'] + stats['misses'] + stats['coalesced']
+        stats['hit_ratio'] = round((lookups - stats['misses']) / lookups, 3) if lookups else None
+        stats['local_cache_size'] = len(self.local_cache)
+        return stats
+
+    def submit(self, query):
+        """Start generation in the background; returns the job record"""
+        job = {'id': uuid.uuid4().hex, 'query': query}
+        cached = self.cached(query)
+        if cached:
+            job.update(status='done', result=cached)
+            self._save_job(job)
+            return job
+
+        job['status'] = 'pending'
+        self._save_job(job)
+        self._pool().submit(self._run_job, job)
+        return job
+
+    def job(self, job_id, wait=0):
+        """Fetch a job, optionally waiting up to `wait` seconds for it to finish"""
+        deadline = time.monotonic() + wait
+        while True:
+            raw = self.redis_client.get(f"exercise_ai:job:{job_id}")
+            job = json.loads(raw) if raw else None
+            if job is None or job['status'] != 'pending' or time.monotonic() >= deadline:
+                return job
+            time.sleep(POLL_INTERVAL)
+
+    def _run_job(self, job):
+        try:
+            job.update(status='done', result=self.get_summary(job['query']))
+        except Exception as e:
+            job.update(status='error', error=str(e))
+        self._save_job(job)
+
+    def _save_job(self, job):
+        self.redis_client.setex(f"exercise_ai:job:{job['id']}", JOB_TTL, json.dumps(job))
+
+    def _pool(self):
+        # Created lazily so it only exists in worker processes, never pre-fork
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="exercise-ai")
+            return self._executor
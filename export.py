@@ -0,0 +1,174 @@
+"""Streaming exports of session history as CSV, NDJSON or Parquet.
+
+Rows are read through a server-side cursor in pagination.STREAM_CHUNK_SIZE
+batches (yield_per) and each writer emits bytes chunk by chunk, so memory
+stays flat however long the history is. Parquet buffers one row group of
+PARQUET_ROW_GROUP rows at a time. gzip_stream() compresses any of them on the
+fly.
+
+Every export returns a watermark: the server time when it started. Passing
+it back as `since` exports the sessions recorded (recorded_at, set by the
+server when the row is written) from EXPORT_OVERLAP before it. Neither ids
+nor recorded_at follow commit order, since both are assigned before a
+transaction commits, so a session can become visible after a later one
+was exported. The overlap re-reads that window. Incremental exports
+therefore repeat some sessions and clients must dedupe them by id. Rows
+written before recorded_at existed only appear in full exports.
+"""
+import csv
+import io
+import zlib
+from datetime import datetime, timedelta, timezone
+from models import db
+import pagination
+import serialization
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+}
+COLUMNS = ('id', 'user_id', 'exercise_type', 'reps', 'duration', 'timestamp', 'date', 'time')
+# Rows per Parquet row group, which is also how many rows a Parquet export holds in memory
+PARQUET_ROW_GROUP = 10000
+# How far before `since` incremental exports re-read. It must exceed the longest session-writing
+# transaction (bounded by WEB_TIMEOUT) plus clock skew between app servers.
+EXPORT_OVERLAP = timedelta(minutes=5)
+
+
+class ExportError(ValueError):
+    """Raised for an export that can't be produced as requested"""
+
+
+def watermark():
+    """The current UTC time in ISO 8601, taken before an export reads any row"""
+    return datetime.now(timezone.utc).isoformat()
+
+
+def since_filter(model, since):
+    """Criterion for `since`, a watermark or ISO 8601 time: recorded from EXPORT_OVERLAP before it
+
+    None (everything) when `since` is empty.
+    """
+    if not since:
+        return None
+    try:
+        timestamp = datetime.fromisoformat(since)
+    except ValueError:
+        raise ExportError("since must be the X-Export-Watermark of an earlier export or an ISO 8601 date/time")
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return model.recorded_at >= timestamp - EXPORT_OVERLAP
+
+
+def rows(model, since=None, user_id=None):
+    """Session rows, oldest id first, read in chunks"""
+    query = db.session.query(*serialization.session_columns(model))
+    if user_id is not None:
+        query = query.filter(model.user_id == user_id)
+    if since is not None:
+        query = query.filter(since)
+    return query.order_by(model.id).yield_per(pagination.STREAM_CHUNK_SIZE)
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def iter_csv(session_rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    for chunk in _chunks(session_rows, pagination.STREAM_CHUNK_SIZE):
+        writer.writerows(
+            [value.isoformat() if hasattr(value, 'isoformat') else value for value in row]
+            for row in chunk
+        )
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+def iter_ndjson(session_rows):
+    """Same objects as the session list endpoints, one per line"""
+    for chunk in _chunks(session_rows, pagination.STREAM_CHUNK_SIZE):
+        yield b"".join(serialization.dumps(serialization.session_row(row)) + b"\n" for row in chunk)
+
+
+class _Sink(io.RawIOBase):
+    """Write-only file that hands back what was written since the last drain()"""
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+def iter_parquet(session_rows, pa, pq):
+    schema = pa.schema([
+        ('id', pa.int64()),
+        ('user_id', pa.int64()),
+        ('exercise_type', pa.string()),
+        ('reps', pa.int32()),
+        ('duration', pa.int32()),
+        ('timestamp', pa.timestamp('us')),
+        ('date', pa.date32()),
+        ('time', pa.time64('us')),
+    ])
+    sink = _Sink()
+    with pq.ParquetWriter(sink, schema, compression='zstd') as writer:
+        for chunk in _chunks(session_rows, PARQUET_ROW_GROUP):
+            columns = [pa.array(values, type=field.type) for values, field in zip(zip(*chunk), schema)]
+            writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+            yield sink.drain()
+    yield sink.drain()
+
+
+def stream(fmt, session_rows):
+    """Iterator of the export's bytes; raises ExportError before any row is read"""
+    if fmt == 'parquet':
+        try:
+            # Only loaded when a Parquet export is requested
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ExportError("Parquet export needs pyarrow installed")
+        return iter_parquet(session_rows, pyarrow, pyarrow.parquet)
+    if fmt == 'ndjson':
+        return iter_ndjson(session_rows)
+    if fmt == 'csv':
+        return iter_csv(session_rows)
+    raise ExportError(f"format must be one of: {', '.join(FORMATS)}")
+
+
+def gzip_stream(chunks, level=6):
+    """Gzip an iterator of bytes as it is consumed"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -37,90 +37,37 @@ const Dashboard = () => {
         }
 
         setIsAuthenticated(true);
-        fetchStats();
-        fetchPushupStats();
-        fetchUser();
+        fetchDashboard();
     };
 
-    const fetchStats = async () => {
+    const fetchDashboard = async () => {
         try {
             const accessToken = localStorage.getItem('access_token');
-            console.log('Fetching stats with token:', accessToken ? 'Present' : 'Missing');
+            console.log('Fetching dashboard with token:', accessToken ? 'Present' : 'Missing');
 
             if (!accessToken) {
                 console.error('No access token found');
                 return;
             }
 
-            const res = await fetch(`${API_BASE_URL}/api/stats`, {
-                headers: { 'Authorization': `Bearer ${accessToken}` }
-            });
-
-            if (res.ok) {
-                const data = await res.json();
-                setSquatStats(data.stats);
-            } else {
-                console.error('Stats fetch failed:', res.status, res.statusText);
-                const errorData = await res.json().catch(() => ({}));
-                console.error('Error details:', errorData);
-            }
-        } catch (err) {
-            console.error('Stats fetch error:', err);
-        }
-    };
-
-    const fetchPushupStats = async () => {
-        try {
-            const accessToken = localStorage.getItem('access_token');
-            console.log('Fetching pushup stats with token:', accessToken ? 'Present' : 'Missing');
-
-            if (!accessToken) {
-                console.error('No access token found');
-                return;
-            }
-
-            const res = await fetch(`${API_BASE_URL}/api/pushup-stats`, {
-                headers: { 'Authorization': `Bearer ${accessToken}` }
-            });
-
-            if (res.ok) {
-                const data = await res.json();
-                setPushupStats(data.stats);
-            } else {
-                console.error('Pushup stats fetch failed:', res.status, res.statusText);
-                const errorData = await res.json().catch(() => ({}));
-                console.error('Error details:', errorData);
-            }
-        } catch (err) {
-            console.error('Pushup stats fetch error:', err);
-        }
-    };
-
-    const fetchUser = async () => {
-        try {
-            const accessToken = localStorage.getItem('access_token');
-            console.log('Fetching user profile with token:', accessToken ? 'Present' : 'Missing');
-
-            if (!accessToken) {
-                console.error('No access token found');
-                return;
-            }
-
-            const res = await fetch(`${API_BASE_URL}/api/profile`, {
+            // Profile and stats in one request; the recent feed isn't rendered here
+            const res = await fetch(`${API_BASE_URL}/api/dashboard?fields=profile,stats`, {
                 headers: { 'Authorization': `Bearer ${accessToken}` }
             });
 
             if (res.ok) {
                 const data = await res.json();
+                setSquatStats(data.stats.squat);
+                setPushupStats(data.stats.pushup);
                 setUser(data.user);
                 setForm({ username: data.user.username, email: data.user.email });
             } else {
-                console.error('Profile fetch failed:', res.status, res.statusText);
+                console.error('Dashboard fetch failed:', res.status, res.statusText);
                 const errorData = await res.json().catch(() => ({}));
                 console.error('Error details:', errorData);
             }
         } catch (err) {
-            console.error('Profile fetch error:', err);
+            console.error('Dashboard fetch error:', err);
         }
     };
 
@@ -151,7 +98,7 @@ const Dashboard = () => {
             if (res.ok) {
                 setMessage('Profile updated successfully!');
                 setEditMode(false);
-                fetchUser();
+                fetchDashboard();
             } else {
                 const data = await res.json();
                 setError(data.error || 'Failed to update profile');
@@ -183,11 +130,11 @@ const Dashboard = () => {
                     <tbody>
                         <tr>
                             <td className="py-2">Squats</td>
-                            <td className="py-2">{squatStats ? squatStats.total_squats : '-'}</td>
+                            <td className="py-2">{squatStats ? squatStats.total_reps : '-'}</td>
                         </tr>
                         <tr>
                             <td className="py-2">Pushups</td>
-                            <td className="py-2">{pushupStats ? pushupStats.total_pushups : '-'}</td>
+                            <td className="py-2">{pushupStats ? pushupStats.total_reps : '-'}</td>
                         </tr>
                     </tbody>
                 </table>
@@ -1,6 +1,9 @@
 import React, { useEffect, useState } from 'react';
 import API_BASE_URL from '../config';
 
+// How often to re-fetch when live updates aren't available (no EventSource, or the server is full)
+const POLL_INTERVAL_MS = 30000;
+
 const Leaderboard = () => {
     const [mode, setMode] = useState('all'); // 'all' or 'daily'
     const [squats, setSquats] = useState([]);
@@ -8,7 +11,34 @@ const Leaderboard = () => {
     const [loading, setLoading] = useState(true);
 
     useEffect(() => {
-        fetchLeaderboards();
+        // Live updates are pushed by the server; fall back to polling
+        let poll = null;
+        const startPolling = () => {
+            fetchLeaderboards();
+            poll = setInterval(fetchLeaderboards, POLL_INTERVAL_MS);
+        };
+        if (!window.EventSource) {
+            startPolling();
+            return () => clearInterval(poll);
+        }
+        setLoading(true);
+        const source = new EventSource(`${API_BASE_URL}/api/leaderboard/stream?period=${mode}`);
+        source.addEventListener('leaderboard', (event) => {
+            const data = JSON.parse(event.data);
+            setSquats(data.squats || []);
+            setPushups(data.pushups || []);
+            setLoading(false);
+        });
+        source.onerror = () => {
+            // A refused stream (503 when the server is full, 429) closes for good
+            if (source.readyState === EventSource.CLOSED && poll === null) {
+                startPolling();
+            }
+        };
+        return () => {
+            source.close();
+            clearInterval(poll);
+        };
     }, [mode]);
 
     const fetchLeaderboards = async () => {
@@ -0,0 +1,28 @@
+# Gunicorn settings for production: `gunicorn -c gunicorn.conf.py app:app`
+import multiprocessing
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+# Threaded workers. Each open leaderboard stream holds one thread, so the app serves at
+# most LEADERBOARD_MAX_STREAMS (default WEB_THREADS // 2) per worker and answers the rest with 503
+worker_class = 'gthread'
+threads = int(os.environ.get('WEB_THREADS', 4))
+# Gemini calls in /api/exercise-ai can take tens of seconds
+timeout = int(os.environ.get('WEB_TIMEOUT', 120))
+graceful_timeout = 30
+keepalive = 5
+# Recycle workers periodically to bound memory growth
+max_requests = int(os.environ.get('WEB_MAX_REQUESTS', 2000))
+max_requests_jitter = 200
+# Each worker builds its own app (and DB/Redis pools) after fork
+preload_app = False
+accesslog = '-'
+errorlog = '-'
+
+
+def child_exit(server, worker):
+    # Drop a dead worker's live series from the shared multiprocess metrics
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,190 @@
+from collections import defaultdict
+from datetime import datetime, timezone
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from models import db, IngestKey, SESSION_MODELS, COUNT_FIELDS
+import aggregates
+import rollups
+import partitions
+
+MAX_BATCH_SIZE = 100
+MAX_KEY_LENGTH = 64
+
+
+class BatchError(ValueError):
+    """Raised when the batch as a whole is malformed"""
+
+
+class ItemError(ValueError):
+    """Raised for one malformed batch entry; the message is returned to the client"""
+
+
+def _parse_timestamp(value):
+    """Parse an ISO timestamp from an offline client into naive UTC"""
+    if value is None:
+        return datetime.utcnow()
+    if not isinstance(value, str):
+        raise ItemError("timestamp must be ISO 8601")
+    try:
+        timestamp = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise ItemError("timestamp must be ISO 8601")
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+
+def _non_negative_int(value, name):
+    """An integer >= 0 given as a JSON number or a string of digits"""
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value)
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+        raise ItemError(f"{name} must be a non-negative integer")
+    return value
+
+
+def _parse_item(item):
+    """Validate one batch entry; raises ItemError with a client-facing message"""
+    if not isinstance(item, dict):
+        raise ItemError("Each session must be an object")
+
+    key = item.get('idempotency_key')
+    if not isinstance(key, str) or not key.strip() or len(key) > MAX_KEY_LENGTH:
+        raise ItemError(f"idempotency_key must be a non-empty string of at most {MAX_KEY_LENGTH} characters")
+
+    exercise = item.get('exercise')
+    if not isinstance(exercise, str) or exercise not in SESSION_MODELS:
+        raise ItemError(f"exercise must be one of: {', '.join(SESSION_MODELS)}")
+
+    count_field = 'count' if 'count' in item else COUNT_FIELDS[exercise]
+    if item.get(count_field) is None:
+        raise ItemError(f"Missing count (or {COUNT_FIELDS[exercise]})")
+    count = _non_negative_int(item[count_field], count_field)
+    duration = _non_negative_int(item.get('duration') or 0, 'duration')
+
+    timestamp = _parse_timestamp(item.get('timestamp'))
+    return {
+        'idempotency_key': key.strip(),
+        'exercise': exercise,
+        'count': count,
+        'duration': duration,
+        'timestamp': timestamp,
+    }
+
+
+def _existing_keys(user_id, keys):
+    if not keys:
+        return {}
+    rows = (
+        db.session.query(IngestKey.idempotency_key, IngestKey.exercise, IngestKey.session_id)
+        .filter(IngestKey.user_id == user_id, IngestKey.idempotency_key.in_(keys))
+        .all()
+    )
+    return {key: (exercise, session_id) for key, exercise, session_id in rows}
+
+
+def _insert(user_id, entries):
+    """Insert fresh entries with one multi-row INSERT per exercise
+
+    Fills in each entry's session_id and returns {exercise: {date: [reps, ...]}}
+    for leaderboard updates after commit.
+    """
+    by_exercise = defaultdict(list)
+    for entry in entries:
+        by_exercise[entry['exercise']].append(entry)
+
+    sessions_by_day = {}
+    for exercise, items in by_exercise.items():
+        model = SESSION_MODELS[exercise]
+        rows = [
+            {
+                'user_id': user_id,
+                'reps': item['count'],
+                'duration': item['duration'],
+                'timestamp': item['timestamp'],
+                'date': item['timestamp'].date(),
+                'time': item['timestamp'].time(),
+            }
+            for item in items
+        ]
+        statement = insert(model).returning(model.id, sort_by_parameter_order=True)
+        ids = db.session.execute(statement, rows).scalars().all()
+
+        days = defaultdict(list)
+        for item, session_id in zip(items, ids):
+            item['session_id'] = session_id
+            days[item['timestamp'].date()].append(item['count'])
+        sessions_by_day[exercise] = dict(days)
+
+        db.session.execute(insert(IngestKey), [
+            {
+                'user_id': user_id,
+                'idempotency_key': item['idempotency_key'],
+                'exercise': exercise,
+                'session_id': item['session_id'],
+                'created_at': datetime.utcnow(),
+            }
+            for item in items
+        ])
+        aggregates.record_sessions(user_id, exercise, [(item['session_id'], item['count']) for item in items])
+        rollups.record_sessions(user_id, exercise, [
+            (item['timestamp'].date(), item['count'], item['duration']) for item in items
+        ])
+    return sessions_by_day
+
+
+def ingest_batch(user_id, items, retries=1):
+    """Insert a batch of sessions in one transaction, skipping replayed keys
+
+    Returns (results, sessions_by_day). results has one dict per input item with
+    status 'created', 'duplicate' or 'error'. The caller must not have pending
+    work in the session; this commits.
+    """
+    if not isinstance(items, list) or not items:
+        raise BatchError("sessions must be a non-empty list")
+    if len(items) > MAX_BATCH_SIZE:
+        raise BatchError(f"At most {MAX_BATCH_SIZE} sessions per batch")
+
+    partitions.ensure_current()
+    user_id = int(user_id)
+    results = []
+    parsed = []
+    for index, item in enumerate(items):
+        result = {'index': index}
+        try:
+            entry = _parse_item(item)
+        except ItemError as e:
+            result.update(status='error', error=str(e))
+        else:
+            result['idempotency_key'] = entry['idempotency_key']
+            parsed.append((result, entry))
+        results.append(result)
+
+    while True:
+        existing = _existing_keys(user_id, list({entry['idempotency_key'] for _, entry in parsed}))
+        fresh = {}
+        for result, entry in parsed:
+            key = entry['idempotency_key']
+            if key in existing or key in fresh:
+                result['status'] = 'duplicate'
+            else:
+                result['status'] = 'created'
+                fresh[key] = entry
+
+        try:
+            sessions_by_day = _insert(user_id, list(fresh.values())) if fresh else {}
+            db.session.commit()
+            break
+        except IntegrityError:
+            # A concurrent replay of the same keys won; re-read and dedupe again
+            db.session.rollback()
+            if retries <= 0:
+                raise
+            retries -= 1
+
+    for result, entry in parsed:
+        key = entry['idempotency_key']
+        result['exercise'], result['session_id'] = existing.get(key) or (entry['exercise'], fresh[key]['session_id'])
+    return results, sessions_by_day
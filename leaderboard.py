@@ -0,0 +1,289 @@
+import json
+from collections import defaultdict
+from datetime import date, timedelta
+from sqlalchemy import func
+from models import db, User, SESSION_MODELS
+import percentiles
+
+# Daily boards only need to outlive the day they cover (plus timezone slack)
+DAILY_TTL = 60 * 60 * 48
+USERNAMES_KEY = "leaderboard:usernames"
+REBUILD_LOCK_TTL = 60
+# Pub/sub channel announcing changes that touch the live top-N
+CHANGES_CHANNEL = "leaderboard:changes"
+LIVE_TOP_N = 5
+
+
+def board_key(exercise, day=None):
+    """Sorted set holding user totals; all-time when day is None"""
+    if day is None:
+        return f"leaderboard:{exercise}:all"
+    return f"leaderboard:{exercise}:daily:{day.isoformat()}"
+
+
+def histogram_key(exercise, kind, day=None):
+    """Percentile histogram of user totals (kind 'totals') or session reps ('sessions')"""
+    if day is None:
+        return f"leaderboard:{exercise}:{kind}-histogram:all"
+    return f"leaderboard:{exercise}:{kind}-histogram:daily:{day.isoformat()}"
+
+
+def _ready_key(exercise):
+    # Versioned so boards built before the histograms existed are rebuilt once
+    return f"leaderboard:{exercise}:ready:v2"
+
+
+def _recent_days(today=None):
+    """Days whose daily boards can still exist given DAILY_TTL"""
+    today = today or date.today()
+    return [today - timedelta(days=offset) for offset in range(DAILY_TTL // 86400 + 1)]
+
+
+def _publish_if_top(redis_client, exercise, ranks):
+    """Announce boards where a rank before/after the change was inside the live top-N"""
+    for period, period_ranks in ranks.items():
+        if any(rank is not None and rank < LIVE_TOP_N for rank in period_ranks):
+            redis_client.publish(CHANGES_CHANNEL, json.dumps({'exercise': exercise, 'period': period}))
+
+
+def remember_username(redis_client, user):
+    """Keep the id -> username lookup used when rendering boards current"""
+    redis_client.hset(USERNAMES_KEY, str(user.id), user.username)
+
+
+def record_session(redis_client, exercise, session):
+    """Add a saved session's reps to the all-time and daily boards"""
+    record_totals(redis_client, exercise, session.user_id, {session.date: [session.reps]})
+
+
+def record_totals(redis_client, exercise, user_id, sessions_by_day):
+    """Add a user's new sessions, as {date: [reps, ...]}, to the boards and histograms in one round trip"""
+    member = str(user_id)
+    today = date.today()
+    all_reps = [reps for day_reps in sessions_by_day.values() for reps in day_reps]
+    pipe = redis_client.pipeline()
+    percentiles.adjust(pipe, board_key(exercise), histogram_key(exercise, 'totals'), member, sum(all_reps))
+    percentiles.count(pipe, histogram_key(exercise, 'sessions'), all_reps)
+    for day, day_reps in sessions_by_day.items():
+        percentiles.adjust(pipe, board_key(exercise, day), histogram_key(exercise, 'totals', day), member,
+                           sum(day_reps), DAILY_TTL)
+        percentiles.count(pipe, histogram_key(exercise, 'sessions', day), day_reps, ttl=DAILY_TTL)
+    pipe.zrevrank(board_key(exercise), member)
+    pipe.zrevrank(board_key(exercise, today), member)
+    results = pipe.execute()
+
+    ranks = {'all': [results[-2]]}
+    if today in sessions_by_day:
+        ranks['daily'] = [results[-1]]
+    _publish_if_top(redis_client, exercise, ranks)
+
+
+def discard_session(redis_client, exercise, session):
+    """Take a deleted session's reps back off the boards
+
+    A session from a day whose board has expired only leaves the all-time
+    board; touching the daily keys would recreate them without a TTL and
+    with a negative total.
+    """
+    member = str(session.user_id)
+    days = [None]
+    if session.date in _recent_days():
+        days.append(session.date)
+    pipe = redis_client.pipeline()
+    for day in days:
+        key = board_key(exercise, day)
+        ttl = DAILY_TTL if day else 0
+        pipe.zrevrank(key, member)
+        percentiles.adjust(pipe, key, histogram_key(exercise, 'totals', day), member, -session.reps, ttl)
+        pipe.zrevrank(key, member)
+    for day in days:
+        percentiles.count(pipe, histogram_key(exercise, 'sessions', day), [session.reps], sign=-1,
+                          ttl=DAILY_TTL if day else 0)
+    results = pipe.execute()
+
+    ranks = {'all': [results[0], results[2]]}
+    if session.date == date.today():
+        ranks['daily'] = [results[3], results[5]]
+    _publish_if_top(redis_client, exercise, ranks)
+
+
+def remove_user(redis_client, exercise, user_id, sessions=()):
+    """Drop a user from every live board after their sessions were reset
+
+    `sessions` counts the deleted sessions as (date, reps, sessions) rows, so
+    they can be taken out of the session histograms too.
+    """
+    member = str(user_id)
+    days = _recent_days()
+    reps_by_day = defaultdict(list)
+    for day, reps, number in sessions:
+        reps_by_day[day].append((reps, number))
+    pipe = redis_client.pipeline()
+    pipe.zrevrank(board_key(exercise), member)
+    pipe.zrevrank(board_key(exercise, date.today()), member)
+    percentiles.remove(pipe, board_key(exercise), histogram_key(exercise, 'totals'), member)
+    percentiles.count_grouped(pipe, histogram_key(exercise, 'sessions'),
+                              [(reps, number) for _, reps, number in sessions], sign=-1)
+    for day in days:
+        percentiles.remove(pipe, board_key(exercise, day), histogram_key(exercise, 'totals', day), member)
+        if reps_by_day.get(day):
+            percentiles.count_grouped(pipe, histogram_key(exercise, 'sessions', day), reps_by_day[day],
+                                      sign=-1, ttl=DAILY_TTL)
+    results = pipe.execute()
+    _publish_if_top(redis_client, exercise, {'all': [results[0]], 'daily': [results[1]]})
+
+
+def _usernames(redis_client, user_ids):
+    """Resolve usernames from the Redis hash, falling back to Postgres"""
+    if not user_ids:
+        return {}
+    names = dict(zip(user_ids, redis_client.hmget(USERNAMES_KEY, user_ids)))
+    missing = [int(user_id) for user_id, name in names.items() if name is None]
+    if missing:
+        found = {str(row.id): row.username for row in db.session.query(User.id, User.username).filter(User.id.in_(missing))}
+        if found:
+            redis_client.hset(USERNAMES_KEY, mapping=found)
+        names.update(found)
+    return names
+
+
+def top(redis_client, exercise, day=None, limit=5, user_id=None):
+    """Return (top entries, caller entry or None) from a board
+
+    Entries are dicts with rank, user_id, username and total. Reads are
+    ZREVRANGE plus ZREVRANK/ZSCORE for the caller, so cost is O(log n + limit).
+    """
+    key = board_key(exercise, day)
+    pipe = redis_client.pipeline()
+    pipe.zrevrange(key, 0, limit - 1, withscores=True)
+    if user_id is not None:
+        pipe.zrevrank(key, str(user_id))
+        pipe.zscore(key, str(user_id))
+    results = pipe.execute()
+
+    rows = results[0]
+    names = _usernames(redis_client, [member for member, _ in rows])
+    entries = [
+        {'rank': index + 1, 'user_id': int(member), 'username': names.get(member), 'total': int(score)}
+        for index, (member, score) in enumerate(rows)
+        if names.get(member) is not None
+    ]
+
+    me = None
+    if user_id is not None and results[1] is not None:
+        me = {'rank': results[1] + 1, 'user_id': int(user_id), 'total': int(results[2])}
+    return entries, me
+
+
+def percentile(redis_client, exercise, user_id, day=None, reps=None):
+    """The caller's standing on a board, and optionally that of a session of `reps`
+
+    Returns {'total', 'rank'} where rank is percentiles.rank() of the
+    caller's total among every user on the board, plus 'session' with the
+    rank of `reps` among all sessions of the period when reps is given. Cost is one round trip and a pass over
+    the histogram buckets, independent of the number of users.
+    """
+    pipe = redis_client.pipeline()
+    pipe.zscore(board_key(exercise, day), str(user_id))
+    pipe.hgetall(histogram_key(exercise, 'totals', day))
+    if reps is not None:
+        pipe.hgetall(histogram_key(exercise, 'sessions', day))
+    results = pipe.execute()
+
+    total = int(results[0] or 0)
+    standing = {'total': total, 'rank': percentiles.rank(results[1], total, counted=True)}
+    if reps is not None:
+        standing['session'] = percentiles.rank(results[2], reps)
+    return standing
+
+
+def is_ready(redis_client, exercise):
+    return bool(redis_client.exists(_ready_key(exercise)))
+
+
+def rebuild(redis_client, exercise):
+    """Rebuild the all-time and live daily boards for one exercise, and their histograms, from Postgres
+
+    Each board is written to a scratch key and swapped in with RENAME, so
+    readers never see a half-built board.
+    """
+    model = SESSION_MODELS[exercise]
+    days = _recent_days()
+
+    totals = (
+        db.session.query(model.user_id, func.sum(model.reps))
+        .group_by(model.user_id)
+        .all()
+    )
+    daily = (
+        db.session.query(model.date, model.user_id, func.sum(model.reps))
+        .filter(model.date >= min(days))
+        .group_by(model.date, model.user_id)
+        .all()
+    )
+    session_sizes = db.session.query(model.reps, func.count()).group_by(model.reps).all()
+    daily_sizes = (
+        db.session.query(model.date, model.reps, func.count())
+        .filter(model.date >= min(days))
+        .group_by(model.date, model.reps)
+        .all()
+    )
+    names = db.session.query(User.id, User.username).all()
+
+    boards = {board_key(exercise): {str(user_id): int(total) for user_id, total in totals if total}}
+    for day in days:
+        boards[board_key(exercise, day)] = {}
+    for day, user_id, total in daily:
+        if total and day in days:
+            boards[board_key(exercise, day)][str(user_id)] = int(total)
+
+    histograms = {histogram_key(exercise, 'sessions'): percentiles.histogram(session_sizes)}
+    sizes_by_day = defaultdict(list)
+    for day, reps, number in daily_sizes:
+        sizes_by_day[day].append((reps, number))
+    for day in [None] + days:
+        board = boards[board_key(exercise, day)]
+        histograms[histogram_key(exercise, 'totals', day)] = percentiles.histogram((total, 1) for total in board.values())
+        if day is not None:
+            histograms[histogram_key(exercise, 'sessions', day)] = percentiles.histogram(sizes_by_day[day])
+
+    pipe = redis_client.pipeline()
+    if names:
+        pipe.hset(USERNAMES_KEY, mapping={str(user_id): username for user_id, username in names})
+    for key, scores in boards.items():
+        if not scores:
+            pipe.delete(key)
+            continue
+        scratch = f"{key}:rebuild"
+        pipe.delete(scratch)
+        pipe.zadd(scratch, scores)
+        pipe.rename(scratch, key)
+        if key != board_key(exercise):
+            pipe.expire(key, DAILY_TTL)
+    for key, counts in histograms.items():
+        if not counts:
+            pipe.delete(key)
+            continue
+        scratch = f"{key}:rebuild"
+        pipe.delete(scratch)
+        pipe.hset(scratch, mapping=counts)
+        pipe.rename(scratch, key)
+        if not key.endswith(':all'):
+            pipe.expire(key, DAILY_TTL)
+    pipe.set(_ready_key(exercise), 1)
+    pipe.execute()
+    return len(boards[board_key(exercise)])
+
+
+def ensure_ready(redis_client, exercise):
+    """Rebuild a cold board once; returns False if another worker is rebuilding"""
+    if is_ready(redis_client, exercise):
+        return True
+    lock = f"leaderboard:{exercise}:rebuild-lock"
+    if not redis_client.set(lock, 1, nx=True, ex=REBUILD_LOCK_TTL):
+        return False
+    try:
+        rebuild(redis_client, exercise)
+    finally:
+        redis_client.delete(lock)
+    return True
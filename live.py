@@ -0,0 +1,155 @@
+import json
+import logging
+import queue
+import threading
+import time
+from datetime import date
+import redis
+import cache
+import leaderboard
+
+logger = logging.getLogger(__name__)
+
+KEEPALIVE_SECONDS = 15
+# Cached snapshots older than this are re-read on connect (e.g. across midnight)
+SNAPSHOT_MAX_AGE = 60
+PERIODS = ('all', 'daily')
+
+
+class StreamsFull(Exception):
+    """Raised when this worker already serves its maximum of streams; callers should answer 503"""
+
+    def __init__(self, retry_after):
+        super().__init__("Too many live leaderboard viewers, falling back to polling")
+        self.retry_after = retry_after
+
+
+class LeaderboardHub:
+    """Per-process fan-out of leaderboard snapshots to Server-Sent Events clients
+
+    One thread listens on the Redis change channel (so writes from any worker
+    are seen) and marks periods dirty; another wakes every `interval` seconds
+    and, if anything changed, reads the boards once and hands the snapshot to
+    every connected viewer. Redis reads therefore scale with the number of
+    changes, not with viewers. Threads start on first subscribe, after any
+    pre-fork, so each worker process gets its own.
+
+    Every open stream holds one of the worker's request threads, so at most
+    `max_viewers` are served at once; past that subscribe() raises
+    StreamsFull and the client polls the plain leaderboard routes instead.
+    """
+
+    def __init__(self, app, redis_client, interval=2.0, max_viewers=2, retry_after=30):
+        self.app = app
+        self.redis_client = redis_client
+        self.interval = interval
+        self.max_viewers = max_viewers
+        self.retry_after = retry_after
+        self._lock = threading.Lock()
+        self._subscribers = {period: set() for period in PERIODS}
+        self._dirty = set()
+        self._snapshots = {}
+        self._started = False
+
+    def subscribe(self, period):
+        """Register a viewer; returns a queue primed with the current snapshot"""
+        viewer = queue.Queue(maxsize=1)
+        with self._lock:
+            if sum(map(len, self._subscribers.values())) >= self.max_viewers:
+                raise StreamsFull(self.retry_after)
+            self._subscribers[period].add(viewer)
+        try:
+            self._start()
+            cached, read_at = self._snapshots.get(period, (None, 0))
+            snapshot = cached if time.monotonic() - read_at < SNAPSHOT_MAX_AGE else self._refresh(period)
+        except BaseException:
+            self.unsubscribe(period, viewer)
+            raise
+        try:
+            viewer.put_nowait(snapshot)
+        except queue.Full:
+            pass  # a broadcast already delivered a newer one
+        return viewer
+
+    def unsubscribe(self, period, viewer):
+        with self._lock:
+            self._subscribers[period].discard(viewer)
+
+    def events(self, period):
+        """Generator of SSE frames for one viewer"""
+        viewer = self.subscribe(period)
+        try:
+            while True:
+                try:
+                    snapshot = viewer.get(timeout=KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: leaderboard\ndata: {snapshot}\n\n"
+        finally:
+            self.unsubscribe(period, viewer)
+
+    def _start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        threading.Thread(target=self._listen, name="leaderboard-listen", daemon=True).start()
+        threading.Thread(target=self._broadcast, name="leaderboard-broadcast", daemon=True).start()
+
+    def _listen(self):
+        cache.subscribe(self.redis_client, leaderboard.CHANGES_CHANNEL, self._mark_dirty, retry_seconds=self.interval)
+
+    def _mark_dirty(self, data):
+        change = json.loads(data)
+        with self._lock:
+            self._dirty.add(change['period'])
+
+    def _broadcast(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                dirty, self._dirty = self._dirty, set()
+            for period in dirty:
+                with self._lock:
+                    if not self._subscribers[period]:
+                        # Nobody watching; next subscriber refreshes on connect
+                        self._snapshots.pop(period, None)
+                        continue
+                try:
+                    snapshot = self._refresh(period)
+                except redis.RedisError as e:
+                    logger.warning("Leaderboard broadcast error", extra={'error': str(e)})
+                    continue
+                with self._lock:
+                    viewers = list(self._subscribers[period])
+                for viewer in viewers:
+                    _replace(viewer, snapshot)
+
+    def _refresh(self, period):
+        """Read both exercise boards for a period and cache the JSON snapshot"""
+        day = date.today() if period == 'daily' else None
+        with self.app.app_context():
+            for exercise in ('squat', 'pushup'):
+                leaderboard.ensure_ready(self.redis_client, exercise)
+            squats, _ = leaderboard.top(self.redis_client, 'squat', day=day, limit=leaderboard.LIVE_TOP_N)
+            pushups, _ = leaderboard.top(self.redis_client, 'pushup', day=day, limit=leaderboard.LIVE_TOP_N)
+        snapshot = json.dumps({
+            'period': period,
+            'squats': [{'username': e['username'], 'total_squats': e['total']} for e in squats],
+            'pushups': [{'username': e['username'], 'total_pushups': e['total']} for e in pushups],
+        })
+        self._snapshots[period] = (snapshot, time.monotonic())
+        return snapshot
+
+
+def _replace(viewer, snapshot):
+    """Keep only the newest snapshot in a viewer's queue"""
+    try:
+        viewer.get_nowait()
+    except queue.Empty:
+        pass
+    try:
+        viewer.put_nowait(snapshot)
+    except queue.Full:
+        pass
@@ -0,0 +1,162 @@
+"""Request, SQL, Redis and Gemini instrumentation exposed on GET /metrics.
+
+Histograms live in this process's prometheus_client registry. Under gunicorn,
+set PROMETHEUS_MULTIPROC_DIR (an empty, writable directory) before start-up so
+every worker writes to shared files and /metrics reports all of them.
+"""
+import logging
+import os
+import time
+import redis
+from flask import Response, current_app, g, has_request_context, request
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+SQL_OPERATIONS = {'SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH', 'COPY'}
+
+REQUEST_SECONDS = Histogram(
+    'http_request_duration_seconds', 'Request latency by route',
+    ['method', 'route', 'status'], buckets=LATENCY_BUCKETS
+)
+REQUEST_QUERIES = Histogram(
+    'http_request_sql_queries', 'SQL statements issued per request',
+    ['route'], buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100)
+)
+SQL_SECONDS = Histogram(
+    'sql_query_duration_seconds', 'SQL statement latency',
+    ['operation'], buckets=FAST_BUCKETS
+)
+REDIS_SECONDS = Histogram(
+    'redis_command_duration_seconds', 'Redis command latency',
+    ['command'], buckets=FAST_BUCKETS
+)
+GEMINI_SECONDS = Histogram(
+    'gemini_request_duration_seconds', 'Exercise summary generation latency',
+    ['outcome'], buckets=(0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+)
+USER_CACHE_LOOKUPS = Counter(
+    'user_cache_lookups', 'Authenticated-user profile lookups by cache tier',
+    ['result']
+)
+DB_READS = Counter(
+    'db_read_routing', 'Read-only requests by the database that served them',
+    ['target']
+)
+SESSION_WRITER_ENTRIES = Counter(
+    'session_writer_entries', 'Queued sessions handled by the write-behind writer',
+    ['result']
+)
+RATE_LIMIT_CHECKS = Counter(
+    'rate_limit_checks', 'Rate-limited requests by policy, outcome and where the bucket is kept',
+    ['policy', 'outcome', 'backend']
+)
+
+
+def _route():
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+
+def _start_request():
+    g.request_started = time.perf_counter()
+    g.sql_queries = 0
+    g.sql_seconds = 0.0
+
+
+def _finish_request(response):
+    started = g.pop('request_started', None)
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    route = _route()
+    REQUEST_SECONDS.labels(request.method, route, str(response.status_code)).observe(elapsed)
+    REQUEST_QUERIES.labels(route).observe(g.sql_queries)
+
+    fields = {
+        'method': request.method,
+        'route': route,
+        'status': response.status_code,
+        'duration_ms': round(elapsed * 1000, 1),
+        'sql_queries': g.sql_queries,
+        'sql_ms': round(g.sql_seconds * 1000, 1),
+    }
+    if elapsed * 1000 >= current_app.config['SLOW_REQUEST_MS']:
+        logger.warning("Slow request", extra=fields)
+    else:
+        logger.debug("Request", extra=fields)
+    return response
+
+
+def _watch_queries(engine, slow_query_ms):
+    """Time every statement on `engine`, per request and overall"""
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_started'].pop()
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ''
+        SQL_SECONDS.labels(operation if operation in SQL_OPERATIONS else 'OTHER').observe(elapsed)
+        if has_request_context() and 'sql_queries' in g:
+            g.sql_queries += 1
+            g.sql_seconds += elapsed
+        if elapsed * 1000 >= slow_query_ms:
+            logger.warning("Slow query", extra={
+                'duration_ms': round(elapsed * 1000, 1),
+                'statement': ' '.join(statement.split())[:500],
+            })
+
+
+def render():
+    """Prometheus text exposition of every metric (all workers in multiprocess mode)"""
+    token = current_app.config.get('METRICS_TOKEN')
+    if token and request.headers.get('Authorization') != f"Bearer {token}":
+        return Response("Unauthorized\n", status=401, mimetype='text/plain')
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+
+def init_app(app, db, engines=()):
+    """Install request timing, SQL accounting and the /metrics endpoint
+
+    engines are extra engines (e.g. read replicas) to time alongside the primary.
+    """
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    with app.app_context():
+        _watch_queries(db.engine, app.config['SLOW_QUERY_MS'])
+    for engine in engines:
+        _watch_queries(engine, app.config['SLOW_QUERY_MS'])
+    app.add_url_rule('/metrics', 'metrics', render)
+
+
+class _TimedPipeline(redis.client.Pipeline):
+    def execute(self, raise_on_error=True):
+        started = time.perf_counter()
+        try:
+            return super().execute(raise_on_error)
+        finally:
+            REDIS_SECONDS.labels('PIPELINE').observe(time.perf_counter() - started)
+
+
+class InstrumentedRedis(redis.Redis):
+    """redis.Redis that records the latency of every command and pipeline"""
+
+    def execute_command(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            return super().execute_command(*args, **options)
+        finally:
+            REDIS_SECONDS.labels(str(args[0]).upper()).observe(time.perf_counter() - started)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return _TimedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
@@ -0,0 +1,110 @@
+from sqlalchemy import MetaData, Table, func, insert, inspect, literal, select, text, update
+from models import db, ExerciseSession, IngestKey
+
+# Per-exercise tables used before exercise_sessions, with their rep count column
+LEGACY_TABLES = {
+    'squat': ('squat_sessions', 'squat_count'),
+    'pushup': ('pushup_sessions', 'pushup_count'),
+}
+
+
+# Columns added to exercise_sessions after it was first created, created by add_missing_columns()
+ADDED_SESSION_COLUMNS = ('recorded_at',)
+
+
+class MigrationError(Exception):
+    """Raised when the legacy session tables cannot be migrated"""
+
+
+def legacy_tables():
+    """Names of the old per-exercise tables still present in the database"""
+    inspector = inspect(db.engine)
+    return {exercise: spec for exercise, spec in LEGACY_TABLES.items() if inspector.has_table(spec[0])}
+
+
+def add_missing_columns():
+    """Add exercise_sessions columns (and their indexes) missing from an older schema
+
+    Returns the names of the columns added. Existing rows get NULL. On a
+    partitioned table the column and index reach every partition.
+    """
+    table = ExerciseSession.__table__
+    existing = {column['name'] for column in inspect(db.engine).get_columns(table.name)}
+    missing = [name for name in ADDED_SESSION_COLUMNS if name not in existing]
+    if not missing:
+        return []
+    with db.engine.begin() as conn:
+        for name in missing:
+            column_type = table.c[name].type.compile(dialect=conn.dialect)
+            conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {name} {column_type}"))
+        for index in table.indexes:
+            if any(column.name in missing for column in index.columns):
+                index.create(conn, checkfirst=True)
+    return missing
+
+
+def _max_session_id():
+    return db.session.query(func.coalesce(func.max(ExerciseSession.id), 0)).scalar()
+
+
+def migrate_legacy_sessions():
+    """Copy squat_sessions and pushup_sessions into exercise_sessions
+
+    Runs in one transaction and returns {exercise: rows copied}. Squat ids are
+    kept; each later table is shifted past the ids already copied, and
+    ingest_keys are shifted with them. exercise_sessions must still be empty,
+    so run this before the new code takes writes, then rebuild-stats (the
+    recent-session ids on aggregates move with the shift).
+    """
+    tables = legacy_tables()
+    if not tables:
+        return {}
+    if db.session.query(ExerciseSession.id).first() is not None:
+        raise MigrationError("exercise_sessions already has rows; the legacy tables were migrated or written around")
+
+    metadata = MetaData()
+    target = ExerciseSession.__table__
+    copied = {}
+    try:
+        for exercise, (name, count_column) in tables.items():
+            legacy = Table(name, metadata, autoload_with=db.engine)
+            offset = _max_session_id()
+            rows = select(
+                legacy.c.id + offset,
+                legacy.c.user_id,
+                literal(exercise),
+                legacy.c[count_column],
+                legacy.c.duration,
+                legacy.c.timestamp,
+                legacy.c.date,
+                legacy.c.time
+            )
+            result = db.session.execute(insert(target).from_select(
+                ['id', 'user_id', 'exercise_type', 'reps', 'duration', 'timestamp', 'date', 'time'], rows
+            ))
+            copied[exercise] = result.rowcount
+            if offset:
+                db.session.execute(
+                    update(IngestKey)
+                    .where(IngestKey.exercise == exercise)
+                    .values(session_id=IngestKey.session_id + offset)
+                )
+
+        if db.engine.dialect.name == 'postgresql':
+            # Explicit ids bypass the serial sequence; move it past them
+            db.session.execute(text(
+                "SELECT setval(pg_get_serial_sequence('exercise_sessions', 'id'), "
+                "(SELECT COALESCE(MAX(id), 0) + 1 FROM exercise_sessions), false)"
+            ))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return copied
+
+
+def drop_legacy_tables():
+    """Drop the old per-exercise tables once their rows have been migrated"""
+    metadata = MetaData()
+    for name, _ in legacy_tables().values():
+        Table(name, metadata, autoload_with=db.engine).drop(db.engine)
@@ -1,8 +1,9 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
-import bcrypt
+from passwords import hash_password, verify_password
+from replicas import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class User(db.Model):
     __tablename__ = 'users'
@@ -14,17 +15,16 @@ class User(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.now)
     updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
     
-    # Relationship with squat sessions
-    squat_sessions = db.relationship('SquatSession', backref='user', lazy=True, cascade='all, delete-orphan')
+    # Relationship with exercise sessions of every type
+    exercise_sessions = db.relationship('ExerciseSession', backref='user', lazy=True, cascade='all, delete-orphan')
     
-    def set_password(self, password):
-        """Hash password and store it"""
-        salt = bcrypt.gensalt()
-        self.password_hash = bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+    def set_password(self, password, rounds=None):
+        """Hash password and store it (inline; request handlers use the app's PasswordHasher)"""
+        self.password_hash = hash_password(password, rounds)
     
     def check_password(self, password):
         """Check if provided password matches the hash"""
-        return bcrypt.checkpw(password.encode('utf-8'), self.password_hash.encode('utf-8'))
+        return verify_password(password, self.password_hash)
     
     def to_dict(self):
         """Convert user to dictionary (excluding password)"""
@@ -36,48 +36,144 @@ class User(db.Model):
             'updated_at': self.updated_at.isoformat()
         }
 
-class SquatSession(db.Model):
-    __tablename__ = 'squat_sessions'
+def _session_timestamp(context):
+    return context.get_current_parameters().get('timestamp') or datetime.utcnow()
+
+def _session_date(context):
+    return _session_timestamp(context).date()
+
+def _session_time(context):
+    return _session_timestamp(context).time()
+
+class ExerciseSession(db.Model):
+    """One completed session of any exercise; each exercise maps a subclass onto this table"""
+    __tablename__ = 'exercise_sessions'
+    __table_args__ = (
+        # History pages and per-user totals: WHERE user_id = ? AND exercise_type = ? ORDER BY timestamp
+        db.Index('ix_exercise_sessions_user_type_timestamp', 'user_id', 'exercise_type', 'timestamp'),
+        # Daily leaderboards: WHERE exercise_type = ? AND date >= ?
+        db.Index('ix_exercise_sessions_type_date', 'exercise_type', 'date'),
+        # Incremental exports: WHERE user_id = ? AND recorded_at >= ?
+        db.Index('ix_exercise_sessions_user_recorded_at', 'user_id', 'recorded_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    squat_count = db.Column(db.Integer, nullable=False)
+    exercise_type = db.Column(db.String(20), nullable=False)
+    reps = db.Column(db.Integer, nullable=False)
     duration = db.Column(db.Integer, default=0)  # in seconds
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
-    date = db.Column(db.Date, default=datetime.utcnow().date)
-    time = db.Column(db.Time, default=datetime.utcnow().time)
+    # Split from timestamp at insert time; date is also the partition key on Postgres
+    date = db.Column(db.Date, default=_session_date)
+    time = db.Column(db.Time, default=_session_time)
+    # When the server wrote the row, unlike the client-supplied timestamp; incremental
+    # exports follow it. NULL for rows written before the column was added.
+    recorded_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __mapper_args__ = {'polymorphic_on': exercise_type}
     
     def to_dict(self):
         """Convert session to dictionary"""
         return {
             'id': self.id,
             'user_id': self.user_id,
-            'squat_count': self.squat_count,
+            'exercise_type': self.exercise_type,
+            'reps': self.reps,
             'duration': self.duration,
             'timestamp': self.timestamp.isoformat(),
             'date': self.date.isoformat(),
             'time': self.time.isoformat()
         }
 
-class PushupSession(db.Model):
-    __tablename__ = 'pushup_sessions'
+class SquatSession(ExerciseSession):
+    """Squat rows of exercise_sessions; queries are filtered to exercise_type='squat'"""
+    __mapper_args__ = {'polymorphic_identity': 'squat'}
+    
+    squat_count = db.synonym('reps')
+    
+    def to_dict(self):
+        """Convert session to dictionary, keeping the squat_count field clients use"""
+        return dict(super().to_dict(), squat_count=self.squat_count)
+
+class PushupSession(ExerciseSession):
+    """Pushup rows of exercise_sessions; queries are filtered to exercise_type='pushup'"""
+    __mapper_args__ = {'polymorphic_identity': 'pushup'}
+    
+    pushup_count = db.synonym('reps')
+    
+    def to_dict(self):
+        """Convert session to dictionary, keeping the pushup_count field clients use"""
+        return dict(super().to_dict(), pushup_count=self.pushup_count)
+
+# Session model for each exercise, keyed by its exercise_type; a new exercise
+# needs only a subclass above and an entry here
+SESSION_MODELS = {
+    'squat': SquatSession,
+    'pushup': PushupSession,
+}
+
+# Name of the legacy rep count API field for each exercise
+COUNT_FIELDS = {
+    'squat': 'squat_count',
+    'pushup': 'pushup_count',
+}
+
+class ExerciseStats(db.Model):
+    """Running per-user totals for one exercise, kept in step with session writes"""
+    __tablename__ = 'exercise_stats'
+    __table_args__ = (db.UniqueConstraint('user_id', 'exercise', name='uq_exercise_stats_user_exercise'),)
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    pushup_count = db.Column(db.Integer, nullable=False)
-    duration = db.Column(db.Integer, default=0)  # in seconds
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
-    date = db.Column(db.Date, default=datetime.utcnow().date)
-    time = db.Column(db.Time, default=datetime.utcnow().time)
+    exercise = db.Column(db.String(20), nullable=False)
+    total_reps = db.Column(db.Integer, nullable=False, default=0)
+    sessions_completed = db.Column(db.Integer, nullable=False, default=0)
+    best_session = db.Column(db.Integer, nullable=False, default=0)
+    recent_session_ids = db.Column(db.JSON, nullable=False, default=list)  # oldest first
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+    
+    def average_per_session(self):
+        """Average reps per session, rounded like the stats endpoints expect"""
+        if not self.sessions_completed:
+            return 0
+        return round(self.total_reps / self.sessions_completed, 1)
+
+class ExerciseRollup(db.Model):
+    """Per-user totals for one exercise over a day, week (from Monday) or month"""
+    __tablename__ = 'exercise_rollups'
+    __table_args__ = (
+        # Also serves history reads: WHERE user_id, exercise, granularity AND bucket_start BETWEEN
+        db.UniqueConstraint('user_id', 'exercise', 'granularity', 'bucket_start', name='uq_exercise_rollups_bucket'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    exercise = db.Column(db.String(20), nullable=False)
+    granularity = db.Column(db.String(5), nullable=False)  # day, week or month
+    bucket_start = db.Column(db.Date, nullable=False)
+    reps = db.Column(db.Integer, nullable=False, default=0)
+    sessions = db.Column(db.Integer, nullable=False, default=0)
+    duration = db.Column(db.Integer, nullable=False, default=0)  # in seconds
+    best = db.Column(db.Integer, nullable=False, default=0)
     
     def to_dict(self):
-        """Convert session to dictionary"""
+        """Convert bucket to dictionary"""
         return {
-            'id': self.id,
-            'user_id': self.user_id,
-            'pushup_count': self.pushup_count,
+            'start': self.bucket_start.isoformat(),
+            'reps': self.reps,
+            'sessions': self.sessions,
             'duration': self.duration,
-            'timestamp': self.timestamp.isoformat(),
-            'date': self.date.isoformat(),
-            'time': self.time.isoformat()
-        } 
\ No newline at end of file
+            'best': self.best
+        }
+
+class IngestKey(db.Model):
+    """Client idempotency keys for batch-uploaded sessions, used to drop replays"""
+    __tablename__ = 'ingest_keys'
+    __table_args__ = (db.UniqueConstraint('user_id', 'idempotency_key', name='uq_ingest_keys_user_key'),)
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    idempotency_key = db.Column(db.String(64), nullable=False)
+    exercise = db.Column(db.String(20), nullable=False)
+    session_id = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
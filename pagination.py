@@ -0,0 +1,64 @@
+import base64
+from datetime import datetime
+from sqlalchemy import tuple_
+import serialization
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+# Rows fetched per round trip from the server-side cursor when streaming
+STREAM_CHUNK_SIZE = 500
+
+
+class InvalidCursor(ValueError):
+    """Raised when a client sends a cursor we did not issue"""
+
+
+def encode_cursor(session):
+    """Opaque cursor pointing just past the given session (an ORM object or projected row)"""
+    raw = f"{session.timestamp.isoformat()}|{session.id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Return (timestamp, id) from a cursor produced by encode_cursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        timestamp, session_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(timestamp), int(session_id)
+    except (ValueError, UnicodeError) as e:
+        raise InvalidCursor("Invalid cursor") from e
+
+
+def newest_first(query, model, cursor=None):
+    """Order a session query newest first, resuming after cursor if given
+
+    Keyset on (timestamp, id) so each page is an index range scan instead of
+    an OFFSET that re-reads every earlier row.
+    """
+    if cursor:
+        timestamp, session_id = decode_cursor(cursor)
+        query = query.filter(tuple_(model.timestamp, model.id) < tuple_(timestamp, session_id))
+        # Lets Postgres skip the partitions of months after the cursor
+        query = query.filter(model.date <= timestamp.date())
+    return query.order_by(model.timestamp.desc(), model.id.desc())
+
+
+def keyset_page(query, model, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """Return (rows, next_cursor); next_cursor is None on the last page
+
+    Rows are whatever the query selects; they need `timestamp` and `id` for the cursor.
+    """
+    rows = newest_first(query, model, cursor).limit(limit + 1).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1])
+    return rows, None
+
+
+def iter_ndjson(query, model, cursor=None):
+    """Yield one JSON line per session, reading through a server-side cursor
+
+    The query must select serialization.session_columns(model).
+    """
+    for row in newest_first(query, model, cursor).yield_per(STREAM_CHUNK_SIZE):
+        yield serialization.dumps(serialization.session_row(row)) + b"\n"
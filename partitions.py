@@ -0,0 +1,301 @@
+"""Monthly range partitions of exercise_sessions on PostgreSQL.
+
+exercise_sessions is partitioned BY RANGE (date), with one partition per
+calendar month (exercise_sessions_pYYYYMM) plus a DEFAULT partition for
+sessions outside every monthly range, e.g. old offline uploads. Queries that
+filter on date (the daily leaderboard fallback, rollup repairs, and keyset
+pages after the first) are pruned to the matching partitions. Retention
+detaches whole months instead of running long DELETEs.
+
+Postgres requires the partition key in the primary key, so the table's key
+is (id, date). The ORM still identifies sessions by id alone. Other databases
+keep the plain table, and every function here is a no-op on them.
+"""
+import gzip
+import logging
+import os
+import re
+import threading
+from datetime import date
+import sqlalchemy as sa
+from flask import current_app
+from models import db, User, ExerciseSession
+import rollups
+
+logger = logging.getLogger(__name__)
+
+TABLE = ExerciseSession.__tablename__
+DEFAULT_PARTITION = f"{TABLE}_default"
+_PARTITION_NAME = re.compile(rf"^{TABLE}_p(\d{{4}})(\d{{2}})$")
+# pg_advisory_xact_lock key serializing partition DDL across workers
+_LOCK_KEY = 740211
+_ensured_month = None
+_ensure_lock = threading.Lock()
+
+
+class PartitionError(Exception):
+    """Raised when partitioning cannot be set up or changed"""
+
+
+def supported(bind=None):
+    return (bind or db.engine).dialect.name == 'postgresql'
+
+
+def partition_name(start):
+    return f"{TABLE}_p{start:%Y%m}"
+
+
+def _month(day):
+    return rollups.bucket_start(day, 'month')
+
+
+def _next_month(start):
+    return rollups.next_bucket(start, 'month')
+
+
+def _partitioned_table():
+    """exercise_sessions as declared in models.py, but keyed on (id, date) and PARTITION BY RANGE (date)"""
+    metadata = sa.MetaData()
+    User.__table__.to_metadata(metadata)  # target of the user_id foreign key
+    table = ExerciseSession.__table__.to_metadata(metadata)
+    # Mark date as a key column first so the composite key matches the columns' own flags
+    table.c.date.primary_key = True
+    table.c.date.nullable = False
+    table.append_constraint(sa.PrimaryKeyConstraint(table.c.id, table.c.date, name=f"{TABLE}_pkey"))
+    table.c.id.autoincrement = True
+    table.dialect_options['postgresql']['partition_by'] = 'RANGE (date)'
+    return table
+
+
+def is_partitioned(conn):
+    return conn.execute(
+        sa.text("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table)"),
+        {'table': TABLE}
+    ).scalar() is not None
+
+
+def partitions(conn):
+    """Monthly partitions as [(name, first day)], oldest first"""
+    names = conn.execute(sa.text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:table)"
+    ), {'table': TABLE}).scalars()
+    months = []
+    for name in names:
+        match = _PARTITION_NAME.match(name)
+        if match:
+            months.append((name, date(int(match.group(1)), int(match.group(2)), 1)))
+    return sorted(months, key=lambda item: item[1])
+
+
+def _lock(conn):
+    conn.execute(sa.text("SELECT pg_advisory_xact_lock(:key)"), {'key': _LOCK_KEY})
+
+
+def create_partitioned(conn):
+    """Create the partitioned exercise_sessions and its DEFAULT partition"""
+    _partitioned_table().create(conn)
+    conn.execute(sa.text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT"))
+
+
+def create_tables(months_ahead):
+    """db.create_all(), creating exercise_sessions partitioned when on PostgreSQL
+
+    Returns the names of any monthly partitions created. An existing plain
+    exercise_sessions is left alone; `session-partitions convert` migrates it.
+    """
+    if supported():
+        with db.engine.begin() as conn:
+            if not sa.inspect(conn).has_table(TABLE):
+                create_partitioned(conn)
+    db.create_all()
+    return ensure_ahead(months_ahead)
+
+
+def _create_month(conn, start):
+    """Attach the partition for one month, moving its rows out of the DEFAULT partition
+
+    Creating it with LIKE and then attaching it works whether or not the
+    default partition already holds rows in the new range.
+    """
+    name = partition_name(start)
+    first, end = start.isoformat(), _next_month(start).isoformat()
+    conn.execute(sa.text(f"CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    conn.execute(sa.text(
+        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE date >= :first AND date < :end RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved"
+    ), {'first': first, 'end': end})
+    conn.execute(sa.text(f"ALTER TABLE {TABLE} ATTACH PARTITION {name} FOR VALUES FROM ('{first}') TO ('{end}')"))
+    return name
+
+
+def ensure_months(conn, first, last):
+    """Make sure a partition exists for every month from `first` to `last`; returns the new names"""
+    _lock(conn)
+    existing = {start for _, start in partitions(conn)}
+    created = []
+    start = _month(first)
+    while start <= last:
+        if start not in existing:
+            created.append(_create_month(conn, start))
+        start = _next_month(start)
+    return created
+
+
+def ensure_ahead(months_ahead):
+    """Create this month's partition and the next `months_ahead`; returns the new names"""
+    if not supported():
+        return []
+    last = _month(date.today())
+    for _ in range(months_ahead):
+        last = _next_month(last)
+    with db.engine.begin() as conn:
+        if not is_partitioned(conn):
+            return []
+        # Never queue behind a long transaction on the default partition
+        conn.execute(sa.text("SET LOCAL lock_timeout = '2s'"))
+        return ensure_months(conn, date.today(), last)
+
+
+def ensure_current():
+    """Once a month per process, before a session write, create upcoming partitions
+
+    Cheap after the first call in a month. Failures are logged, not raised:
+    rows land in the DEFAULT partition until `session-partitions maintain` runs.
+    """
+    global _ensured_month
+    month = _month(date.today())
+    if _ensured_month == month:
+        return
+    with _ensure_lock:
+        if _ensured_month == month:
+            return
+        _ensured_month = month
+    try:
+        created = ensure_ahead(current_app.config['SESSION_PARTITIONS_AHEAD'])
+    except sa.exc.SQLAlchemyError as e:
+        logger.warning("Session partition maintenance failed", extra={'error': str(e)})
+        return
+    if created:
+        logger.info("Created session partitions", extra={'partitions': created})
+
+
+def _date_parts(conn, timestamp):
+    """SQL expressions for the date and time of a timestamp column"""
+    if conn.dialect.name == 'sqlite':
+        return sa.func.date(timestamp), sa.func.strftime('%H:%M:%f', timestamp)
+    return sa.cast(timestamp, sa.Date), sa.cast(timestamp, sa.Time)
+
+
+def repair_dates(conn):
+    """Set date/time from timestamp wherever they disagree; returns rows fixed
+
+    Sessions written before the insert-time defaults were fixed carry the
+    date their worker started on, not the date they were recorded.
+    """
+    table = ExerciseSession.__table__
+    day, time_of_day = _date_parts(conn, table.c.timestamp)
+    result = conn.execute(
+        table.update()
+        .where(sa.or_(table.c.date.is_(None), table.c.date != day))
+        .values(date=day, time=time_of_day)
+    )
+    return result.rowcount
+
+
+def convert(months_ahead):
+    """Rebuild an existing plain exercise_sessions as the partitioned table, in one transaction
+
+    Dates are taken from each row's timestamp while copying. Returns
+    {'rows': copied, 'partitions': created}. Writes block until the
+    transaction commits, so run this in a maintenance window.
+    """
+    if not supported():
+        raise PartitionError("Partitioning needs PostgreSQL")
+    old = f"{TABLE}_unpartitioned"
+    with db.engine.begin() as conn:
+        _lock(conn)
+        if is_partitioned(conn):
+            raise PartitionError(f"{TABLE} is already partitioned")
+        if conn.execute(sa.text("SELECT to_regclass(:table)"), {'table': old}).scalar() is not None:
+            raise PartitionError(f"{old} exists; remove it after checking it is no longer needed")
+
+        # Move the old table and everything named after it out of the way
+        sequence = conn.execute(sa.text("SELECT pg_get_serial_sequence(:table, 'id')"), {'table': TABLE}).scalar()
+        pkey = conn.execute(sa.text(
+            "SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(:table) AND contype = 'p'"
+        ), {'table': TABLE}).scalar()
+        conn.execute(sa.text(f"ALTER TABLE {TABLE} RENAME TO {old}"))
+        if pkey:
+            conn.execute(sa.text(f'ALTER TABLE {old} RENAME CONSTRAINT "{pkey}" TO {old}_pkey'))
+        for index in ExerciseSession.__table__.indexes:
+            conn.execute(sa.text(f"ALTER INDEX IF EXISTS {index.name} RENAME TO {index.name}_old"))
+        if sequence:
+            conn.execute(sa.text(f"ALTER SEQUENCE {sequence} RENAME TO {old}_id_seq"))
+
+        create_partitioned(conn)
+        first, last = conn.execute(sa.text(f"SELECT min(timestamp)::date, max(timestamp)::date FROM {old}")).one()
+        end = _month(date.today())
+        for _ in range(months_ahead):
+            end = _next_month(end)
+        created = ensure_months(conn, min(first or date.today(), date.today()), max(last or end, end))
+
+        old_columns = {column['name'] for column in sa.inspect(conn).get_columns(old)}
+        recorded_at = 'recorded_at' if 'recorded_at' in old_columns else 'NULL'
+        rows = conn.execute(sa.text(
+            f"INSERT INTO {TABLE} (id, user_id, exercise_type, reps, duration, timestamp, date, time, recorded_at) "
+            f"SELECT id, user_id, exercise_type, reps, duration, timestamp, timestamp::date, timestamp::time, "
+            f"{recorded_at} FROM {old}"
+        )).rowcount
+        conn.execute(sa.text(
+            f"SELECT setval(pg_get_serial_sequence(:table, 'id'), (SELECT coalesce(max(id), 0) + 1 FROM {TABLE}), false)"
+        ), {'table': TABLE})
+        conn.execute(sa.text(f"DROP TABLE {old}"))
+    return {'rows': rows, 'partitions': created}
+
+
+def detach_before(cutoff):
+    """Detach every monthly partition that ends on or before `cutoff`; returns their names
+
+    Detached partitions keep their rows as standalone tables until archived
+    or dropped. The per-user aggregates and rollups are separate tables, so
+    lifetime totals and history are unaffected.
+    """
+    if not supported():
+        return []
+    detached = []
+    with db.engine.begin() as conn:
+        _lock(conn)
+        for name, start in partitions(conn):
+            if _next_month(start) <= cutoff:
+                conn.execute(sa.text(f"ALTER TABLE {TABLE} DETACH PARTITION {name}"))
+                detached.append(name)
+    return detached
+
+
+def archive(name, directory, drop=False):
+    """Write a detached partition to <directory>/<name>.csv.gz, optionally dropping it; returns the path"""
+    if not _PARTITION_NAME.match(name):
+        raise PartitionError(f"{name} is not a session partition")
+    path = os.path.join(directory, f"{name}.csv.gz")
+    with db.engine.begin() as conn:
+        attached = conn.execute(sa.text(
+            "SELECT 1 FROM pg_inherits WHERE inhrelid = to_regclass(:name)"
+        ), {'name': name}).scalar()
+        if attached:
+            raise PartitionError(f"{name} is still attached; detach it first")
+        cursor = conn.connection.cursor()
+        with gzip.open(path, 'wb') as handle:
+            cursor.copy_expert(f"COPY {name} TO STDOUT WITH (FORMAT csv, HEADER)", handle)
+        if drop:
+            conn.execute(sa.text(f"DROP TABLE {name}"))
+    return path
+
+
+def detached_tables(conn):
+    """Session partitions that were detached but not dropped yet"""
+    names = conn.execute(sa.text(
+        "SELECT c.relname FROM pg_class c WHERE c.relkind = 'r' AND c.relname LIKE :pattern "
+        "AND NOT EXISTS (SELECT 1 FROM pg_inherits i WHERE i.inhrelid = c.oid)"
+    ), {'pattern': f"{TABLE}_p%"}).scalars()
+    return sorted(name for name in names if _PARTITION_NAME.match(name))
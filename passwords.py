@@ -0,0 +1,85 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+import bcrypt
+
+DEFAULT_ROUNDS = 12
+
+
+def hash_password(password, rounds=None):
+    """bcrypt hash of password at the given work factor"""
+    salt = bcrypt.gensalt(rounds or DEFAULT_ROUNDS)
+    return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+
+
+def verify_password(password, password_hash):
+    return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+
+
+def hash_rounds(password_hash):
+    """Work factor a bcrypt hash was made with ($2b$<rounds>$...)"""
+    try:
+        return int(password_hash.split('$')[2])
+    except (IndexError, ValueError):
+        return None
+
+
+class HasherBusy(Exception):
+    """Raised when the hashing queue is full; callers should answer 503"""
+
+    def __init__(self, retry_after):
+        super().__init__("Authentication is busy, please retry shortly")
+        self.retry_after = retry_after
+
+
+class PasswordHasher:
+    """Runs bcrypt on a small dedicated thread pool with a bounded queue
+
+    bcrypt is deliberately CPU-heavy; running it inline lets a login storm
+    occupy every request thread. Here at most `workers` hashes run at once,
+    at most `max_queue` more wait, and anything beyond that fails fast with
+    HasherBusy instead of stalling unrelated routes. workers=0 hashes inline.
+    """
+
+    def __init__(self, workers=2, max_queue=32, rounds=DEFAULT_ROUNDS, timeout=10, retry_after=2):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.rounds = rounds
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def hash(self, password):
+        return self._run(hash_password, password, self.rounds)
+
+    def verify(self, password, password_hash):
+        return self._run(verify_password, password, password_hash)
+
+    def needs_rehash(self, password_hash):
+        """True when a stored hash was made with a different work factor"""
+        return hash_rounds(password_hash) != self.rounds
+
+    def _run(self, func, *args):
+        if self.workers <= 0:
+            return func(*args)
+
+        with self._lock:
+            if self._pending >= self.workers + self.max_queue:
+                raise HasherBusy(self.retry_after)
+            self._pending += 1
+            if self._executor is None:
+                # Created on first use so it only exists in worker processes
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+            future = self._executor.submit(func, *args)
+        future.add_done_callback(self._done)
+
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            future.cancel()
+            raise HasherBusy(self.retry_after)
+
+    def _done(self, future):
+        with self._lock:
+            self._pending -= 1
@@ -0,0 +1,150 @@
+"""Fixed-bucket histograms in Redis for percentile lookups.
+
+For each exercise and period (all-time, and each day), one Redis hash counts
+user totals per bucket and another counts sessions per bucket of their reps.
+Buckets are log-scaled with BUCKETS_PER_DOUBLING per power of two, so each
+covers about 9% of its values and a hash stays at a few dozen fields however
+many users there are. A percentile is one HGETALL plus a pass over those
+fields, interpolating inside the value's bucket.
+
+Totals move between buckets in the same Lua script that changes the
+leaderboard score, so the histogram always matches the sorted set. The
+leaderboard module owns the keys and calls the helpers here; rebuilding a
+board rebuilds its histograms.
+"""
+import math
+from collections import Counter
+
+BUCKETS_PER_DOUBLING = 8
+# (top percent, band) from the narrowest band up
+BANDS = ((1, 'top 1%'), (5, 'top 5%'), (10, 'top 10%'), (25, 'top 25%'), (50, 'top 50%'))
+LOWER_BAND = 'bottom 50%'
+
+# KEYS: board, histogram. ARGV: member, delta, buckets per doubling, ttl (0 for none).
+# Adds delta to the member's score, moves them between histogram buckets and
+# drops them from the board once their score reaches 0. Returns the new score.
+_ADJUST_SCRIPT = """
+local function bucket(value)
+  if value < 1 then return nil end
+  return 1 + math.floor(tonumber(ARGV[3]) * math.log(value) / math.log(2))
+end
+local delta = tonumber(ARGV[2])
+local new = tonumber(redis.call('ZINCRBY', KEYS[1], delta, ARGV[1]))
+local old, to = bucket(new - delta), bucket(new)
+if new <= 0 then redis.call('ZREM', KEYS[1], ARGV[1]) end
+if old ~= to then
+  if old and redis.call('HINCRBY', KEYS[2], old, -1) <= 0 then redis.call('HDEL', KEYS[2], old) end
+  if to then redis.call('HINCRBY', KEYS[2], to, 1) end
+end
+if tonumber(ARGV[4]) > 0 then
+  redis.call('EXPIRE', KEYS[1], ARGV[4])
+  redis.call('EXPIRE', KEYS[2], ARGV[4])
+end
+return tostring(new)
+"""
+
+# KEYS: board, histogram. ARGV: member, buckets per doubling.
+# Removes the member from the board and their total from the histogram.
+_REMOVE_SCRIPT = """
+local score = tonumber(redis.call('ZSCORE', KEYS[1], ARGV[1]))
+if not score then return 0 end
+redis.call('ZREM', KEYS[1], ARGV[1])
+if score >= 1 then
+  local old = 1 + math.floor(tonumber(ARGV[2]) * math.log(score) / math.log(2))
+  if redis.call('HINCRBY', KEYS[2], old, -1) <= 0 then redis.call('HDEL', KEYS[2], old) end
+end
+return 1
+"""
+
+# KEYS: histogram. ARGV: ttl (0 for none), then bucket, delta pairs.
+# Adds each delta to its bucket and drops buckets that reach 0, as the
+# scripts above do, so removals never leave empty or negative fields.
+_INCREMENT_SCRIPT = """
+for i = 2, #ARGV, 2 do
+  if redis.call('HINCRBY', KEYS[1], ARGV[i], ARGV[i + 1]) <= 0 then redis.call('HDEL', KEYS[1], ARGV[i]) end
+end
+if tonumber(ARGV[1]) > 0 then redis.call('EXPIRE', KEYS[1], ARGV[1]) end
+return 1
+"""
+
+
+def bucket(value):
+    """Histogram bucket of a positive value; must match the Lua scripts exactly"""
+    if value < 1:
+        return None
+    return 1 + math.floor(BUCKETS_PER_DOUBLING * math.log(value) / math.log(2))
+
+
+def bucket_bounds(index):
+    """(low, high) of a bucket's values"""
+    return 2 ** ((index - 1) / BUCKETS_PER_DOUBLING), 2 ** (index / BUCKETS_PER_DOUBLING)
+
+
+def adjust(pipe, board, histogram, member, delta, ttl=0):
+    """Queue a score change that keeps the histogram of board totals in step"""
+    pipe.eval(_ADJUST_SCRIPT, 2, board, histogram, member, delta, BUCKETS_PER_DOUBLING, ttl or 0)
+
+
+def remove(pipe, board, histogram, member):
+    """Queue removing a member from a board and its histogram"""
+    pipe.eval(_REMOVE_SCRIPT, 2, board, histogram, member, BUCKETS_PER_DOUBLING)
+
+
+def count(pipe, histogram, values, sign=1, ttl=0):
+    """Queue adding (or, with sign=-1, removing) values to a histogram"""
+    _increment(pipe, histogram, Counter(bucket(value) for value in values if value >= 1), sign, ttl)
+
+
+def count_grouped(pipe, histogram_key, counts, sign=1, ttl=0):
+    """count() for (value, times) pairs, as read with GROUP BY"""
+    _increment(pipe, histogram_key, histogram(counts), sign, ttl)
+
+
+def _increment(pipe, histogram_key, buckets, sign, ttl):
+    if not buckets:
+        return
+    changes = [arg for index, number in buckets.items() for arg in (index, sign * number)]
+    pipe.eval(_INCREMENT_SCRIPT, 1, histogram_key, ttl or 0, *changes)
+
+
+def histogram(counts):
+    """{bucket: count} from (value, count) pairs, for rebuilding a histogram"""
+    buckets = Counter()
+    for value, number in counts:
+        if value and value >= 1 and number:
+            buckets[bucket(value)] += number
+    return {index: number for index, number in buckets.items() if number > 0}
+
+
+def rank(counts, value, counted=False):
+    """Where `value` falls among the counted values
+
+    `counts` is a histogram hash as read from Redis. Returns a dict with the
+    number of values counted, the percentile (the estimated share below
+    `value`, as a percentage), top_percent and a coarse band. All but the
+    count are None when `value` is below 1 or nothing has been counted.
+
+    With counted=True, `value` is itself one of the counts (a user's own
+    total) and is ranked against the others only, so it can't sit partly
+    below itself; a value counted alone is at the 100th percentile.
+    """
+    buckets = {int(index): int(number) for index, number in counts.items() if int(number) > 0}
+    total = sum(buckets.values())
+    if not total or value is None or value < 1:
+        return {'count': total, 'percentile': None, 'top_percent': None, 'band': None}
+    own = bucket(value)
+    if counted and buckets.get(own):
+        buckets[own] -= 1
+    others = sum(buckets.values())
+    if others:
+        below = sum(number for index, number in buckets.items() if index < own)
+        low, high = bucket_bounds(own)
+        # Spread a bucket's values evenly over its (log-scaled) range
+        fraction = min(max(math.log(value / low) / math.log(high / low), 0.0), 1.0)
+        below += fraction * buckets.get(own, 0)
+        percentile = min(100.0 * below / others, 100.0)
+    else:
+        percentile = 100.0
+    top_percent = max(math.ceil(100.0 - percentile), 1)
+    band = next((name for limit, name in BANDS if top_percent <= limit), LOWER_BAND)
+    return {'count': total, 'percentile': round(percentile, 1), 'top_percent': top_percent, 'band': band}
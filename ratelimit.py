@@ -0,0 +1,165 @@
+"""Token-bucket rate limits for the expensive routes, kept atomically in Redis.
+
+Config.RATELIMIT_POLICIES names each policy with a rate of "<burst>/<seconds>"
+and a scope. A client may make `burst` calls at once and earns them back
+evenly over `seconds`. Scope 'user' keys buckets on the JWT identity, or on the
+client IP for anonymous calls; 'ip' always keys on the client IP. A request
+without a token left gets 429 with Retry-After.
+
+A Lua script refills and takes from the bucket in one round trip, so
+concurrent requests across workers can't overspend it. While Redis is
+unreachable each worker enforces the same policies with in-memory buckets,
+trying Redis again after REDIS_RETRY_SECONDS, so a Redis outage neither
+blocks every request nor lifts the limits.
+"""
+import functools
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict, namedtuple
+import redis
+from flask import current_app, jsonify, request
+from flask_jwt_extended import get_jwt_identity
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Per-worker buckets kept for the local fallback; least recently used are dropped
+LOCAL_MAX_BUCKETS = 10000
+REDIS_RETRY_SECONDS = 5
+
+# KEYS: bucket. ARGV: burst, tokens per second, now (seconds).
+# Returns {allowed, seconds until a token is available} as strings.
+_TAKE_SCRIPT = """
+local burst = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed, wait = 0, (1 - tokens) / rate
+if tokens >= 1 then
+  tokens = tokens - 1
+  allowed, wait = 1, 0
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return {tostring(allowed), tostring(wait)}
+"""
+
+
+class Policy(namedtuple('Policy', ['name', 'burst', 'seconds', 'scope'])):
+    """One rate limit; `rate` is tokens earned back per second"""
+
+    @property
+    def rate(self):
+        return self.burst / self.seconds
+
+
+def parse_policy(name, settings):
+    """Policy from a RATELIMIT_POLICIES entry like {'rate': '10/60', 'scope': 'ip'}"""
+    try:
+        burst, seconds = settings['rate'].split('/')
+        policy = Policy(name, int(burst), float(seconds), settings.get('scope', 'user'))
+    except (KeyError, ValueError) as e:
+        raise ValueError(f"Rate limit {name!r} must look like {{'rate': '<burst>/<seconds>'}}") from e
+    if policy.burst < 1 or policy.seconds <= 0 or policy.scope not in ('user', 'ip'):
+        raise ValueError(f"Rate limit {name!r} needs burst >= 1, seconds > 0 and scope 'user' or 'ip'")
+    return policy
+
+
+class LocalBuckets:
+    """The same token buckets in this process's memory, for when Redis is down"""
+
+    def __init__(self, max_buckets=LOCAL_MAX_BUCKETS):
+        self.max_buckets = max_buckets
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, policy, now):
+        with self._lock:
+            tokens, last = self._buckets.pop(key, (policy.burst, now))
+            tokens = min(policy.burst, tokens + max(0.0, now - last) * policy.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        return allowed, 0.0 if allowed else (1 - tokens) / policy.rate
+
+
+class RateLimiter:
+    """Checks requests against the configured policies"""
+
+    def __init__(self, redis_client, policies, enabled=True):
+        self.redis_client = redis_client
+        self.policies = {name: parse_policy(name, settings) for name, settings in policies.items()}
+        self.enabled = enabled
+        self.local = LocalBuckets()
+        self._script = redis_client.register_script(_TAKE_SCRIPT)
+        self._redis_down_until = 0.0
+
+    def take(self, policy, client):
+        """(allowed, seconds to wait) for one request by `client` under `policy`"""
+        key = f"ratelimit:{policy.name}:{client}"
+        now = time.time()
+        if time.monotonic() >= self._redis_down_until:
+            try:
+                allowed, wait = self._script(keys=[key], args=[policy.burst, policy.rate, now])
+                return self._count(policy, allowed == '1', 'redis'), float(wait)
+            except redis.RedisError as e:
+                self._redis_down_until = time.monotonic() + REDIS_RETRY_SECONDS
+                logger.warning("Rate limiting falling back to local buckets", extra={'error': str(e)})
+        allowed, wait = self.local.take(key, policy, now)
+        return self._count(policy, allowed, 'local'), wait
+
+    @staticmethod
+    def _count(policy, allowed, backend):
+        metrics.RATE_LIMIT_CHECKS.labels(policy.name, 'allowed' if allowed else 'limited', backend).inc()
+        return allowed
+
+
+def _client(policy):
+    if policy.scope == 'user':
+        user_id = get_jwt_identity()
+        if user_id is not None:
+            return f"user:{user_id}"
+    return f"ip:{request.remote_addr}"
+
+
+def _limited_response(wait):
+    retry_after = max(int(math.ceil(wait)), 1)
+    response = jsonify({"error": "Too many requests, slow down", "retry_after": retry_after})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+
+def limit(name):
+    """Apply the named policy to a view
+
+    For 'user' policies, apply below jwt_required (optional or not) so the
+    caller is known.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            limiter = current_app.extensions['rate_limiter']
+            if not limiter.enabled:
+                return view(*args, **kwargs)
+            policy = limiter.policies[name]
+            allowed, wait = limiter.take(policy, _client(policy))
+            if not allowed:
+                return _limited_response(wait)
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def init_app(app):
+    app.extensions['rate_limiter'] = RateLimiter(
+        app.extensions['redis'], app.config['RATELIMIT_POLICIES'], enabled=app.config['RATELIMIT_ENABLED']
+    )
@@ -0,0 +1,181 @@
+"""Server-side rep counting over batches of pose keypoint frames.
+
+Mirrors the browser counters in frontend/src/components/squat.js and
+pushup.js: the joint angle is averaged over the left and right side, frames
+with low-confidence keypoints or implausible angles are skipped, and a rep is
+counted when the angle goes below the "down" threshold and then back above
+the "up" threshold, at least min_gap_ms after the previous counted rep.
+
+Angles for every frame are computed at once with NumPy. The hysteresis state
+machine only has to walk the frames where the down/up state changes, which is
+a handful per rep rather than one step per frame.
+"""
+import math
+import numpy as np
+
+# Keypoint indices per pose model layout
+LAYOUTS = {
+    # MoveNet and PoseNet both use the 17-point COCO ordering
+    'movenet': {
+        'left_shoulder': 5, 'right_shoulder': 6,
+        'left_elbow': 7, 'right_elbow': 8,
+        'left_wrist': 9, 'right_wrist': 10,
+        'left_hip': 11, 'right_hip': 12,
+        'left_knee': 13, 'right_knee': 14,
+        'left_ankle': 15, 'right_ankle': 16,
+    },
+    'blazepose': {
+        'left_shoulder': 11, 'right_shoulder': 12,
+        'left_elbow': 13, 'right_elbow': 14,
+        'left_wrist': 15, 'right_wrist': 16,
+        'left_hip': 23, 'right_hip': 24,
+        'left_knee': 25, 'right_knee': 26,
+        'left_ankle': 27, 'right_ankle': 28,
+    },
+}
+LAYOUTS['posenet'] = LAYOUTS['movenet']
+LAYOUT_SIZES = {'movenet': 17, 'posenet': 17, 'blazepose': 33}
+
+# Same thresholds as the frontend counters
+EXERCISES = {
+    'squat': {
+        'joints': (('left_hip', 'left_knee', 'left_ankle'), ('right_hip', 'right_knee', 'right_ankle')),
+        'down_below': 165.0,
+        'up_above': 175.0,
+        'valid_range': (50.0, 190.0),
+        'min_gap_ms': 800.0,
+    },
+    'pushup': {
+        'joints': (('left_shoulder', 'left_elbow', 'left_wrist'), ('right_shoulder', 'right_elbow', 'right_wrist')),
+        'down_below': 90.0,
+        'up_above': 160.0,
+        'valid_range': (40.0, 180.0),
+        'min_gap_ms': 700.0,
+    },
+}
+MIN_SCORE = 0.2
+DEFAULT_FPS = 30.0
+MAX_FRAMES = 50000
+
+
+class RepCountError(ValueError):
+    """Raised for malformed keypoint batches"""
+
+
+def joint_angles(frames, a, b, c):
+    """Angle at keypoint b (degrees, 0-180) for every frame, like calculateAngle"""
+    p1 = frames[:, a, :2]
+    p2 = frames[:, b, :2]
+    p3 = frames[:, c, :2]
+    radians = (np.arctan2(p3[:, 1] - p2[:, 1], p3[:, 0] - p2[:, 0]) -
+               np.arctan2(p1[:, 1] - p2[:, 1], p1[:, 0] - p2[:, 0]))
+    angles = np.abs(np.degrees(radians))
+    return np.where(angles > 180.0, 360.0 - angles, angles)
+
+
+def _as_frames(frames, layout):
+    if layout not in LAYOUTS:
+        raise RepCountError(f"layout must be one of: {', '.join(LAYOUTS)}")
+    try:
+        frames = np.asarray(frames, dtype=np.float64)
+    except (TypeError, ValueError) as e:
+        raise RepCountError("frames must be a list of [x, y, score] keypoint lists") from e
+    if frames.ndim != 3 or frames.shape[2] < 3 or frames.shape[1] < LAYOUT_SIZES[layout]:
+        raise RepCountError(
+            f"frames must have shape (n_frames, {LAYOUT_SIZES[layout]}, 3) for the {layout} layout"
+        )
+    if len(frames) > MAX_FRAMES:
+        raise RepCountError(f"At most {MAX_FRAMES} frames per request")
+    return frames
+
+
+def _as_fps(fps):
+    if fps is None:
+        return DEFAULT_FPS
+    if isinstance(fps, bool) or not isinstance(fps, (int, float)) or not math.isfinite(fps) or fps <= 0:
+        raise RepCountError("fps must be a positive number")
+    return fps
+
+
+def _as_timestamps(timestamps, n_frames, fps):
+    if timestamps is None:
+        return np.arange(n_frames, dtype=np.float64) * (1000.0 / fps)
+    try:
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+    except (TypeError, ValueError) as e:
+        raise RepCountError("timestamps must be numbers of milliseconds") from e
+    if timestamps.shape != (n_frames,):
+        raise RepCountError("timestamps must have one entry per frame")
+    return timestamps
+
+
+def count_reps(frames, exercise='squat', layout='movenet', timestamps=None, fps=DEFAULT_FPS):
+    """Count reps in a batch of keypoint frames
+
+    frames is (n_frames, n_keypoints, 3) of x, y, score; timestamps are in
+    milliseconds (derived from fps when omitted). Returns a dict with the
+    count, number of usable frames and per-rep timings.
+    """
+    if exercise not in EXERCISES:
+        raise RepCountError(f"exercise must be one of: {', '.join(EXERCISES)}")
+    spec = EXERCISES[exercise]
+    frames = _as_frames(frames, layout)
+    timestamps = _as_timestamps(timestamps, len(frames), _as_fps(fps))
+    index = LAYOUTS[layout]
+
+    sides = [tuple(index[name] for name in joint) for joint in spec['joints']]
+    required = [i for side in sides for i in side]
+    angle = sum(joint_angles(frames, *side) for side in sides) / len(sides)
+
+    low, high = spec['valid_range']
+    valid = (frames[:, required, 2] > MIN_SCORE).all(axis=1) & (angle >= low) & (angle <= high)
+
+    # -1 = down, +1 = up, 0 = in between (keeps the previous state)
+    state = np.zeros(len(frames), dtype=np.int8)
+    state[valid & (angle < spec['down_below'])] = -1
+    state[valid & (angle > spec['up_above'])] = 1
+
+    moving = np.flatnonzero(state)
+    if len(moving):
+        changes = moving[np.concatenate(([True], np.diff(state[moving]) != 0))]
+    else:
+        changes = moving
+
+    reps = []
+    last_counted = -np.inf
+    down_at = None
+    for frame in changes:
+        if state[frame] < 0:
+            down_at = frame
+        elif down_at is not None:
+            # The frontend drops a rep that comes too soon but still resets to "up"
+            if timestamps[frame] - last_counted > spec['min_gap_ms']:
+                reps.append((down_at, frame))
+                last_counted = timestamps[frame]
+            down_at = None
+
+    if reps:
+        starts = np.array([start for start, _ in reps])
+        ends = np.array([end for _, end in reps])
+        # Deepest valid angle between going down and coming back up
+        bounds = np.column_stack((starts, ends)).ravel()
+        bottoms = np.minimum.reduceat(np.where(valid, angle, np.inf), bounds)[::2]
+    else:
+        starts = ends = bottoms = np.array([])
+
+    return {
+        'exercise': exercise,
+        'layout': layout,
+        'frames': int(len(frames)),
+        'valid_frames': int(valid.sum()),
+        'count': len(reps),
+        'reps': [
+            {
+                'start_ms': float(timestamps[start]),
+                'end_ms': float(timestamps[end]),
+                'duration_ms': float(timestamps[end] - timestamps[start]),
+                'min_angle': round(float(bottom), 1),
+            }
+            for start, end, bottom in zip(starts, ends, bottoms)
+        ],
+    }
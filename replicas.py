@@ -0,0 +1,201 @@
+"""Optional read replicas for the read-only GET routes.
+
+Set DATABASE_REPLICA_URLS to one or more comma-separated database URLs. Views
+decorated with read_only then run their queries on a randomly chosen healthy
+replica, and everything else, including any flush or DML inside such a view,
+stays on the primary. RoutingSession is the Flask-SQLAlchemy session class
+that makes that choice per statement.
+
+If a replica errors during a request, it is marked down for
+REPLICA_RETRY_SECONDS, the transaction is rolled back and the view runs again
+on the primary. A user whose write was just committed is pinned to the
+primary for REPLICA_PIN_SECONDS (via a Redis key, so every worker sees it),
+so replication lag can't hide their own write.
+"""
+import contextlib
+import functools
+import logging
+import random
+import threading
+import time
+import redis
+import sqlalchemy as sa
+from flask import current_app, g, has_app_context, has_request_context
+from flask_jwt_extended import get_jwt_identity
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+import metrics
+
+logger = logging.getLogger(__name__)
+
+_listeners_installed = False
+
+
+def _pin_key(user_id):
+    return f"db:pin:{int(user_id)}"
+
+
+class RoutingSession(Session):
+    """Sends reads to the request's replica, if one was chosen, and writes to the primary"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and not getattr(clause, 'is_dml', False) and has_app_context():
+            engine = g.get('replica_engine')
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper, clause=clause, bind=bind, **kwargs)
+
+
+class ReplicaSet:
+    """One engine per replica URL, with per-process health tracking"""
+
+    def __init__(self, urls, engine_options, retry_seconds=30):
+        self.engines = [sa.create_engine(url, **engine_options) for url in urls]
+        self.retry_seconds = retry_seconds
+        self._down_until = {}
+        self._lock = threading.Lock()
+        for engine in self.engines:
+            event.listen(engine, 'handle_error', functools.partial(self._failed, engine))
+
+    def choose(self):
+        """A random replica not marked down, or None"""
+        now = time.monotonic()
+        with self._lock:
+            healthy = [engine for engine in self.engines if self._down_until.get(engine, 0) <= now]
+        return random.choice(healthy) if healthy else None
+
+    def _failed(self, engine, context):
+        with self._lock:
+            self._down_until[engine] = time.monotonic() + self.retry_seconds
+        if has_app_context() and g.get('replica_engine') is engine:
+            g.replica_failed = True
+        logger.warning("Read replica error", extra={
+            'replica': engine.url.render_as_string(hide_password=True),
+            'error': str(context.original_exception)[:500],
+        })
+
+    def dispose(self):
+        for engine in self.engines:
+            engine.dispose(close=False)
+
+
+def init_app(app):
+    """Create the replica engines, if any are configured"""
+    urls = [url.strip() for url in app.config['DATABASE_REPLICA_URLS'].split(',') if url.strip()]
+    if urls:
+        app.extensions['db_replicas'] = ReplicaSet(
+            urls, app.config['SQLALCHEMY_ENGINE_OPTIONS'], retry_seconds=app.config['REPLICA_RETRY_SECONDS']
+        )
+    return app.extensions.get('db_replicas')
+
+
+def pin_users(user_ids):
+    """Route the users' reads to the primary for a while after they wrote"""
+    if 'db_replicas' not in current_app.extensions or not user_ids:
+        return
+    seconds = current_app.config['REPLICA_PIN_SECONDS']
+    try:
+        pipe = current_app.extensions['redis'].pipeline(transaction=False)
+        for user_id in user_ids:
+            pipe.set(_pin_key(user_id), 1, ex=seconds)
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.warning("Replica pin failed", extra={'error': str(e)})
+
+
+def _pinned(user_id):
+    if user_id is None:
+        return False
+    try:
+        return bool(current_app.extensions['redis'].exists(_pin_key(user_id)))
+    except redis.RedisError:
+        # Without the pin we can't rule out lag; read from the primary
+        return True
+
+
+def read_only(view):
+    """Run a GET view against a replica, falling back to the primary on replica errors
+
+    Apply below jwt_required so the caller's pin can be checked.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        replicas = current_app.extensions.get('db_replicas')
+        if replicas is None:
+            return view(*args, **kwargs)
+        if _pinned(get_jwt_identity()):
+            metrics.DB_READS.labels('pinned').inc()
+            return view(*args, **kwargs)
+        engine = replicas.choose()
+        if engine is None:
+            metrics.DB_READS.labels('primary').inc()
+            return view(*args, **kwargs)
+
+        g.replica_engine = engine
+        try:
+            response = view(*args, **kwargs)
+        except Exception:
+            if not g.get('replica_failed'):
+                raise
+            response = None
+        if not g.pop('replica_failed', False):
+            metrics.DB_READS.labels('replica').inc()
+            return response
+
+        # Views turn exceptions into 500s themselves, so replica failures are flagged
+        # by the engine's error hook and the whole view is retried on the primary
+        g.pop('replica_engine', None)
+        current_app.extensions['sqlalchemy'].session.rollback()
+        metrics.DB_READS.labels('fallback').inc()
+        return view(*args, **kwargs)
+    return wrapper
+
+
+@contextlib.contextmanager
+def primary():
+    """Run a block of a read_only view on the primary, e.g. a rebuild whose
+    result is shared, so it must not come from a lagging replica"""
+    engine = g.pop('replica_engine', None) if has_app_context() else None
+    try:
+        yield
+    finally:
+        if engine is not None:
+            g.replica_engine = engine
+
+
+def _note_flush(session, flush_context):
+    session.info['wrote'] = True
+
+
+def _note_statement(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info['wrote'] = True
+
+
+def _pin_after_commit(session):
+    if not session.info.pop('wrote', False) or not has_request_context():
+        return
+    try:
+        user_id = get_jwt_identity()
+    except RuntimeError:
+        # No token on this request (e.g. registration)
+        return
+    if user_id is not None:
+        pin_users([user_id])
+
+
+def _forget_after_rollback(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop('wrote', None)
+
+
+def install_listeners(db):
+    """Pin the requesting user to the primary whenever a request commits a write"""
+    global _listeners_installed
+    if _listeners_installed:
+        return
+    event.listen(db.session, 'after_flush', _note_flush)
+    event.listen(db.session, 'do_orm_execute', _note_statement)
+    event.listen(db.session, 'after_commit', _pin_after_commit)
+    event.listen(db.session, 'after_soft_rollback', _forget_after_rollback)
+    _listeners_installed = True
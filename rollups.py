@@ -0,0 +1,233 @@
+from collections import defaultdict
+from datetime import date, timedelta
+from sqlalchemy import func
+from models import db, ExerciseRollup, SESSION_MODELS
+
+GRANULARITIES = ('day', 'week', 'month')
+# Buckets returned when ?from= is omitted
+DEFAULT_SPAN = {'day': 30, 'week': 12, 'month': 12}
+MAX_BUCKETS = 366
+REBUILD_BATCH_SIZE = 5000
+_BUCKET_KEY = ['user_id', 'exercise', 'granularity', 'bucket_start']
+
+
+class InvalidRange(ValueError):
+    """Raised for a history request with a bad granularity or date range"""
+
+
+def bucket_start(day, granularity):
+    """First day of the bucket containing `day`"""
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket(start, granularity):
+    if granularity == 'week':
+        return start + timedelta(days=7)
+    if granularity == 'month':
+        return (start + timedelta(days=32)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def _previous_bucket(start, granularity):
+    if granularity == 'month':
+        return (start - timedelta(days=1)).replace(day=1)
+    return start - (timedelta(days=7) if granularity == 'week' else timedelta(days=1))
+
+
+def _bucket_count(first, last, granularity):
+    if granularity == 'month':
+        return (last.year - first.year) * 12 + last.month - first.month + 1
+    return (last - first).days // (7 if granularity == 'week' else 1) + 1
+
+
+def _bucket_rows(user_id, exercise, sessions):
+    """Collapse (date, reps, duration) triples into one row per bucket, in key order"""
+    buckets = {}
+    for day, reps, duration in sessions:
+        for granularity in GRANULARITIES:
+            key = (granularity, bucket_start(day, granularity))
+            row = buckets.setdefault(key, {'reps': 0, 'sessions': 0, 'duration': 0, 'best': 0})
+            row['reps'] += reps
+            row['sessions'] += 1
+            row['duration'] += duration or 0
+            row['best'] = max(row['best'], reps)
+    return [
+        dict(row, user_id=user_id, exercise=exercise, granularity=granularity, bucket_start=start)
+        for (granularity, start), row in sorted(buckets.items())
+    ]
+
+
+def _upsert(rows):
+    """Add rows onto existing buckets with one INSERT .. ON CONFLICT DO UPDATE"""
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+        greatest = func.greatest
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+        greatest = func.max
+    else:
+        return _merge(rows)
+
+    table = ExerciseRollup.__table__
+    statement = insert(table).values(rows)
+    excluded = statement.excluded
+    db.session.execute(statement.on_conflict_do_update(
+        index_elements=_BUCKET_KEY,
+        set_={
+            'reps': table.c.reps + excluded.reps,
+            'sessions': table.c.sessions + excluded.sessions,
+            'duration': table.c.duration + excluded.duration,
+            'best': greatest(table.c.best, excluded.best),
+        }
+    ))
+
+
+def _merge(rows):
+    """Row-at-a-time upsert for databases without ON CONFLICT"""
+    for row in rows:
+        bucket = (
+            ExerciseRollup.query
+            .filter_by(**{key: row[key] for key in _BUCKET_KEY})
+            .with_for_update()
+            .first()
+        )
+        if bucket is None:
+            db.session.add(ExerciseRollup(**row))
+            continue
+        bucket.reps += row['reps']
+        bucket.sessions += row['sessions']
+        bucket.duration += row['duration']
+        bucket.best = max(bucket.best, row['best'])
+
+
+def record_sessions(user_id, exercise, sessions):
+    """Add sessions, given as (date, reps, duration), to the user's buckets; call before committing"""
+    if sessions:
+        _upsert(_bucket_rows(int(user_id), exercise, sessions))
+
+
+def record_session(session, exercise):
+    """Add a flushed session to its day, week and month buckets"""
+    record_sessions(session.user_id, exercise, [(session.date, session.reps, session.duration)])
+
+
+def discard_session(session, exercise):
+    """Remove a session from its buckets; call before deleting the session"""
+    model = SESSION_MODELS[exercise]
+    user_id = int(session.user_id)
+    for granularity in GRANULARITIES:
+        start = bucket_start(session.date, granularity)
+        bucket = (
+            ExerciseRollup.query
+            .filter_by(user_id=user_id, exercise=exercise, granularity=granularity, bucket_start=start)
+            .with_for_update()
+            .first()
+        )
+        if bucket is None:
+            continue
+        if bucket.sessions <= 1:
+            db.session.delete(bucket)
+            continue
+        bucket.reps = max(bucket.reps - session.reps, 0)
+        bucket.sessions -= 1
+        bucket.duration = max(bucket.duration - (session.duration or 0), 0)
+        if session.reps >= bucket.best:
+            bucket.best = (
+                db.session.query(func.max(model.reps))
+                .filter(
+                    model.user_id == user_id,
+                    model.id != session.id,
+                    model.date >= start,
+                    model.date < next_bucket(start, granularity)
+                )
+                .scalar()
+            ) or 0
+
+
+def clear(user_id, exercise):
+    """Drop every bucket after all of a user's sessions for an exercise were deleted"""
+    ExerciseRollup.query.filter_by(user_id=int(user_id), exercise=exercise).delete()
+
+
+def history(user_id, exercise, granularity='day', start=None, end=None):
+    """Buckets from `start` to `end` (dates, inclusive), one entry per bucket with
+    empty ones filled in; reads only the stored buckets in range"""
+    if granularity not in GRANULARITIES:
+        raise InvalidRange(f"granularity must be one of: {', '.join(GRANULARITIES)}")
+    last = bucket_start(end or date.today(), granularity)
+    if start is None:
+        first = last
+        for _ in range(DEFAULT_SPAN[granularity] - 1):
+            first = _previous_bucket(first, granularity)
+    else:
+        first = bucket_start(start, granularity)
+    if first > last:
+        raise InvalidRange("from must not be after to")
+    if _bucket_count(first, last, granularity) > MAX_BUCKETS:
+        raise InvalidRange(f"At most {MAX_BUCKETS} buckets per request; use a coarser granularity")
+
+    stored = {
+        bucket.bucket_start: bucket
+        for bucket in ExerciseRollup.query.filter(
+            ExerciseRollup.user_id == int(user_id),
+            ExerciseRollup.exercise == exercise,
+            ExerciseRollup.granularity == granularity,
+            ExerciseRollup.bucket_start >= first,
+            ExerciseRollup.bucket_start <= last
+        )
+    }
+    buckets = []
+    current = first
+    while current <= last:
+        bucket = stored.get(current)
+        buckets.append(bucket.to_dict() if bucket else
+                       {'start': current.isoformat(), 'reps': 0, 'sessions': 0, 'duration': 0, 'best': 0})
+        current = next_bucket(current, granularity)
+    return first, last, buckets
+
+
+def rebuild(exercises=None):
+    """Recompute every bucket from raw sessions; returns rows written"""
+    written = 0
+    for exercise in exercises or SESSION_MODELS:
+        model = SESSION_MODELS[exercise]
+        ExerciseRollup.query.filter_by(exercise=exercise).delete()
+
+        days = (
+            db.session.query(
+                model.user_id,
+                model.date,
+                func.sum(model.reps),
+                func.count(model.id),
+                func.coalesce(func.sum(model.duration), 0),
+                func.max(model.reps)
+            )
+            .group_by(model.user_id, model.date)
+            .yield_per(REBUILD_BATCH_SIZE)
+        )
+        buckets = defaultdict(lambda: [0, 0, 0, 0])
+        for user_id, day, reps, count, duration, best in days:
+            for granularity in GRANULARITIES:
+                totals = buckets[(user_id, granularity, bucket_start(day, granularity))]
+                totals[0] += int(reps or 0)
+                totals[1] += int(count)
+                totals[2] += int(duration)
+                totals[3] = max(totals[3], int(best or 0))
+
+        rows = [
+            {
+                'user_id': user_id, 'exercise': exercise, 'granularity': granularity, 'bucket_start': start,
+                'reps': reps, 'sessions': count, 'duration': duration, 'best': best,
+            }
+            for (user_id, granularity, start), (reps, count, duration, best) in buckets.items()
+        ]
+        for offset in range(0, len(rows), REBUILD_BATCH_SIZE):
+            db.session.execute(ExerciseRollup.__table__.insert(), rows[offset:offset + REBUILD_BATCH_SIZE])
+        written += len(rows)
+        db.session.commit()
+    return written
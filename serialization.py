@@ -0,0 +1,74 @@
+"""Fast JSON responses and column-projected session rows for the list endpoints.
+
+Hydrating ORM objects and calling to_dict() dominates the cost of large
+session pages, so the list routes select only the columns they return and
+build the response dicts straight from the row tuples. OrjsonProvider then
+encodes them, including datetime/date/time values, in native code.
+"""
+import orjson
+from flask.json.provider import DefaultJSONProvider
+from models import COUNT_FIELDS
+
+_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def session_columns(model):
+    """Columns read for each session, in the order session_row() unpacks them
+
+    Built from `model` so exercise subclasses keep their exercise_type filter.
+    """
+    return (
+        model.id, model.user_id, model.exercise_type, model.reps,
+        model.duration, model.timestamp, model.date, model.time
+    )
+
+
+def session_row(row):
+    """Dict for a session_columns() row with the same keys as the model's to_dict()
+
+    Dates and times are left as objects; the JSON provider writes them in ISO 8601
+    exactly as isoformat() would.
+    """
+    session_id, user_id, exercise_type, reps, duration, timestamp, day, time_of_day = row
+    data = {
+        'id': session_id,
+        'user_id': user_id,
+        'exercise_type': exercise_type,
+        'reps': reps,
+        'duration': duration,
+        'timestamp': timestamp,
+        'date': day,
+        'time': time_of_day,
+    }
+    count_field = COUNT_FIELDS.get(exercise_type)
+    if count_field:
+        data[count_field] = reps
+    return data
+
+
+def dumps(obj):
+    """Compact JSON bytes, for streaming responses that bypass jsonify()"""
+    return orjson.dumps(obj, default=DefaultJSONProvider.default, option=_OPTIONS)
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson; jsonify() and request.get_json() use it"""
+
+    def _options(self):
+        options = _OPTIONS
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        if self.compact is False or (self.compact is None and self._app.debug):
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=self._options()).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=self.default, option=self._options()) + b"\n"
+        return self._app.response_class(body, mimetype=self.mimetype)
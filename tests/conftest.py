@@ -0,0 +1,70 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# app.py builds a default app at import; keep it off Postgres
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'import.db'))
+
+fakeredis = pytest.importorskip('fakeredis')
+
+import redis  # noqa: E402
+from flask_jwt_extended import create_access_token  # noqa: E402
+from config import Config  # noqa: E402
+import app as fitv  # noqa: E402
+import partitions  # noqa: E402
+from models import db, User  # noqa: E402
+
+
+class TestConfig(Config):
+    TESTING = True
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+    DATABASE_REPLICA_URLS = ''
+    EXERCISE_AI_CLIENT = 'fake'
+    EXERCISE_AI_FAKE_DELAY = 0
+    RATELIMIT_ENABLED = False
+    WRITE_BEHIND = False
+
+
+@pytest.fixture
+def redis_server():
+    return fakeredis.FakeServer()
+
+
+@pytest.fixture
+def make_app(tmp_path, monkeypatch, redis_server):
+    """Builds apps on a SQLite file under tmp_path and an in-memory Redis"""
+    def fake_pool(url, **kwargs):
+        return redis.ConnectionPool(connection_class=fakeredis.FakeRedisConnection, server=redis_server,
+                                    decode_responses=kwargs.get('decode_responses', False))
+    monkeypatch.setattr(redis.ConnectionPool, 'from_url', staticmethod(fake_pool))
+
+    def build(**settings):
+        settings.setdefault('SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'primary.db'}")
+        application = fitv.create_app(type('TestConfig', (TestConfig,), settings))
+        with application.app_context():
+            partitions.create_tables(0)
+        return application
+    return build
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def user(app):
+    """(user id, Authorization headers) for a fresh user"""
+    with app.app_context():
+        account = User(username='tester', email='tester@example.com', password_hash='x')
+        db.session.add(account)
+        db.session.commit()
+        return account.id, {'Authorization': f'Bearer {create_access_token(identity=str(account.id))}'}
@@ -0,0 +1,93 @@
+import threading
+import time
+
+import fakeredis
+
+import exercise_ai
+
+
+class FlakyClient(exercise_ai.FakeModelClient):
+    """Fails its first `failures` calls"""
+
+    def __init__(self, failures, delay=0.0):
+        super().__init__(delay=delay)
+        self.failures = failures
+
+    def generate(self, prompt):
+        summary = super().generate(prompt)
+        if self.calls <= self.failures:
+            raise RuntimeError("upstream unavailable")
+        return summary
+
+
+def _service(redis_server, model_client, **kwargs):
+    """One worker's ExerciseAI; each has its own local cache, all share the Redis server"""
+    return exercise_ai.ExerciseAI(fakeredis.FakeRedis(server=redis_server, decode_responses=True), model_client,
+                                  **kwargs)
+
+
+def _in_threads(target, args):
+    results = [None] * len(args)
+
+    def run(index):
+        try:
+            results[index] = target(index, args[index])
+        except Exception as e:
+            results[index] = e
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(len(args))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_identical_queries_make_one_upstream_call(redis_server):
+    model_client = exercise_ai.FakeModelClient(delay=0.3)
+    services = [_service(redis_server, model_client) for _ in range(4)]
+    queries = ['squat', 'Squats', 'back squat', ' squat exercise '] * 2
+
+    results = _in_threads(lambda index, query: services[index % 4].get_summary(query), queries)
+
+    assert model_client.calls == 1
+    assert [result['name'] for result in results] == queries
+    assert len({result['summary'] for result in results}) == 1
+
+
+def test_job_moves_from_pending_to_done(redis_server):
+    service = _service(redis_server, exercise_ai.FakeModelClient(delay=0.2))
+
+    job = service.submit('lunges')
+    assert job['status'] == 'pending'
+    assert service.job(job['id'])['status'] == 'pending'
+
+    finished = service.job(job['id'], wait=5)
+    assert finished['status'] == 'done'
+    assert finished['result']['name'] == 'lunges'
+
+    cached = service.submit('lunge')
+    assert cached['status'] == 'done'
+
+
+def test_job_records_an_upstream_failure(redis_server):
+    service = _service(redis_server, FlakyClient(failures=1))
+
+    job = service.job(service.submit('plank')['id'], wait=5)
+    assert job['status'] == 'error'
+    assert 'upstream unavailable' in job['error']
+
+
+def test_failed_generation_does_not_wedge_the_key(redis_server):
+    model_client = FlakyClient(failures=1, delay=0.3)
+    services = [_service(redis_server, model_client, wait_timeout=10) for _ in range(3)]
+
+    started = time.monotonic()
+    results = _in_threads(lambda index, query: services[index].get_summary(query), ['burpee'] * 3)
+    # The generating request and every waiter see the failure rather than waiting out wait_timeout
+    assert all(isinstance(result, exercise_ai.ExerciseAIError) for result in results)
+    assert time.monotonic() - started < 5
+    assert model_client.calls == 1
+
+    # The lock was released, so the next request generates again straight away
+    assert services[0].get_summary('burpees')['summary']
+    assert model_client.calls == 2
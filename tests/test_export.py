@@ -0,0 +1,57 @@
+import json
+from datetime import datetime, timedelta
+
+from models import db, SquatSession
+
+
+def _add(app, user_id, session_id, recorded_at, timestamp=None):
+    timestamp = timestamp or datetime.utcnow()
+    with app.app_context():
+        db.session.add(SquatSession(id=session_id, user_id=user_id, reps=10, duration=30,
+                                    timestamp=timestamp, recorded_at=recorded_at))
+        db.session.commit()
+
+
+def _export(client, headers, since=None):
+    query = {'format': 'ndjson'}
+    if since:
+        query['since'] = since
+    response = client.get('/api/export', query_string=query, headers=headers)
+    assert response.status_code == 200, response.data
+    ids = [json.loads(line)['id'] for line in response.data.splitlines()]
+    return ids, response.headers['X-Export-Watermark']
+
+
+def test_incremental_export_picks_up_out_of_order_commits(app, client, user):
+    user_id, headers = user
+    now = datetime.utcnow()
+    # Session 2 commits first; session 1 got its id and recorded_at earlier but
+    # commits only after the first export has read the table.
+    _add(app, user_id, 2, recorded_at=now - timedelta(seconds=1))
+    first, watermark = _export(client, headers)
+    assert first == [2]
+
+    _add(app, user_id, 1, recorded_at=now - timedelta(seconds=2))
+    # Uploaded from an offline device: an old timestamp, recorded now
+    _add(app, user_id, 3, recorded_at=datetime.utcnow(), timestamp=datetime(2020, 1, 1))
+
+    second, next_watermark = _export(client, headers, since=watermark)
+    assert {1, 3} <= set(second)
+    assert set(first) | set(second) == {1, 2, 3}
+    assert next_watermark > watermark
+
+
+def test_incremental_export_skips_sessions_recorded_before_the_overlap(app, client, user):
+    user_id, headers = user
+    _add(app, user_id, 1, recorded_at=datetime.utcnow() - timedelta(hours=1))
+    _, watermark = _export(client, headers)
+    _add(app, user_id, 2, recorded_at=datetime.utcnow())
+
+    ids, _ = _export(client, headers, since=watermark)
+    assert ids == [2]
+
+
+def test_export_rejects_a_bad_since(client, user):
+    _, headers = user
+    response = client.get('/api/export', query_string={'since': 'yesterday'}, headers=headers)
+    assert response.status_code == 400
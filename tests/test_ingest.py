@@ -0,0 +1,37 @@
+import pytest
+
+
+def _batch(client, headers, *sessions):
+    response = client.post('/api/sessions/batch', json={'sessions': list(sessions)}, headers=headers)
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()['results']
+
+
+@pytest.mark.parametrize('fields, error', [
+    ({'count': 'x'}, "count must be a non-negative integer"),
+    ({'count': -1}, "count must be a non-negative integer"),
+    ({'count': 2.5}, "count must be a non-negative integer"),
+    ({'count': True}, "count must be a non-negative integer"),
+    ({'squat_count': [3]}, "squat_count must be a non-negative integer"),
+    ({'count': 5, 'duration': 'long'}, "duration must be a non-negative integer"),
+    ({'count': 5, 'timestamp': 'yesterday'}, "timestamp must be ISO 8601"),
+    ({'count': 5, 'timestamp': 1700000000}, "timestamp must be ISO 8601"),
+    ({'exercise': ['squat'], 'count': 5}, "exercise must be one of: squat, pushup"),
+    ({}, "Missing count (or squat_count)"),
+])
+def test_invalid_entries_get_stable_messages(client, user, fields, error):
+    _, headers = user
+    item = dict({'idempotency_key': 'k1', 'exercise': 'squat'}, **fields)
+    [result] = _batch(client, headers, item)
+    assert result == {'index': 0, 'status': 'error', 'error': error}
+
+
+def test_valid_entries_are_created_alongside_invalid_ones(client, user):
+    _, headers = user
+    results = _batch(
+        client, headers,
+        {'idempotency_key': 'a', 'exercise': 'squat', 'count': '12', 'duration': 30.0,
+         'timestamp': '2024-05-01T08:00:00Z'},
+        {'idempotency_key': 'b', 'exercise': 'pushup', 'pushup_count': 'x'},
+    )
+    assert [result['status'] for result in results] == ['created', 'error']
@@ -0,0 +1,30 @@
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+import leaderboard
+
+
+def test_deleting_a_session_from_an_expired_day_leaves_daily_keys_alone(app):
+    redis_client = app.extensions['redis']
+    old_day = date.today() - timedelta(days=30)
+    with app.app_context():
+        leaderboard.record_totals(redis_client, 'squat', 1, {date.today(): [50]})
+        leaderboard.discard_session(redis_client, 'squat', SimpleNamespace(user_id=1, reps=12, date=old_day))
+
+    assert not redis_client.exists(leaderboard.board_key('squat', old_day))
+    assert not redis_client.exists(leaderboard.histogram_key('squat', 'totals', old_day))
+    assert not redis_client.exists(leaderboard.histogram_key('squat', 'sessions', old_day))
+    assert redis_client.zscore(leaderboard.board_key('squat'), '1') == 38
+
+
+def test_deleting_a_session_from_today_keeps_the_daily_ttl(app):
+    redis_client = app.extensions['redis']
+    today = date.today()
+    with app.app_context():
+        leaderboard.record_totals(redis_client, 'squat', 1, {today: [10, 20]})
+        leaderboard.discard_session(redis_client, 'squat', SimpleNamespace(user_id=1, reps=10, date=today))
+
+    assert redis_client.zscore(leaderboard.board_key('squat', today), '1') == 20
+    for key in (leaderboard.board_key('squat', today), leaderboard.histogram_key('squat', 'totals', today),
+                leaderboard.histogram_key('squat', 'sessions', today)):
+        assert 0 < redis_client.ttl(key) <= leaderboard.DAILY_TTL
@@ -0,0 +1,78 @@
+from datetime import date
+
+import fakeredis
+
+import leaderboard
+import percentiles
+
+
+def _board(redis_client, totals):
+    pipe = redis_client.pipeline()
+    for user_id, total in totals.items():
+        percentiles.adjust(pipe, leaderboard.board_key('squat'), leaderboard.histogram_key('squat', 'totals'),
+                           str(user_id), total)
+    pipe.execute()
+
+
+def test_top_user_of_two_is_in_the_top_band():
+    redis_client = fakeredis.FakeRedis(decode_responses=True)
+    _board(redis_client, {1: 100, 2: 40})
+
+    rank = leaderboard.percentile(redis_client, 'squat', 1)['rank']
+    assert rank['count'] == 2
+    assert rank['percentile'] == 100.0
+    assert rank['top_percent'] == 1
+    assert rank['band'] == 'top 1%'
+
+    other = leaderboard.percentile(redis_client, 'squat', 2)['rank']
+    assert other['percentile'] == 0.0
+    assert other['band'] == 'bottom 50%'
+
+
+def test_only_user_on_a_board_is_at_the_top():
+    redis_client = fakeredis.FakeRedis(decode_responses=True)
+    _board(redis_client, {1: 25})
+
+    rank = leaderboard.percentile(redis_client, 'squat', 1)['rank']
+    assert rank == {'count': 1, 'percentile': 100.0, 'top_percent': 1, 'band': 'top 1%'}
+
+
+def test_leader_among_many_is_not_ranked_against_itself():
+    counts = percentiles.histogram([(value, 1) for value in range(1, 101)])
+    rank = percentiles.rank(counts, 100, counted=True)
+    assert rank['percentile'] >= 99.0
+    assert rank['band'] == 'top 1%'
+
+
+def test_uncounted_value_is_ranked_against_everything():
+    counts = percentiles.histogram([(10, 3), (1000, 1)])
+    assert percentiles.rank(counts, 1000)['percentile'] < 100.0
+    assert percentiles.rank(counts, 5000)['percentile'] == 100.0
+    assert percentiles.rank({}, 10)['percentile'] is None
+
+
+def test_removing_values_drops_buckets_that_reach_zero():
+    redis_client = fakeredis.FakeRedis(decode_responses=True)
+    pipe = redis_client.pipeline()
+    percentiles.count(pipe, 'hist', [10, 10, 1000], ttl=60)
+    percentiles.count(pipe, 'hist', [10, 10, 10], sign=-1)
+    pipe.execute()
+
+    # Removing more than was counted must not leave a zero or negative field
+    assert redis_client.hgetall('hist') == {str(percentiles.bucket(1000)): '1'}
+    assert 0 < redis_client.ttl('hist') <= 60
+
+
+def test_reset_takes_grouped_sessions_out_of_the_histograms(app, client, user):
+    _, headers = user
+    for reps in (10, 10, 10, 40):
+        assert client.post('/api/exercises/squat/sessions', json={'reps': reps, 'duration': 30},
+                           headers=headers).status_code == 201
+    redis_client = app.extensions['redis']
+    keys = [leaderboard.histogram_key('squat', 'sessions'),
+            leaderboard.histogram_key('squat', 'sessions', date.today())]
+    assert [sum(map(int, redis_client.hgetall(key).values())) for key in keys] == [4, 4]
+
+    assert client.post('/api/exercises/squat/reset', headers=headers).status_code == 200
+    for key in keys:
+        assert redis_client.hgetall(key) == {}
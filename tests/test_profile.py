@@ -0,0 +1,35 @@
+from models import db, User
+
+
+def test_profile_comes_from_the_token_user(client, user):
+    user_id, headers = user
+    response = client.get('/api/profile', headers=headers)
+    assert response.status_code == 200
+    assert response.get_json()['user']['id'] == user_id
+
+
+def test_token_of_a_deleted_user_is_rejected_with_401(app, client, user):
+    user_id, headers = user
+    with app.app_context():
+        db.session.delete(db.session.get(User, user_id))
+        db.session.commit()
+
+    for path in ('/api/profile', '/api/dashboard'):
+        response = client.get(path, headers=headers)
+        assert response.status_code == 401
+        assert response.get_json() == {"error": "User not found"}
+
+
+def test_profile_update_keeps_own_username_and_refreshes_the_cache(client, user):
+    _, headers = user
+    response = client.patch('/api/profile', json={'username': 'tester', 'email': 'New@Example.com'}, headers=headers)
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json()['user']['email'] == 'new@example.com'
+    assert client.get('/api/profile', headers=headers).get_json()['user']['email'] == 'new@example.com'
+
+
+def test_dashboard_includes_the_cached_profile(client, user):
+    user_id, headers = user
+    response = client.get('/api/dashboard', headers=headers)
+    assert response.status_code == 200
+    assert response.get_json()['user']['id'] == user_id
@@ -0,0 +1,33 @@
+import pytest
+
+repcount = pytest.importorskip('repcount')
+
+FRAMES = [[[0.5, 0.5, 0.9]] * 17] * 4
+
+
+@pytest.mark.parametrize('fps', ['abc', 0, -30, True, [30]])
+def test_rep_count_rejects_a_bad_fps(client, user, fps):
+    _, headers = user
+    response = client.post('/api/rep-count', json={'frames': FRAMES, 'fps': fps}, headers=headers)
+    assert response.status_code == 400
+    assert response.get_json()['error'] == "fps must be a positive number"
+
+
+def test_rep_count_rejects_infinite_fps():
+    with pytest.raises(repcount.RepCountError):
+        repcount.count_reps(FRAMES, fps=float('inf'))
+
+
+@pytest.mark.parametrize('fps', [15, 29.97, None])
+def test_rep_count_accepts_a_positive_fps(client, user, fps):
+    _, headers = user
+    response = client.post('/api/rep-count', json={'frames': FRAMES, 'fps': fps}, headers=headers)
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json()['count'] == 0
+
+
+def test_rep_count_rejects_non_numeric_timestamps(client, user):
+    _, headers = user
+    response = client.post('/api/rep-count', json={'frames': FRAMES, 'timestamps': ['a', 'b', 'c', 'd']},
+                           headers=headers)
+    assert response.status_code == 400
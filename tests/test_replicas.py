@@ -0,0 +1,81 @@
+import os
+
+import pytest
+from prometheus_client import REGISTRY
+
+from models import db, SquatSession
+
+
+@pytest.fixture
+def replica_url(tmp_path):
+    return f"sqlite:///{tmp_path / 'replica.db'}"
+
+
+@pytest.fixture
+def app(make_app, replica_url):
+    application = make_app(DATABASE_REPLICA_URLS=replica_url)
+    db.metadata.create_all(application.extensions['db_replicas'].engines[0])
+    return application
+
+
+def _seed(app, user_id):
+    """Different rows on each database, so responses show which one answered"""
+    with app.app_context():
+        db.session.add(SquatSession(user_id=user_id, reps=1, duration=10))
+        db.session.commit()
+        replica = app.extensions['db_replicas'].engines[0]
+        with replica.begin() as conn:
+            conn.execute(db.text("INSERT INTO users (id, username, email, password_hash) "
+                                 "VALUES (:id, 'r', 'r@x', 'x')"), {'id': user_id})
+            conn.execute(SquatSession.__table__.insert(), [{'user_id': user_id, 'exercise_type': 'squat', 'reps': 99,
+                                                            'duration': 10}])
+
+
+def _reads(target):
+    return REGISTRY.get_sample_value('db_read_routing_total', {'target': target}) or 0
+
+
+def _reps(client, headers):
+    response = client.get('/api/exercises/squat/sessions', headers=headers)
+    assert response.status_code == 200, response.get_json()
+    return sorted(session['reps'] for session in response.get_json()['sessions'])
+
+
+def test_read_only_get_is_served_by_the_replica(app, client, user):
+    user_id, headers = user
+    _seed(app, user_id)
+    assert _reps(client, headers) == [99]
+
+
+def test_writes_go_to_the_primary_and_pin_the_writer(app, client, user):
+    user_id, headers = user
+    _seed(app, user_id)
+
+    response = client.post('/api/exercises/squat/sessions', json={'reps': 7, 'duration': 20}, headers=headers)
+    assert response.status_code == 201
+    replica = app.extensions['db_replicas'].engines[0]
+    with replica.connect() as conn:
+        assert conn.execute(db.text("SELECT count(*) FROM exercise_sessions")).scalar() == 1
+
+    # Read-your-writes: pinned to the primary for REPLICA_PIN_SECONDS
+    assert _reps(client, headers) == [1, 7]
+    app.extensions['redis'].delete(f"db:pin:{user_id}")
+    assert _reps(client, headers) == [99]
+
+
+def test_falls_back_to_the_primary_when_the_replica_is_down(app, client, user, tmp_path):
+    user_id, headers = user
+    _seed(app, user_id)
+    replicas = app.extensions['db_replicas']
+    replicas.engines[0].dispose()
+    # Nothing can be opened at the replica's path any more
+    os.remove(tmp_path / 'replica.db')
+    os.mkdir(tmp_path / 'replica.db')
+    fallbacks, primary = _reads('fallback'), _reads('primary')
+
+    assert _reps(client, headers) == [1]
+    assert _reads('fallback') == fallbacks + 1
+    assert replicas.choose() is None
+    # Marked down, so the next read goes straight to the primary
+    assert _reps(client, headers) == [1]
+    assert _reads('primary') == primary + 1
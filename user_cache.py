@@ -0,0 +1,135 @@
+import json
+import logging
+import threading
+import redis
+from flask import current_app, has_app_context
+from sqlalchemy import event
+import cache
+from cache import LocalCache
+import metrics
+import versions
+from models import db, User
+
+logger = logging.getLogger(__name__)
+
+INVALIDATE_CHANNEL = "users:invalidate"
+_listeners_installed = False
+
+
+class UserCache:
+    """Serialized user profiles by id: in-process LRU, then Redis, then Postgres
+
+    Entries are dropped from every tier whenever a User row is updated or
+    deleted (see install_listeners). Other workers drop their local copy when
+    the invalidation arrives over Redis pub/sub; if Redis is unreachable, the
+    local TTL bounds how stale they can get.
+    """
+
+    def __init__(self, redis_client, local_cache_size=1024, local_cache_ttl=300, redis_ttl=3600):
+        self.redis_client = redis_client
+        self.redis_ttl = redis_ttl
+        self.local_cache = LocalCache(maxsize=local_cache_size, ttl=local_cache_ttl)
+        self._lock = threading.Lock()
+        self._started = False
+
+    @staticmethod
+    def _key(user_id):
+        return f"user:{user_id}:profile"
+
+    def get(self, user_id):
+        """user.to_dict() for a user id, or None if there is no such user"""
+        self._start()
+        user_id = int(user_id)
+        profile = self.local_cache.get(user_id)
+        if profile is not None:
+            metrics.USER_CACHE_LOOKUPS.labels('local_hit').inc()
+            return profile
+
+        try:
+            cached = self.redis_client.get(self._key(user_id))
+        except redis.RedisError as e:
+            logger.warning("User cache read failed", extra={'error': str(e)})
+            cached = None
+        if cached:
+            profile = json.loads(cached)
+            self.local_cache.set(user_id, profile)
+            metrics.USER_CACHE_LOOKUPS.labels('redis_hit').inc()
+            return profile
+
+        metrics.USER_CACHE_LOOKUPS.labels('miss').inc()
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        profile = user.to_dict()
+        self.local_cache.set(user_id, profile)
+        try:
+            self.redis_client.setex(self._key(user_id), self.redis_ttl, json.dumps(profile))
+        except redis.RedisError as e:
+            logger.warning("User cache write failed", extra={'error': str(e)})
+        return profile
+
+    def invalidate(self, user_ids):
+        """Drop users from this worker, Redis, and (via pub/sub) every other worker
+
+        Also bumps their data versions so conditional GETs stop answering 304.
+        """
+        user_ids = [int(user_id) for user_id in user_ids]
+        for user_id in user_ids:
+            self.local_cache.delete(user_id)
+        if not user_ids:
+            return
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.delete(*[self._key(user_id) for user_id in user_ids])
+            pipe.publish(INVALIDATE_CHANNEL, json.dumps(user_ids))
+            pipe.execute()
+            versions.bump_users(self.redis_client, user_ids)
+        except redis.RedisError as e:
+            logger.warning("User cache invalidation failed", extra={'error': str(e)})
+
+    def _start(self):
+        # Started on first use so the thread only exists in worker processes
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        threading.Thread(target=self._listen, name="user-cache-listen", daemon=True).start()
+
+    def _listen(self):
+        cache.subscribe(self.redis_client, INVALIDATE_CHANNEL, self._forget)
+
+    def _forget(self, data):
+        for user_id in json.loads(data):
+            self.local_cache.delete(int(user_id))
+
+
+def _collect_changed_users(session, flush_context, instances):
+    changed = session.info.setdefault('changed_user_ids', set())
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, User) and obj.id is not None:
+            changed.add(obj.id)
+
+
+def _invalidate_after_commit(session):
+    changed = session.info.pop('changed_user_ids', None)
+    if changed and has_app_context():
+        user_cache = current_app.extensions.get('user_cache')
+        if user_cache is not None:
+            user_cache.invalidate(changed)
+
+
+def _forget_after_rollback(session, previous_transaction):
+    # Savepoint rollbacks (begin_nested) leave the outer transaction's changes pending
+    if previous_transaction.parent is None:
+        session.info.pop('changed_user_ids', None)
+
+
+def install_listeners():
+    """Invalidate cached profiles whenever a User row is updated or deleted and committed"""
+    global _listeners_installed
+    if _listeners_installed:
+        return
+    event.listen(db.session, 'before_flush', _collect_changed_users)
+    event.listen(db.session, 'after_commit', _invalidate_after_commit)
+    event.listen(db.session, 'after_soft_rollback', _forget_after_rollback)
+    _listeners_installed = True
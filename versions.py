@@ -0,0 +1,119 @@
+"""Per-user and per-leaderboard data versions in Redis, used as ETags.
+
+Every session write, delete or reset bumps the user's counter and the
+exercise's leaderboard counter, and every committed User update bumps the
+user's counter and all leaderboard counters (usernames appear on the boards).
+A conditional GET reads the relevant counters with one MGET and answers a
+matching If-None-Match with 304 before the view runs any SQL.
+
+The counters are read before the view builds its body, so a write that races
+with a request can only make the ETag older than the body, never newer.
+Bumps happen after commit and are best-effort. ETAG_MAX_AGE bounds how long
+a bump lost to a Redis error can keep a stale 304 alive.
+"""
+import functools
+import hashlib
+import logging
+import secrets
+import time
+from datetime import date
+import redis
+from flask import current_app, make_response, request
+from flask_jwt_extended import get_jwt_identity
+from models import SESSION_MODELS
+
+logger = logging.getLogger(__name__)
+
+# Random per-dataset epoch; changes when Redis loses the counters or after a backfill
+EPOCH_KEY = "version:epoch"
+
+
+def user_key(user_id):
+    return f"version:user:{int(user_id)}"
+
+
+def leaderboard_key(exercise):
+    return f"version:leaderboard:{exercise}"
+
+
+def bump(redis_client, user_ids=(), exercises=()):
+    """Advance the versions of the given users and leaderboards in one round trip"""
+    pipe = redis_client.pipeline(transaction=False)
+    for user_id in user_ids:
+        pipe.incr(user_key(user_id))
+    for exercise in exercises:
+        pipe.incr(leaderboard_key(exercise))
+    pipe.execute()
+
+
+def bump_users(redis_client, user_ids):
+    """After profile changes: the users' own views and every board showing their names"""
+    if user_ids:
+        bump(redis_client, user_ids, SESSION_MODELS)
+
+
+def bump_all(redis_client):
+    """Invalidate every ETag, e.g. after a backfill rewrote derived data"""
+    redis_client.set(EPOCH_KEY, secrets.token_hex(4))
+
+
+def etag(redis_client, keys, variant, max_age=0):
+    """Opaque tag for the current versions of `keys` and a response variant"""
+    values = redis_client.mget([EPOCH_KEY, *keys])
+    epoch = values[0]
+    if epoch is None:
+        epoch = secrets.token_hex(4)
+        if not redis_client.set(EPOCH_KEY, epoch, nx=True):
+            epoch = redis_client.get(EPOCH_KEY)
+    window = int(time.time() // max_age) if max_age else 0
+    # Dated views (daily boards, history ending today) roll over at midnight
+    digest = hashlib.blake2b(f"{variant}|{date.today()}".encode('utf-8'), digest_size=8).hexdigest()
+    return f"{epoch}.{'.'.join(value or '0' for value in values[1:])}.{window}.{digest}"
+
+
+def conditional(keys_for):
+    """Serve 304 for an unchanged GET; keys_for(user_id, **view_args) names the versions
+
+    Apply below jwt_required (optional or not) so the caller is known. The
+    caller's id and the full path, including the query string, are part of the tag.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            user_id = get_jwt_identity()
+            try:
+                tag = etag(
+                    current_app.extensions['redis'],
+                    keys_for(user_id, **kwargs),
+                    f"{user_id}|{request.full_path}",
+                    current_app.config['ETAG_MAX_AGE']
+                )
+            except redis.RedisError as e:
+                logger.warning("ETag lookup failed", extra={'error': str(e)})
+                return view(*args, **kwargs)
+
+            if request.if_none_match.contains_weak(tag):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(tag, weak=True)
+            # Browsers may keep the body but must revalidate before reusing it
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return wrapper
+    return decorator
+
+
+def user_data(user_id, **_):
+    return [user_key(user_id)]
+
+
+def standing_data(user_id, exercise, **_):
+    """The caller's own data and the board they are ranked on"""
+    return [user_key(user_id), leaderboard_key(exercise)]
+
+
+def leaderboard_data(exercise):
+    return lambda user_id, **_: [leaderboard_key(exercise)]
@@ -0,0 +1,249 @@
+"""Write-behind session ingestion through a Redis Stream.
+
+With WRITE_BEHIND on, the session endpoints validate the body, append it to
+STREAM and answer 202 without touching Postgres. `flask --app app
+session-writer` runs SessionWriter, which reads the stream as part of a
+consumer group and writes batches through ingest.ingest_batch. That path
+already dedupes on idempotency keys, keeps the aggregates and rollups in the
+same transaction, and reports leaderboard deltas.
+
+Each queued entry carries a random key that is used both as its idempotency
+key, so a redelivered entry is never inserted twice, and as a member of the
+user's pending set. Reads for that user wait (briefly) for the set to drain,
+which keeps read-your-writes without merging queued rows into every response.
+Entries that keep failing are moved to DEAD_LETTER_STREAM.
+"""
+import logging
+import os
+import socket
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime
+import redis
+from models import db
+import ingest
+import leaderboard
+import metrics
+import replicas
+import versions
+
+logger = logging.getLogger(__name__)
+
+STREAM = "sessions:stream"
+GROUP = "session-writers"
+DEAD_LETTER_STREAM = "sessions:dead"
+DEAD_LETTER_MAXLEN = 100000
+# Bounds how long a user's pending set outlives a lost worker
+PENDING_TTL = 86400
+_WAIT_POLL_SECONDS = 0.02
+
+
+def _pending_key(user_id):
+    return f"sessions:pending:{int(user_id)}"
+
+
+def enqueue(redis_client, user_id, exercise, reps, duration=0):
+    """Queue one session for the writer; returns its key
+
+    Raises redis.RedisError if the entry could not be queued, so the caller
+    can fall back to a synchronous write.
+    """
+    key = uuid.uuid4().hex
+    pipe = redis_client.pipeline()
+    pipe.xadd(STREAM, {
+        'key': key,
+        'user_id': int(user_id),
+        'exercise': exercise,
+        'count': int(reps),
+        'duration': int(duration or 0),
+        'timestamp': datetime.utcnow().isoformat(),
+    })
+    pipe.sadd(_pending_key(user_id), key)
+    pipe.expire(_pending_key(user_id), PENDING_TTL)
+    # A cached view must not be revalidated while this write is still queued
+    pipe.incr(versions.user_key(user_id))
+    pipe.execute()
+    replicas.pin_users([user_id])
+    return key
+
+
+def wait_for_user(redis_client, user_id, timeout):
+    """Block until the user's queued sessions are written or `timeout` seconds pass
+
+    Returns False if some were still pending. Redis errors count as drained;
+    the read then simply serves what Postgres has.
+    """
+    deadline = time.monotonic() + timeout
+    key = _pending_key(user_id)
+    try:
+        while redis_client.exists(key):
+            if time.monotonic() >= deadline:
+                logger.warning("Queued sessions not written before read", extra={'user_id': int(user_id)})
+                return False
+            time.sleep(_WAIT_POLL_SECONDS)
+    except redis.RedisError as e:
+        logger.warning("Pending session check failed", extra={'error': str(e)})
+    return True
+
+
+def default_consumer_name():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class SessionWriter:
+    """Consumer-group worker that moves queued sessions into Postgres
+
+    Entries are processed in batches of up to `batch_size`, grouped per user.
+    A user's entries are retried up to `retries` times in place, with
+    exponential backoff. If they still fail they stay unacknowledged, and
+    this or another writer claims them again after `claim_idle_ms`. An entry
+    delivered `max_deliveries` times, or one the ingest path rejects as
+    invalid, goes to the dead-letter stream.
+    """
+
+    def __init__(self, redis_client, consumer=None, batch_size=200, block_ms=1000,
+                 retries=3, retry_backoff=0.2, max_deliveries=5, claim_idle_ms=30000):
+        self.redis_client = redis_client
+        self.consumer = consumer or default_consumer_name()
+        self.batch_size = batch_size
+        self.block_ms = block_ms
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.max_deliveries = max_deliveries
+        self.claim_idle_ms = claim_idle_ms
+
+    def ensure_group(self):
+        try:
+            self.redis_client.xgroup_create(STREAM, GROUP, id='0', mkstream=True)
+        except redis.ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+
+    def run(self, should_stop=lambda: False):
+        """Process batches until should_stop() is true"""
+        self.ensure_group()
+        logger.info("Session writer started", extra={'consumer': self.consumer})
+        while not should_stop():
+            try:
+                self.process(self.read())
+            except redis.RedisError as e:
+                logger.warning("Session writer Redis error", extra={'error': str(e)})
+                time.sleep(1)
+
+    def read(self):
+        """Entries abandoned by a crashed or failing writer first, then new ones"""
+        _, claimed, _ = self.redis_client.xautoclaim(
+            STREAM, GROUP, self.consumer, self.claim_idle_ms, start_id='0-0', count=self.batch_size
+        )
+        entries = [(entry_id, fields) for entry_id, fields in claimed if fields]
+        if entries:
+            return entries
+        response = self.redis_client.xreadgroup(
+            GROUP, self.consumer, {STREAM: '>'}, count=self.batch_size, block=self.block_ms
+        )
+        return response[0][1] if response else []
+
+    def process(self, entries):
+        """Write a batch of stream entries; returns the number acknowledged"""
+        by_user = defaultdict(list)
+        for entry_id, fields in entries:
+            by_user[int(fields['user_id'])].append((entry_id, fields))
+
+        done = 0
+        for user_id, user_entries in by_user.items():
+            for offset in range(0, len(user_entries), ingest.MAX_BATCH_SIZE):
+                done += self._write_user(user_id, user_entries[offset:offset + ingest.MAX_BATCH_SIZE])
+        return done
+
+    def _write_user(self, user_id, entries):
+        items = [
+            {
+                'idempotency_key': fields['key'],
+                'exercise': fields['exercise'],
+                'count': fields['count'],
+                'duration': fields['duration'],
+                'timestamp': fields['timestamp'],
+            }
+            for _, fields in entries
+        ]
+        for attempt in range(self.retries + 1):
+            try:
+                results, sessions_by_day = ingest.ingest_batch(user_id, items)
+                break
+            except Exception as e:
+                db.session.rollback()
+                metrics.SESSION_WRITER_ENTRIES.labels('retried').inc(len(entries))
+                logger.warning("Session write failed", extra={
+                    'user_id': user_id, 'entries': len(entries), 'attempt': attempt + 1, 'error': str(e)
+                })
+                if attempt < self.retries:
+                    time.sleep(self.retry_backoff * 2 ** attempt)
+                    continue
+                return self._dead_letter_exhausted(entries, str(e))
+
+        try:
+            for exercise, days in sessions_by_day.items():
+                leaderboard.record_totals(self.redis_client, exercise, user_id, days)
+            if sessions_by_day:
+                versions.bump(self.redis_client, [user_id], sessions_by_day)
+                replicas.pin_users([user_id])
+        except redis.RedisError as e:
+            logger.warning("Leaderboard update failed", extra={'error': str(e)})
+
+        written, invalid = [], []
+        for (entry_id, fields), result in zip(entries, results):
+            if result['status'] == 'error':
+                invalid.append((entry_id, fields, result['error']))
+            else:
+                written.append((entry_id, fields))
+                metrics.SESSION_WRITER_ENTRIES.labels(result['status']).inc()
+        for entry_id, fields, error in invalid:
+            self._dead_letter(entry_id, fields, error)
+        self._finish(user_id, written)
+        return len(entries)
+
+    def _dead_letter_exhausted(self, entries, error):
+        """Dead-letter entries delivered too often; the rest wait for redelivery"""
+        deliveries = {}
+        for entry_id, _ in entries:
+            pending = self.redis_client.xpending_range(STREAM, GROUP, min=entry_id, max=entry_id, count=1)
+            deliveries[entry_id] = pending[0]['times_delivered'] if pending else 0
+        exhausted = [(entry_id, fields) for entry_id, fields in entries if deliveries[entry_id] >= self.max_deliveries]
+        for entry_id, fields in exhausted:
+            self._dead_letter(entry_id, fields, error)
+        return len(exhausted)
+
+    def _dead_letter(self, entry_id, fields, error):
+        metrics.SESSION_WRITER_ENTRIES.labels('dead_lettered').inc()
+        logger.error("Session dead-lettered", extra={'entry_id': entry_id, 'error': error})
+        self.redis_client.xadd(DEAD_LETTER_STREAM, dict(fields, entry_id=entry_id, error=error[:500]),
+                               maxlen=DEAD_LETTER_MAXLEN, approximate=True)
+        self._finish(int(fields['user_id']), [(entry_id, fields)])
+
+    def _finish(self, user_id, entries):
+        """Acknowledge and drop entries, then release the user's pending reads"""
+        if not entries:
+            return
+        entry_ids = [entry_id for entry_id, _ in entries]
+        pipe = self.redis_client.pipeline()
+        pipe.xack(STREAM, GROUP, *entry_ids)
+        pipe.xdel(STREAM, *entry_ids)
+        pipe.srem(_pending_key(user_id), *[fields['key'] for _, fields in entries])
+        pipe.execute()
+
+
+def requeue_dead(redis_client, count=100):
+    """Move up to `count` dead-lettered sessions back onto the ingest stream"""
+    moved = 0
+    for entry_id, fields in redis_client.xrange(DEAD_LETTER_STREAM, count=count):
+        user_id = fields['user_id']
+        fields = {name: value for name, value in fields.items() if name not in ('entry_id', 'error')}
+        pipe = redis_client.pipeline()
+        pipe.xadd(STREAM, fields)
+        pipe.sadd(_pending_key(user_id), fields['key'])
+        pipe.expire(_pending_key(user_id), PENDING_TTL)
+        pipe.xdel(DEAD_LETTER_STREAM, entry_id)
+        pipe.execute()
+        moved += 1
+    return moved